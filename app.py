@@ -1,17 +1,70 @@
+import copy
 import datetime
 import os
-import webbrowser
+import queue
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from io import BytesIO
 
+import metrics
 import ttkbootstrap as tb
 from tkinter import filedialog, messagebox, colorchooser
 from tkinter.ttk import Notebook
-from PIL import Image, ImageTk, ImageDraw
-from qr_generator import QRCodeGenerator, ERROR_CORRECTION_LEVELS, DEFAULT_FG, DEFAULT_BG
+from PIL import Image, ImageTk
+from history import HistoryStore
+from sheets import save_as_pdf
+from qr_generator import (QRCodeGenerator, IncrementalRenderer, MatrixCache, ModuleStyle, PreparedLogo,
+                          ERROR_CORRECTION_LEVELS, DEFAULT_FG, DEFAULT_BG, PLAIN_STYLE, save_image)
+
+RESULT_POLL_MS = 30
+LIVE_PREVIEW_DELAY_MS = 400
+HISTORY_MEMORY_BUDGET = 64 * 1024 * 1024
+HISTORY_THUMBNAIL_SIZE = 32
+SAVE_PNG_PRESET = "small"
+CLIPBOARD_PNG_PRESET = "fast"
+PREVIEW_CACHE_SIZE = 32
+RESIZE_DELAY_MS = 150
+
+
+def preview_image(img: Image.Image, preview_size: int) -> Image.Image:
+    """Downscale a code for display; 1-bit and palette images are smoothed in RGB."""
+    if img.mode in ("1", "P"):
+        img = img.convert("RGB")
+    return img.resize((preview_size, preview_size), Image.Resampling.LANCZOS)
+
+
+def render_preview(qr_gen: QRCodeGenerator, url: str, logo_img: PreparedLogo | None, preview_size: int,
+                   renderer: IncrementalRenderer | None = None) -> Image.Image:
+    """
+    Render a code for display straight from its module matrix, at the
+    largest whole number of pixels per module that fits ``preview_size``, so
+    modules stay crisp and nothing is resampled. Codes with more modules
+    than pixels fall back to downscaling the full-size image.
+    """
+    scale = preview_size // len(qr_gen.get_matrix(url))
+    if scale < 1:
+        return preview_image(qr_gen.generate(url, logo_img=logo_img), preview_size)
+    preview_gen = copy.copy(qr_gen)
+    preview_gen.size = scale
+    if renderer is None:
+        return preview_gen.generate(url, logo_img=logo_img)
+    return renderer.render(preview_gen, url, logo_img)
+
+
+def render_qr_job(qr_gen: QRCodeGenerator, url: str, logo_img: PreparedLogo | None, preview_size: int,
+                  renderer: IncrementalRenderer,
+                  preview_renderer: IncrementalRenderer) -> tuple[Image.Image, Image.Image]:
+    """
+    Build the QR code and its preview image off the Tk main thread. The
+    renderers redo only what changed since the previous job, so tweaking
+    colours, size or the logo of the same content skips encoding.
+    """
+    return (renderer.render(qr_gen, url, logo_img),
+            render_preview(qr_gen, url, logo_img, preview_size, preview_renderer))
 
 
 class QRGeneratorApp:
-    def __init__(self, root: tb.Window) -> None:
+    def __init__(self, root: tb.Window, metrics_path: str | None = None) -> None:
         self.root = root
         self.root.title("QR Code Studio")
         self.root.geometry("800x900")
@@ -20,7 +73,8 @@ class QRGeneratorApp:
 
         icon_image = Image.open("assets/qr-code-app.png")
         self.root.iconphoto(True, ImageTk.PhotoImage(icon_image))
-        self.history_data = {}
+        self.history = HistoryStore(memory_budget=HISTORY_MEMORY_BUDGET, thumbnail_size=HISTORY_THUMBNAIL_SIZE)
+        self.history_thumbnails = {}
 
         # Instance variables
         self.generated_img = None
@@ -28,16 +82,47 @@ class QRGeneratorApp:
         self.logo_path = None
         self.last_save_dir = None
         self.current_qr_data = None
+        self.current_qr_gen = None
+        self.current_qr_logo = None
+        self.current_history_item = None
+        self.module_style = PLAIN_STYLE
+        self.matrix_cache = MatrixCache()
+        self.renderer = IncrementalRenderer()
+        self.preview_renderer = IncrementalRenderer()
+
+        # Stage timings and counters are recorded and written out on close
+        # only when a metrics file is given.
+        self.metrics_path = metrics_path
+        if metrics_path:
+            metrics.enable()
+
+        # Generation runs on a worker thread; results come back through a
+        # queue that the Tk loop polls, and anything older than _job_id is stale.
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="qr-render")
+        self.results = queue.Queue()
+        self._job_id = 0
+        self._pending_job: Future | None = None
+        self._poll_scheduled = False
+        self._live_preview_after = None
+
+        # Previews are cached per (history item, preview size) and re-rendered
+        # in the background when the canvas is resized.
+        self.preview_cache: OrderedDict[tuple, Image.Image] = OrderedDict()
+        self._preview_future: Future | None = None
+        self._resize_after = None
+        self._shown_preview_size = None
 
         self.templates = {
             "Default": {"fg": "#000000", "bg": "#FFFFFF", "shape": "square"},
             "Dark Mode": {"fg": "#FFFFFF", "bg": "#121212", "shape": "square"},
             "Colorful": {"fg": "#FF6B6B", "bg": "#4ECDC4", "shape": "rounded"},
             "Professional": {"fg": "#2C3E50", "bg": "#ECF0F1", "shape": "square"},
-            "Gradient": {"fg": "#6A11CB", "bg": "#2575FC", "shape": "circle"}
+            # Modules fade from "fg" to "gradient" on a white background.
+            "Gradient": {"fg": "#6A11CB", "bg": "#FFFFFF", "shape": "circle", "gradient": "#2575FC"}
         }
 
         self.setup_ui()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
     def setup_ui(self) -> None:
         """Setup the modern UI components."""
@@ -71,6 +156,7 @@ class QRGeneratorApp:
         self.url_entry = tb.Entry(url_frame, font=("Segoe UI", 11), bootstyle="light")
         self.url_entry.pack(fill="x", pady=5, ipady=5)
         self.url_entry.insert(0, "https://")
+        self.url_entry.bind("<KeyRelease>", self.on_inputs_changed)
 
         quick_btns = tb.Frame(url_frame)
         quick_btns.pack(fill="x", pady=(5, 0))
@@ -108,7 +194,8 @@ class QRGeneratorApp:
         size_ec_frame = tb.Frame(settings_frame)
         size_ec_frame.pack(fill="x", pady=5)
         tb.Label(size_ec_frame, text="Size:", font=("Segoe UI", 9)).pack(side="left", padx=5)
-        self.size_slider = tb.Scale(size_ec_frame, from_=1, to=20, value=10, bootstyle="info")
+        self.size_slider = tb.Scale(size_ec_frame, from_=1, to=20, value=10, bootstyle="info",
+                                    command=self.on_inputs_changed)
         self.size_slider.pack(side="left", fill="x", expand=True, padx=5)
         tb.Label(size_ec_frame, text="EC:", font=("Segoe UI", 9)).pack(side="left", padx=(10, 5))
         self.ec_combo = tb.Combobox(
@@ -117,6 +204,7 @@ class QRGeneratorApp:
         )
         self.ec_combo.pack(side="left", padx=5)
         self.ec_combo.set("High (25%)")
+        self.ec_combo.bind("<<ComboboxSelected>>", self.on_inputs_changed)
 
         # Color Pickers
         colors_frame = tb.Frame(settings_frame)
@@ -130,6 +218,7 @@ class QRGeneratorApp:
         self.color_fg_entry = tb.Entry(fg_color_frame, width=10, font=("Segoe UI", 9))
         self.color_fg_entry.pack(side="left", fill="x", expand=True)
         self.color_fg_entry.insert(0, DEFAULT_FG)
+        self.color_fg_entry.bind("<KeyRelease>", self.on_inputs_changed)
         self.fg_color_btn = tb.Button(
             fg_color_frame,
             command=lambda: self.choose_color(self.color_fg_entry, self.fg_color_btn),
@@ -145,6 +234,7 @@ class QRGeneratorApp:
         self.color_bg_entry = tb.Entry(bg_color_frame, width=10, font=("Segoe UI", 9))
         self.color_bg_entry.pack(side="left", fill="x", expand=True)
         self.color_bg_entry.insert(0, DEFAULT_BG)
+        self.color_bg_entry.bind("<KeyRelease>", self.on_inputs_changed)
         self.bg_color_btn = tb.Button(
             bg_color_frame,
             command=lambda: self.choose_color(self.color_bg_entry, self.bg_color_btn),
@@ -171,12 +261,16 @@ class QRGeneratorApp:
         self.save_btn.pack(side="left", padx=2)
         self.copy_btn = tb.Button(action_frame, text="Copy", command=self.copy_to_clipboard, state="disabled", bootstyle="info-outline", width=action_btn_width)
         self.copy_btn.pack(side="left", padx=2)
+        self.live_preview = tb.BooleanVar(value=False)
+        tb.Checkbutton(left_panel, text="Live preview", variable=self.live_preview,
+                       command=self.on_inputs_changed, bootstyle="info-round-toggle").pack(anchor="w", pady=(10, 0))
 
         # Right Panel: Preview & History
         preview_frame = tb.LabelFrame(right_panel, text="PREVIEW", bootstyle="info", padding=15)
         preview_frame.pack(fill="both", expand=True)
         self.qr_canvas = tb.Canvas(preview_frame, width=250, height=250, bg="white", relief="ridge", bd=0, highlightthickness=0)
-        self.qr_canvas.pack(pady=10)
+        self.qr_canvas.pack(fill="both", expand=True, pady=10)
+        self.qr_canvas.bind("<Configure>", self.on_canvas_configure)
         detail_frame = tb.Frame(preview_frame)
         detail_frame.pack(fill="x", pady=(5, 0))
         self.qr_size_label = tb.Label(detail_frame, text="Size: -", font=("Segoe UI", 9))
@@ -191,7 +285,10 @@ class QRGeneratorApp:
 
         history_frame = tb.LabelFrame(right_panel, text="HISTORY", bootstyle="info", padding=10)
         history_frame.pack(fill="both", expand=True, pady=(5, 0))
-        self.history_listbox = tb.Treeview(history_frame, columns=("date", "content"), show="headings", height=4)
+        tb.Style().configure("History.Treeview", rowheight=HISTORY_THUMBNAIL_SIZE + 4)
+        self.history_listbox = tb.Treeview(history_frame, columns=("date", "content"), show="tree headings", height=4,
+                                           style="History.Treeview")
+        self.history_listbox.column("#0", width=HISTORY_THUMBNAIL_SIZE + 20, stretch=False)
         self.history_listbox.heading("date", text="Date")
         self.history_listbox.heading("content", text="Content")
         self.history_listbox.column("date", width=100)
@@ -212,12 +309,14 @@ class QRGeneratorApp:
         """Set the content prefix for the URL entry."""
         self.url_entry.delete(0, "end")
         self.url_entry.insert(0, prefix)
+        self.on_inputs_changed()
 
     def update_color_ui(self, color: str, entry_widget: tb.Entry, button_widget: tb.Button) -> None:
         entry_widget.delete(0, "end")
         entry_widget.insert(0, color)
         self.update_color_button_style(color)
         self.update_color_swatch(button_widget, color)
+        self.on_inputs_changed()
 
     def choose_color(self, entry_widget: tb.Entry, button_widget: tb.Button) -> None:
         initial_color = entry_widget.get()
@@ -244,6 +343,8 @@ class QRGeneratorApp:
     def apply_template(self, template_name: str) -> None:
         template = self.templates.get(template_name)
         if template:
+            self.module_style = ModuleStyle(shape=template["shape"], finder=template.get("finder"),
+                                            gradient=template.get("gradient"))
             self.update_color_ui(template["fg"], self.color_fg_entry, self.fg_color_btn)
             self.update_color_ui(template["bg"], self.color_bg_entry, self.bg_color_btn)
             self.update_status(f"Template applied: {template_name}")
@@ -306,10 +407,11 @@ class QRGeneratorApp:
         if filepath:
             try:
                 from PIL import Image  # Ensure PIL.Image is imported
-                self.logo_img = Image.open(filepath)
+                self.logo_img = PreparedLogo(Image.open(filepath))
                 self.logo_path = filepath
                 self.remove_logo_btn.config(state="normal")
                 self.update_status(f"Logo loaded: {os.path.basename(filepath)}")
+                self.on_inputs_changed()
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to load image: {str(e)}")
 
@@ -318,6 +420,7 @@ class QRGeneratorApp:
         self.logo_path = None
         self.remove_logo_btn.config(state="disabled")
         self.update_status("Logo removed")
+        self.on_inputs_changed()
 
     def validate_inputs(self) -> bool:
         url = self.url_entry.get()
@@ -332,13 +435,44 @@ class QRGeneratorApp:
             return False
         return True
 
-    def generate_qr(self) -> None:
-        if not self.validate_inputs():
+    def on_inputs_changed(self, *_) -> None:
+        """
+        In live mode, replace any in-flight generation with a debounced one.
+        Otherwise a generation the user started runs to completion.
+        """
+        if self._live_preview_after is not None:
+            self.root.after_cancel(self._live_preview_after)
+            self._live_preview_after = None
+        if not self.live_preview.get():
+            return
+        if self.cancel_pending_job():
+            self.progress["value"] = 0
+            self.update_status("Inputs changed, generation cancelled")
+        self._live_preview_after = self.root.after(LIVE_PREVIEW_DELAY_MS, self.live_generate)
+
+    def live_generate(self) -> None:
+        self._live_preview_after = None
+        if self.url_entry.get():
+            self.generate_qr(live=True)
+
+    def cancel_pending_job(self) -> bool:
+        """Drop the in-flight generation, if any, and return whether there was one."""
+        self._job_id += 1
+        if self._pending_job is None:
+            return False
+        self._pending_job.cancel()
+        self._pending_job = None
+        return True
+
+    def preview_size(self) -> int:
+        return max(min(self.qr_canvas.winfo_width(), self.qr_canvas.winfo_height()) - 20, 1)
+
+    def generate_qr(self, live: bool = False) -> None:
+        if not live and not self.validate_inputs():
             return
 
         self.update_status("Generating QR Code...")
         self.progress["value"] = 30
-        self.root.update_idletasks()
 
         try:
             url = self.format_url(self.url_entry.get())
@@ -346,56 +480,169 @@ class QRGeneratorApp:
             ec_level = ERROR_CORRECTION_LEVELS[self.ec_combo.get()]
             fg_color = self.color_fg_entry.get() or DEFAULT_FG
             bg_color = self.color_bg_entry.get() or DEFAULT_BG
+            qr_gen = QRCodeGenerator(size=size, error_correction=ec_level, fg_color=fg_color, bg_color=bg_color,
+                                     cache=self.matrix_cache, mode="auto", style=self.module_style)
+        except Exception as e:
+            self.on_generation_failed(e, live)
+            return
 
-            # Use the QRCodeGenerator module
-            from qr_generator import QRCodeGenerator  # Import here if needed
-            qr_gen = QRCodeGenerator(size=size, error_correction=ec_level, fg_color=fg_color, bg_color=bg_color)
-            img = qr_gen.generate(url, logo_img=self.logo_img)
-            self.generated_img = img
-            self.current_qr_data = url
-
+        self.cancel_pending_job()
+        job_id = self._job_id
+        logo_img = self.logo_img
+        future = self.executor.submit(render_qr_job, qr_gen, url, logo_img, self.preview_size(),
+                                      self.renderer, self.preview_renderer)
+        future.add_done_callback(lambda f: self.results.put((job_id, url, qr_gen, logo_img, live, f)))
+        self._pending_job = future
+        self.schedule_result_poll()
+
+    def schedule_result_poll(self) -> None:
+        if not self._poll_scheduled:
+            self._poll_scheduled = True
+            self.root.after(RESULT_POLL_MS, self.poll_results)
+
+    def poll_results(self) -> None:
+        """Apply finished generations on the Tk thread, dropping stale ones."""
+        self._poll_scheduled = False
+        while True:
+            try:
+                job_id, url, qr_gen, logo_img, live, future = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if job_id != self._job_id or future.cancelled():
+                continue
+            self._pending_job = None
+            try:
+                img, preview_img = future.result()
+            except Exception as e:
+                self.on_generation_failed(e, live)
+            else:
+                self.on_generation_finished(url, qr_gen, logo_img, img, preview_img, live)
+        if self._pending_job is not None:
+            self.schedule_result_poll()
+
+    def on_generation_finished(self, url: str, qr_gen: QRCodeGenerator, logo_img: PreparedLogo | None,
+                               img: Image.Image, preview_img: Image.Image, live: bool) -> None:
+        self.generated_img = img
+        self.current_qr_data = url
+        self.current_qr_gen = qr_gen
+        self.current_qr_logo = logo_img
+        self.current_history_item = None
+
+        if not live:
             timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
             content_preview = url[:30] + "..." if len(url) > 30 else url
             item_id = self.history_listbox.insert("", "end", values=(timestamp, content_preview))
-            self.history_data[item_id] = {"image": self.generated_img.copy(), "content": url}
-
-            self.update_qr_preview(img)
-            self.save_btn.config(state="normal")
-            self.copy_btn.config(state="normal")
-            self.progress["value"] = 100
-            self.update_status("QR Code generated successfully!")
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to generate QR code: {str(e)}")
-            self.progress["value"] = 0
-            self.update_status("Error generating QR Code")
+            entry = self.history.add(item_id, url, qr_gen, img, logo_img=logo_img)
+            self.history_thumbnails[item_id] = ImageTk.PhotoImage(entry.thumbnail)
+            self.history_listbox.item(item_id, image=self.history_thumbnails[item_id])
+            self.current_history_item = item_id
+
+        self.update_qr_preview(img, preview_img)
+        self.save_btn.config(state="normal")
+        self.copy_btn.config(state="normal")
+        self.progress["value"] = 100
+        self.update_status("Live preview updated" if live else "QR Code generated successfully!")
+
+    def on_generation_failed(self, error: Exception, live: bool) -> None:
+        self.progress["value"] = 0
+        if live:
+            self.update_status(f"Live preview unavailable: {error}")
+            return
+        messagebox.showerror("Error", f"Failed to generate QR code: {str(error)}")
+        self.update_status("Error generating QR Code")
 
     def on_history_item_double_click(self, event) -> None:
         selected_items = self.history_listbox.selection()
         if selected_items:
             item_id = selected_items[0]
-            history_item = self.history_data.get(item_id)
+            history_item = self.history.get(item_id)
             if history_item:
-                img = history_item["image"]
+                img = self.history.get_image(item_id)
                 self.generated_img = img  # update current image if needed
-                self.current_qr_data = history_item["content"]
+                self.current_qr_data = history_item.content
+                self.current_qr_gen = history_item.generator
+                self.current_qr_logo = history_item.logo_img
+                self.current_history_item = item_id
                 self.update_qr_preview(img)
                 self.update_status("Recalled QR code from history.")
 
-    def update_qr_preview(self, img) -> None:
-        self.qr_canvas.delete("all")
-        canvas_width = self.qr_canvas.winfo_width()
-        canvas_height = self.qr_canvas.winfo_height()
-        preview_size = min(canvas_width, canvas_height) - 20
-        preview_img = img.resize((preview_size, preview_size), Image.Resampling.LANCZOS)
-        self.qr_preview_img = ImageTk.PhotoImage(preview_img)
-        x_pos = (canvas_width - preview_size) // 2
-        y_pos = (canvas_height - preview_size) // 2
-        self.qr_canvas.create_image(x_pos, y_pos, image=self.qr_preview_img, anchor="nw")
+    def update_qr_preview(self, img: Image.Image, preview_img: Image.Image | None = None) -> None:
+        """
+        Show the current code. ``preview_img`` is a preview rendered for the
+        current canvas size; without one the cached preview is used or a new
+        one is rendered in the background.
+        """
+        self._preview_future = None
+        if preview_img is not None:
+            preview_size = self.preview_size()
+            if self.current_history_item is not None:
+                self.cache_preview((self.current_history_item, preview_size), preview_img)
+            self.show_preview(preview_img, preview_size)
+        else:
+            self.request_preview()
         self.qr_size_label.config(text=f"Size: {img.size[0]}x{img.size[1]}")
         qr_type = "URL" if self.current_qr_data and self.current_qr_data.startswith("http") else "Text"
         self.qr_type_label.config(text=f"Type: {qr_type}")
         self.qr_date_label.config(text=f"Generated: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M')}")
 
+    def show_preview(self, preview_img: Image.Image, preview_size: int) -> None:
+        self.qr_canvas.delete("all")
+        self.qr_preview_img = ImageTk.PhotoImage(preview_img)
+        x_pos = (self.qr_canvas.winfo_width() - preview_img.width) // 2
+        y_pos = (self.qr_canvas.winfo_height() - preview_img.height) // 2
+        self.qr_canvas.create_image(x_pos, y_pos, image=self.qr_preview_img, anchor="nw")
+        self._shown_preview_size = preview_size
+
+    def cache_preview(self, key: tuple, preview_img: Image.Image) -> None:
+        self.preview_cache[key] = preview_img
+        self.preview_cache.move_to_end(key)
+        while len(self.preview_cache) > PREVIEW_CACHE_SIZE:
+            self.preview_cache.popitem(last=False)
+
+    def request_preview(self) -> None:
+        """Show the current code at the canvas size, from the cache or rendered on the worker thread."""
+        if self.current_qr_gen is None:
+            return
+        preview_size = self.preview_size()
+        key = (self.current_history_item, preview_size)
+        cached = self.preview_cache.get(key) if self.current_history_item is not None else None
+        if cached is not None:
+            self.preview_cache.move_to_end(key)
+            self._preview_future = None
+            self.show_preview(cached, preview_size)
+            return
+        future = self.executor.submit(render_preview, self.current_qr_gen, self.current_qr_data,
+                                      self.current_qr_logo, preview_size, self.preview_renderer)
+        self._preview_future = future
+        self.root.after(RESULT_POLL_MS, self.poll_preview, future, key)
+
+    def poll_preview(self, future: Future, key: tuple) -> None:
+        # A newer code or canvas size has replaced this render.
+        if future is not self._preview_future:
+            return
+        if not future.done():
+            self.root.after(RESULT_POLL_MS, self.poll_preview, future, key)
+            return
+        self._preview_future = None
+        try:
+            preview_img = future.result()
+        except Exception as e:
+            self.update_status(f"Preview unavailable: {e}")
+            return
+        if key[0] is not None:
+            self.cache_preview(key, preview_img)
+        self.show_preview(preview_img, key[1])
+
+    def on_canvas_configure(self, _event) -> None:
+        if self._resize_after is not None:
+            self.root.after_cancel(self._resize_after)
+        self._resize_after = self.root.after(RESIZE_DELAY_MS, self.on_canvas_resized)
+
+    def on_canvas_resized(self) -> None:
+        self._resize_after = None
+        if self.generated_img is not None and self.preview_size() != self._shown_preview_size:
+            self.request_preview()
+
     def save_qr(self) -> None:
         if not self.generated_img:
             return
@@ -417,11 +664,12 @@ class QRGeneratorApp:
         if filepath:
             try:
                 if filepath.lower().endswith(".svg"):
-                    from qr_generator import QRCodeGenerator
-                    qr_gen = QRCodeGenerator(bg_color=self.color_bg_entry.get() or DEFAULT_BG)
-                    qr_gen.save_as_svg(self.generated_img, filepath)
+                    self.current_qr_gen.save_as_svg(self.current_qr_data, filepath, self.current_qr_logo)
+                elif (filepath.lower().endswith(".pdf") and self.current_qr_logo is None
+                      and self.current_qr_gen.style.is_plain):
+                    save_as_pdf(self.current_qr_gen, self.current_qr_data, filepath)
                 else:
-                    self.generated_img.save(filepath)
+                    save_image(self.generated_img, filepath, preset=SAVE_PNG_PRESET)
                 self.last_save_dir = os.path.dirname(filepath)
                 original_text = self.save_btn.cget("text")
                 self.save_btn.config(text="Saved!", bootstyle="success")
@@ -435,7 +683,7 @@ class QRGeneratorApp:
         if self.generated_img:
             try:
                 output = BytesIO()
-                self.generated_img.save(output, format="PNG")
+                save_image(self.generated_img, output, "PNG", preset=CLIPBOARD_PNG_PRESET)
                 data = output.getvalue()
                 output.close()
                 self.root.clipboard_clear()
@@ -444,22 +692,56 @@ class QRGeneratorApp:
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to copy to clipboard: {str(e)}")
 
+    def on_close(self) -> None:
+        self.cancel_pending_job()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.history.close()
+        if self.metrics_path:
+            metrics.active().write(self.metrics_path)
+        self.root.destroy()
+
     def test_qr_code(self) -> None:
         if not self.generated_img or not self.current_qr_data:
             messagebox.showwarning("Warning", "No QR code generated to test!")
             return
 
-        if self.current_qr_data.startswith(("http://", "https://")):
+        from verify import verify_code
+
+        self.update_status("Verifying QR code...")
+        future = self.executor.submit(verify_code, self.current_qr_gen, self.current_qr_data, self.generated_img)
+        self.root.after(RESULT_POLL_MS, self.poll_verification, future, self.current_qr_data)
+
+    def poll_verification(self, future: Future, data: str) -> None:
+        """Report a scan check on the Tk thread, then open or show the content."""
+        if not future.done():
+            self.root.after(RESULT_POLL_MS, self.poll_verification, future, data)
+            return
+        try:
+            result = future.result()
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to verify QR code: {str(e)}")
+            return
+        if not result.ok:
+            messagebox.showwarning("Not Scannable", f"The QR code could not be read back:\n\n{result.error}\n\n"
+                                   "Try a higher error correction level, a smaller logo or more contrast.")
+            return
+        scanned = f"Scanned OK, scan risk {result.risk:.2f}"
+        if result.at_risk:
+            scanned += f" (contrast {result.contrast:.1f}:1) - consider more contrast or error correction"
+        self.update_status(scanned)
+
+        if data.startswith(("http://", "https://")):
+            import webbrowser
             try:
-                webbrowser.open(self.current_qr_data)
-                self.update_status(f"Opening: {self.current_qr_data}")
+                webbrowser.open(data)
+                self.update_status(f"{scanned}. Opening: {data}")
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to open URL: {str(e)}")
         else:
-            messagebox.showinfo("QR Content", f"QR Code contains:\n\n{self.current_qr_data}")
+            messagebox.showinfo("QR Content", f"QR Code contains:\n\n{data}")
 
 
 if __name__ == "__main__":
     root = tb.Window(themename="yeti")
-    app = QRGeneratorApp(root)
+    app = QRGeneratorApp(root, metrics_path=os.environ.get("QR_METRICS"))
     root.mainloop()
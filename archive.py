@@ -0,0 +1,194 @@
+"""
+Bulk archive of encoded QR codes, for storing millions of codes in one file.
+
+Layout (all integers little-endian)::
+
+    header   magic "QRMA", format version (u16), reserved (u16),
+             record count (u64), index offset (u64)
+    records  per code: matrix size in modules (u16), error correction (u8),
+             reserved (u8), payload length (u32), the UTF-8 payload, then
+             the bit-packed QRMatrix rows (no border)
+    index    one u64 record offset per code
+
+The index follows the records, so an archive is written in one streaming
+pass and the header is patched when it is closed. ``MatrixArchive`` maps
+the file and returns any record by index; its matrix is a view into the map
+and is never copied.
+"""
+import mmap
+import os
+import struct
+from array import array
+from typing import IO, Callable, Iterable, Iterator, NamedTuple
+
+from PIL import Image
+from qr_generator import (DEFAULT_CHUNKSIZE, DEFAULT_PNG_PRESET, PreparedLogo, QRCodeGenerator, QRMatrix,
+                          atomic_write, process_in_pool, save_image)
+
+MAGIC = b"QRMA"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<4sHHQQ")
+_RECORD = struct.Struct("<HBBI")
+_OFFSET = struct.Struct("<Q")
+
+
+class ArchiveError(ValueError):
+    pass
+
+
+class ArchiveRecord(NamedTuple):
+    data: str
+    error_correction: int
+    matrix: QRMatrix
+
+
+class ArchiveWriter:
+    """
+    Streams records into a new archive. The file is written under a
+    temporary name and renamed into place by ``close()``, so a reader never
+    sees a half-written archive; leaving the ``with`` block on an exception
+    discards it. Only the 8-byte offset of each record is kept in memory.
+    """
+
+    def __init__(self, path: str | os.PathLike) -> None:
+        self.path = os.fspath(path)
+        self._atomic = atomic_write(self.path)
+        self._fp: IO[bytes] = open(self._atomic.__enter__(), "wb")
+        self._fp.write(_HEADER.pack(MAGIC, FORMAT_VERSION, 0, 0, 0))
+        self._position = _HEADER.size
+        self._offsets = array("Q")
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def add(self, data: str, error_correction: int, matrix: QRMatrix) -> int:
+        """Append a record and return its index."""
+        payload = data.encode("utf-8")
+        self._offsets.append(self._position)
+        self._fp.write(_RECORD.pack(matrix.size, error_correction, 0, len(payload)))
+        self._fp.write(payload)
+        self._fp.write(memoryview(matrix.data))
+        self._position += _RECORD.size + len(payload) + matrix.nbytes
+        return len(self._offsets) - 1
+
+    def close(self) -> None:
+        if self._fp.closed:
+            return
+        if array("Q", [1]).tobytes() != _OFFSET.pack(1):
+            self._offsets.byteswap()
+        self._fp.write(self._offsets.tobytes())
+        self._fp.seek(0)
+        self._fp.write(_HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(self._offsets), self._position))
+        self._fp.close()
+        self._atomic.__exit__(None, None, None)
+
+    def __enter__(self) -> "ArchiveWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if exc_info[0] is None:
+            self.close()
+        elif not self._fp.closed:
+            self._fp.close()
+            self._atomic.__exit__(*exc_info)
+
+
+class MatrixArchive:
+    """
+    Read-only, memory-mapped view of an archive with random access by index.
+
+    Records share the map: their matrices are read-only memoryviews into it,
+    so opening an archive of millions of codes reads nothing up front and
+    each lookup touches only that record's pages. Drop the records before
+    calling ``close()``, which cannot unmap memory that is still viewed.
+    """
+
+    def __init__(self, path: str | os.PathLike) -> None:
+        self.path = os.fspath(path)
+        with open(self.path, "rb") as fp:
+            try:
+                self._map = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise ArchiveError(f"{self.path} is empty")
+        self._view = memoryview(self._map)
+        if len(self._view) < _HEADER.size:
+            self.close()
+            raise ArchiveError(f"{self.path} is not a QR matrix archive")
+        magic, version, _, self._count, self._index = _HEADER.unpack_from(self._view)
+        if magic != MAGIC or version != FORMAT_VERSION or self._index + 8 * self._count > len(self._view):
+            self.close()
+            raise ArchiveError(f"{self.path} is not a QR matrix archive (or was not closed)")
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index: int) -> ArchiveRecord:
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("archive record index out of range")
+        (offset,) = _OFFSET.unpack_from(self._view, self._index + 8 * index)
+        size, error_correction, _, length = _RECORD.unpack_from(self._view, offset)
+        start = offset + _RECORD.size
+        data = str(self._view[start:start + length], "utf-8")
+        start += length
+        return ArchiveRecord(data, error_correction, QRMatrix(size, self._view[start:start + (size + 7) // 8 * size]))
+
+    def __iter__(self) -> Iterator[ArchiveRecord]:
+        return (self[index] for index in range(self._count))
+
+    def close(self) -> None:
+        self._view.release()
+        self._map.close()
+
+    def __enter__(self) -> "MatrixArchive":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+
+def write_archive(generator: QRCodeGenerator, payloads: Iterable[str], path: str | os.PathLike,
+                  workers: int | None = None, chunksize: int = DEFAULT_CHUNKSIZE,
+                  on_error: Callable[[int, str, str], None] | None = None) -> int:
+    """
+    Encode every payload at ``generator``'s error correction level across a
+    process pool and stream the matrices into an archive at ``path``, in
+    input order. Payloads that cannot be encoded are skipped and passed to
+    ``on_error`` with their input index and the error, when it is given, and
+    raise otherwise. Returns the number of records written.
+    """
+    with ArchiveWriter(path) as writer:
+        for result in process_in_pool(generator.encode, payloads, workers=workers, chunksize=chunksize):
+            if result.ok:
+                writer.add(result.data, generator.error_correction, result.result)
+            elif on_error is None:
+                raise ValueError(f"payload {result.index}: {result.error}")
+            else:
+                on_error(result.index, result.data, result.error)
+        return len(writer)
+
+
+def export_records(archive: MatrixArchive, indices: Iterable[int], generator: QRCodeGenerator,
+                   out_dir: str | os.PathLike, fmt: str = "png", logo_img: Image.Image | PreparedLogo | None = None,
+                   png_preset: str = DEFAULT_PNG_PRESET) -> list[str]:
+    """
+    Render the selected records in ``generator``'s size, colours and style
+    and write them to ``out_dir`` as ``<index>.<fmt>`` (png, jpeg or svg).
+    Returns the paths written.
+    """
+    if fmt not in ("png", "jpeg", "svg"):
+        raise ValueError(f"Unsupported export format {fmt!r}")
+    if logo_img is not None and not isinstance(logo_img, PreparedLogo):
+        logo_img = PreparedLogo(logo_img)
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for index in indices:
+        matrix = archive[index].matrix
+        path = os.path.join(out_dir, f"{index:08d}.{fmt}")
+        if fmt == "svg":
+            generator.write_matrix_svg(matrix, path, logo_img)
+        else:
+            save_image(generator.render(matrix, logo_img), path, fmt.upper(), preset=png_preset)
+        paths.append(path)
+    return paths
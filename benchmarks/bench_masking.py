@@ -0,0 +1,61 @@
+"""
+Compare qrcode's pure-Python mask selection with the NumPy back end.
+
+Both sides start from the same finished codewords, so only module
+placement, the eight mask trials and penalty scoring are timed.
+
+    python benchmarks/bench_masking.py
+    python benchmarks/bench_masking.py --full     # every version 1-40
+"""
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import qrcode  # noqa: E402
+from qrcode import util  # noqa: E402
+from bench_render import best_of  # noqa: E402
+from qr_generator import ERROR_CORRECTION_CODES  # noqa: E402
+from qr_masking import HAVE_NUMPY, place_and_mask  # noqa: E402
+
+
+def full_symbol(version: int, error_correction: int) -> qrcode.QRCode:
+    capacity = util.BIT_LIMIT_TABLE[error_correction][version] // 8 - 3
+    qr = qrcode.QRCode(version=version, error_correction=error_correction, border=0)
+    qr.add_data(bytes(random.getrandbits(8) for _ in range(capacity)), optimize=0)
+    qr.data_cache = util.create_data(version, error_correction, qr.data_list)
+    return qr
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--full", action="store_true", help="benchmark every version")
+    parser.add_argument("--ec", default="M", choices=tuple(ERROR_CORRECTION_CODES))
+    parser.add_argument("--repeat", type=int, default=3, help="timing repetitions per case")
+    args = parser.parse_args()
+    if not HAVE_NUMPY:
+        print("NumPy is not installed; only the qrcode path is available.")
+        return 1
+
+    random.seed(0)
+    error_correction = ERROR_CORRECTION_CODES[args.ec]
+    versions = range(1, 41) if args.full else (1, 5, 10, 20, 30, 40)
+
+    print(f"{'version':>7} {'qrcode ms':>10} {'numpy ms':>10} {'speedup':>8}")
+    for version in versions:
+        qr = full_symbol(version, error_correction)
+        qr.makeImpl(False, qr.best_mask_pattern())
+        mask_pattern, symbol = place_and_mask(qr.data_cache, version, error_correction)
+        if symbol.tolist() != qr.modules:
+            print(f"version {version}: NumPy output differs from qrcode (mask {mask_pattern})")
+            return 1
+        legacy = best_of(lambda: qr.makeImpl(False, qr.best_mask_pattern()), args.repeat)
+        fast = best_of(lambda: place_and_mask(qr.data_cache, version, error_correction), args.repeat)
+        print(f"{version:>7} {legacy * 1000:>10.3f} {fast * 1000:>10.3f} {legacy / fast:>7.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
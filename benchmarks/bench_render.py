@@ -0,0 +1,51 @@
+"""
+Compare qrcode's PIL image factory with the bulk ``render_matrix`` path.
+
+    python benchmarks/bench_render.py            # representative grid
+    python benchmarks/bench_render.py --full     # versions 1-40 x box sizes 1-20
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import qrcode  # noqa: E402
+from qr_generator import render_matrix  # noqa: E402
+
+FG = "#2C3E50"
+BG = "#ECF0F1"
+
+
+def best_of(func, repeat: int) -> float:
+    number = 1
+    while timeit.timeit(func, number=number) < 0.05 and number < 1000:
+        number *= 2
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--full", action="store_true", help="benchmark every version and box size")
+    parser.add_argument("--repeat", type=int, default=3, help="timing repetitions per case")
+    args = parser.parse_args()
+
+    versions = range(1, 41) if args.full else (1, 5, 10, 20, 30, 40)
+    box_sizes = range(1, 21) if args.full else (1, 2, 5, 10, 20)
+
+    print(f"{'version':>7} {'box':>4} {'qrcode ms':>10} {'render ms':>10} {'speedup':>8}")
+    for version in versions:
+        qr = qrcode.QRCode(version=version, border=2, mask_pattern=0)
+        qr.add_data("x")
+        qr.make(fit=False)
+        matrix = qr.get_matrix()
+        for box_size in box_sizes:
+            qr.box_size = box_size
+            legacy = best_of(lambda: qr.make_image(fill_color=FG, back_color=BG).convert("RGB"), args.repeat)
+            fast = best_of(lambda: render_matrix(matrix, box_size, FG, BG), args.repeat)
+            print(f"{version:>7} {box_size:>4} {legacy * 1000:>10.3f} {fast * 1000:>10.3f} {legacy / fast:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
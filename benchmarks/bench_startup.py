@@ -0,0 +1,77 @@
+"""
+Measure cold import time of the package's entry points with ``python -X importtime``.
+
+Each module is imported in a fresh interpreter several times and the best
+cumulative time is reported, together with the slowest imports it pulls in.
+Point ``--path`` at another checkout (e.g. a ``git worktree`` of an older
+commit) to compare before and after.
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --modules cli app --top 10
+    python benchmarks/bench_startup.py --path ../qr-code-generator-old
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MODULES = ("qr_generator", "cli", "sheets", "server", "verify", "app")
+
+# Encoding a code is what loads the encoder stack, so time that separately.
+FIRST_CODE = "from qr_generator import QRCodeGenerator; QRCodeGenerator().encode('https://example.com')"
+
+
+def import_times(statement: str, path: str) -> dict[str, tuple[int, int]] | None:
+    """
+    Return ``{module: (nesting depth, cumulative microseconds)}`` for every
+    module imported while running ``statement`` in a fresh interpreter.
+    """
+    env = dict(os.environ, PYTHONPATH=path)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                          cwd=path, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        return None
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        name = name[1:]
+        times[name.strip()] = ((len(name) - len(name.lstrip())) // 2, int(cumulative))
+    return times
+
+
+def total_ms(times: dict[str, tuple[int, int]], startup: set[str]) -> float:
+    """Sum the top-level imports, leaving out those every interpreter makes at startup."""
+    return sum(us for name, (depth, us) in times.items() if depth == 0 and name not in startup) / 1000
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES, help="modules to import")
+    parser.add_argument("--path", default=ROOT, help="source tree to import from (default: this checkout)")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per module")
+    parser.add_argument("--top", type=int, default=5, help="slowest imports to list per module")
+    args = parser.parse_args()
+
+    startup = set(import_times("pass", args.path) or ())
+    cases = [(module, f"import {module}") for module in args.modules]
+    cases.append(("first code", FIRST_CODE))
+    print(f"{'module':<14} {'import ms':>10}  slowest imports")
+    for label, statement in cases:
+        runs = [import_times(statement, args.path) for _ in range(args.repeat)]
+        runs = [times for times in runs if times is not None]
+        if not runs:
+            print(f"{label:<14} {'failed':>10}")
+            continue
+        best = min(runs, key=lambda times: total_ms(times, startup))
+        heaviest = sorted((us, name) for name, (depth, us) in best.items()
+                          if depth <= 1 and name not in startup and name != label)[-args.top:]
+        listed = ", ".join(f"{name} {us / 1000:.0f}" for us, name in reversed(heaviest))
+        print(f"{label:<14} {total_ms(best, startup):>10.1f}  {listed}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
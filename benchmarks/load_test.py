@@ -0,0 +1,75 @@
+"""
+Load-test the QR HTTP service and report latency percentiles and throughput.
+
+Start the service first (python -m qr_generator serve), then e.g.
+
+    python benchmarks/load_test.py --requests 2000 --concurrency 32 --unique 200
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from urllib.parse import quote
+
+
+async def worker(host: str, port: int, paths: list[str], latencies: list[float], errors: list[int]) -> None:
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for path in paths:
+            started = time.perf_counter()
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+            await writer.drain()
+            head = await reader.readuntil(b"\r\n\r\n")
+            lines = head.decode("latin-1").split("\r\n")
+            length = 0
+            for line in lines[1:]:
+                name, _, value = line.partition(":")
+                if name.lower() == "content-length":
+                    length = int(value)
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - started)
+            if not lines[0].split()[1].startswith(("2", "3")):
+                errors.append(int(lines[0].split()[1]))
+    finally:
+        writer.close()
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def run(args: argparse.Namespace) -> None:
+    paths = [
+        f"/qr?data={quote(f'https://example.com/item/{i % args.unique}')}&format={args.format}&size={args.size}"
+        for i in range(args.requests)
+    ]
+    per_worker = [paths[i::args.concurrency] for i in range(args.concurrency)]
+    latencies: list[float] = []
+    errors: list[int] = []
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(args.host, args.port, chunk, latencies, errors) for chunk in per_worker if chunk))
+    elapsed = time.perf_counter() - started
+
+    print(f"requests:    {len(latencies)} ({len(errors)} errors)")
+    print(f"concurrency: {args.concurrency}, unique payloads: {args.unique}")
+    print(f"throughput:  {len(latencies) / elapsed:.1f} req/s")
+    print(f"latency p50: {percentile(latencies, 50) * 1000:.2f} ms")
+    print(f"latency p99: {percentile(latencies, 99) * 1000:.2f} ms")
+    print(f"latency avg: {statistics.fmean(latencies) * 1000:.2f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--requests", type=int, default=1000, help="total requests to send")
+    parser.add_argument("--concurrency", type=int, default=16, help="parallel keep-alive connections")
+    parser.add_argument("--unique", type=int, default=100, help="distinct payloads in the mix")
+    parser.add_argument("--format", default="png", choices=("png", "svg", "matrix"))
+    parser.add_argument("--size", type=int, default=10)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
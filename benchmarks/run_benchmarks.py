@@ -0,0 +1,167 @@
+"""
+Time each stage of QR generation and export, and diff runs to catch regressions.
+
+    python benchmarks/run_benchmarks.py --output results.json
+    python benchmarks/run_benchmarks.py --quick --compare results.json --threshold 0.15
+
+Stages: encode, make_image (qrcode's PIL factory), convert, render (bulk
+renderer used by generate), render_styled (circle modules, rounded finders
+and a gradient), logo_prepare, logo_composite, svg, and the saves the GUI
+and CLI run: save_image for PNG at every preset and for JPEG, and the
+vector PDF page (a raster PDF when a logo is used, as in the GUI). Each
+case varies payload length, error correction level, box size and whether a
+logo is used.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import sys
+import time
+from io import BytesIO, StringIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import qrcode  # noqa: E402
+import PIL  # noqa: E402
+from PIL import Image  # noqa: E402
+from bench_render import best_of  # noqa: E402
+from qr_generator import (  # noqa: E402
+    ERROR_CORRECTION_CODES, PNG_PRESETS, ModuleStyle, PreparedLogo, QRCodeGenerator, render_matrix, render_styled,
+    save_image,
+)
+from sheets import save_as_pdf  # noqa: E402
+
+PAYLOAD_LENGTHS = (16, 128, 1024)
+BOX_SIZES = (1, 10, 20)
+QUICK_PAYLOAD_LENGTHS = (32, 512)
+QUICK_BOX_SIZES = (10,)
+STYLED = ModuleStyle("circle", finder="rounded", gradient="#2575FC")
+
+
+def make_payload(length: int) -> str:
+    base = "https://example.com/item?id=0123456789&ref=benchmark&"
+    return (base * (length // len(base) + 1))[:length]
+
+
+def make_logo() -> Image.Image:
+    logo = Image.new("RGBA", (256, 256), (220, 40, 40, 255))
+    logo.paste((255, 255, 255, 0), (64, 64, 192, 192))
+    return logo
+
+
+def bench_case(payload_len: int, ec: str, box_size: int, logo: bool, repeat: int) -> dict[str, float]:
+    data = make_payload(payload_len)
+    generator = QRCodeGenerator(size=box_size, error_correction=ERROR_CORRECTION_CODES[ec])
+    timings = {}
+
+    timings["encode"] = best_of(lambda: generator.encode(data), repeat)
+    matrix = generator.get_matrix(data)
+
+    qr = qrcode.QRCode(error_correction=generator.error_correction, box_size=box_size, border=generator.border)
+    qr.add_data(data)
+    qr.make(fit=True)
+    timings["make_image"] = best_of(lambda: qr.make_image(fill_color=generator.fg_color,
+                                                          back_color=generator.bg_color), repeat)
+    factory_img = qr.make_image(fill_color=generator.fg_color, back_color=generator.bg_color)
+    timings["convert"] = best_of(lambda: factory_img.convert("RGB"), repeat)
+    timings["render"] = best_of(lambda: render_matrix(matrix, box_size, generator.fg_color, generator.bg_color),
+                                repeat)
+    timings["render_styled"] = best_of(lambda: render_styled(matrix, box_size, generator.fg_color, generator.bg_color,
+                                                             STYLED, generator.border), repeat)
+
+    img = render_matrix(matrix, box_size, generator.fg_color, generator.bg_color)
+    if logo:
+        source = make_logo()
+        logo_size = min(img.size) // 4
+        timings["logo_prepare"] = best_of(lambda: PreparedLogo(source).prepare(logo_size), repeat)
+        prepared = PreparedLogo(source)
+        logo_img, mask = prepared.prepare(logo_size)
+        pos = ((img.width - logo_size) // 2, (img.height - logo_size) // 2)
+        timings["logo_composite"] = best_of(lambda: img.copy().paste(logo_img, pos, mask), repeat)
+        img = generator.generate(data, logo_img=prepared)
+
+    timings["svg"] = best_of(lambda: generator.write_svg(data, StringIO()), repeat)
+    for preset in PNG_PRESETS:
+        timings[f"save_png_{preset}"] = best_of(lambda: save_image(img, BytesIO(), "PNG", preset=preset), repeat)
+    timings["save_jpeg"] = best_of(lambda: save_image(img, BytesIO(), "JPEG"), repeat)
+    if logo:
+        timings["save_pdf"] = best_of(lambda: save_image(img, BytesIO(), "PDF"), repeat)
+    else:
+        timings["save_pdf"] = best_of(lambda: save_as_pdf(generator, data, BytesIO()), repeat)
+    return timings
+
+
+def run(args: argparse.Namespace) -> dict:
+    lengths = QUICK_PAYLOAD_LENGTHS if args.quick else PAYLOAD_LENGTHS
+    box_sizes = QUICK_BOX_SIZES if args.quick else BOX_SIZES
+    ec_levels = ("L", "H") if args.quick else tuple(ERROR_CORRECTION_CODES)
+    results = []
+    for payload_len, ec, box_size, logo in itertools.product(lengths, ec_levels, box_sizes, (False, True)):
+        timings = bench_case(payload_len, ec, box_size, logo, args.repeat)
+        for stage, seconds in timings.items():
+            results.append({"stage": stage, "payload_len": payload_len, "ec": ec,
+                            "box_size": box_size, "logo": logo, "seconds": seconds})
+        if not args.quiet:
+            summary = ", ".join(f"{stage} {seconds * 1000:.3f}" for stage, seconds in timings.items())
+            print(f"len={payload_len} ec={ec} box={box_size} logo={int(logo)} (ms): {summary}", file=sys.stderr)
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "pillow": PIL.__version__,
+            "quick": args.quick,
+        },
+        "results": results,
+    }
+
+
+def case_key(result: dict) -> tuple:
+    return result["stage"], result["payload_len"], result["ec"], result["box_size"], result["logo"]
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list[str]:
+    """Return a line for every case that got slower than ``threshold`` (a fraction)."""
+    previous = {case_key(result): result["seconds"] for result in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        before = previous.get(case_key(result))
+        if before and result["seconds"] > before * (1 + threshold):
+            stage, payload_len, ec, box_size, logo = case_key(result)
+            regressions.append(
+                f"{stage:<17} len={payload_len:<5} ec={ec} box={box_size:<3} logo={int(logo)}: "
+                f"{before * 1000:.3f} ms -> {result['seconds'] * 1000:.3f} ms "
+                f"(+{(result['seconds'] / before - 1) * 100:.0f}%)"
+            )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="baseline JSON to diff against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown before flagging (0.10 = 10%%)")
+    parser.add_argument("--repeat", type=int, default=5, help="timing repetitions per stage")
+    parser.add_argument("--quick", action="store_true", help="run a reduced grid")
+    parser.add_argument("--quiet", action="store_true", help="do not print per-case timings")
+    args = parser.parse_args()
+
+    current = run(args)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fp:
+            json.dump(current, fp, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fp:
+            regressions = compare(json.load(fp), current, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) over {args.threshold:.0%}:")
+            print("\n".join(regressions))
+            return 1
+        print("No regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,525 @@
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import time
+from contextlib import nullcontext
+from functools import partial
+from itertools import chain, islice
+from typing import IO, TYPE_CHECKING, Iterator
+
+import metrics
+from qr_generator import (
+    DEFAULT_BG,
+    DEFAULT_CHUNKSIZE,
+    DEFAULT_FG,
+    DEFAULT_PNG_PRESET,
+    ERROR_CORRECTION_CODES,
+    ERROR_CORRECTION_LEVELS,
+    FINDER_STYLES,
+    MODULE_SHAPES,
+    OUTPUT_MODES,
+    PNG_PRESETS,
+    ModuleStyle,
+    PreparedLogo,
+    QRCodeGenerator,
+    atomic_write,
+    process_in_pool,
+    save_image,
+)
+
+if TYPE_CHECKING:
+    from sheets import SheetTemplate
+    from store import OutputStore, StoredArtifact
+
+CHECKPOINT_FILE = ".qr_batch_checkpoint"
+OUTPUT_FORMATS = {"png": "PNG", "jpeg": "JPEG", "svg": "SVG"}
+METRICS_HELP = "write stage timings and counters to FILE (Prometheus text for .prom, otherwise JSON)"
+
+
+def parse_error_correction(value: str) -> int:
+    """Accept either a GUI label such as "High (25%)" or a letter L/M/Q/H."""
+    if value in ERROR_CORRECTION_LEVELS:
+        return ERROR_CORRECTION_LEVELS[value]
+    try:
+        return ERROR_CORRECTION_CODES[value.upper()]
+    except KeyError:
+        choices = ", ".join([*ERROR_CORRECTION_CODES, *ERROR_CORRECTION_LEVELS])
+        raise argparse.ArgumentTypeError(f"invalid error correction {value!r} (choose from {choices})")
+
+
+def parse_indices(value: str) -> list[int]:
+    """Parse record indices such as ``3,10-12`` into ``[3, 10, 11, 12]``."""
+    indices = []
+    try:
+        for part in value.split(","):
+            first, _, last = part.strip().partition("-")
+            indices.extend(range(int(first), int(last or first) + 1))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid indices {value!r}: use a list such as 3,10-12")
+    return indices
+
+
+def parse_sheet_template(value: str) -> "SheetTemplate":
+    from sheets import parse_template
+    try:
+        return parse_template(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def safe_name(name: str) -> str:
+    return re.sub(r"[^\w.-]+", "_", name).strip("._") or "qr"
+
+
+def detect_input_format(path: str) -> str:
+    if path == "-":
+        return "lines"
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".jsonl", ".ndjson"):
+        return "jsonl"
+    if ext == ".csv":
+        return "csv"
+    return "lines"
+
+
+def read_rows(stream: IO[str], input_format: str, column: str = "data",
+              name_column: str | None = None) -> Iterator[tuple[str | None, str | ValueError]]:
+    """
+    Stream ``(name, payload)`` pairs from CSV, JSONL or plain-text lines.
+
+    CSV input uses ``column`` when the first row is a header containing it,
+    otherwise every row's first cell is the payload. JSONL lines may be plain
+    strings or objects holding the payload under ``column``. A row that
+    cannot be read yields a ``ValueError`` in place of its payload, so it
+    fails on its own (see ``process_in_pool``) instead of ending the run.
+    """
+    if input_format == "csv":
+        reader = _csv_rows(stream)
+        header = next(reader, None)
+        if header is None:
+            return
+        if isinstance(header, list) and column in header:
+            data_idx = header.index(column)
+            name_idx = header.index(name_column) if name_column in header else None
+            for row in reader:
+                if isinstance(row, ValueError):
+                    yield None, row
+                elif len(row) <= data_idx:
+                    if any(row):
+                        yield None, ValueError(f"CSV row has no {column!r} column: {row!r}")
+                else:
+                    yield (row[name_idx] if name_idx is not None and name_idx < len(row) else None), row[data_idx]
+        else:
+            for row in chain([header], reader):
+                if isinstance(row, ValueError):
+                    yield None, row
+                elif row:
+                    yield None, row[0]
+    elif input_format == "jsonl":
+        for line in stream:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield None, ValueError(f"malformed JSON: {e}")
+                continue
+            name = None
+            if isinstance(record, dict):
+                if column not in record:
+                    yield None, ValueError(f"JSON object has no {column!r} key")
+                    continue
+                if name_column and record.get(name_column) is not None:
+                    name = str(record[name_column])
+                record = record[column]
+            if record is None or isinstance(record, (dict, list)):
+                yield name, ValueError(f"JSON payload must be a string or number, not {json.dumps(record)[:40]}")
+            else:
+                yield name, str(record)
+    else:
+        for line in stream:
+            line = line.rstrip("\r\n")
+            if line:
+                yield None, line
+
+
+def _csv_rows(stream: IO[str]) -> Iterator[list[str] | ValueError]:
+    # csv.reader can carry on after a bad row, so its errors are yielded rather than raised.
+    reader = csv.reader(stream)
+    while True:
+        try:
+            yield next(reader)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            yield ValueError(f"malformed CSV row {reader.line_num}: {e}")
+
+
+def export_one(generator: QRCodeGenerator, out_dir: str, fmt: str, logo_img: PreparedLogo | None,
+               row: tuple[str, str], png_preset: str = DEFAULT_PNG_PRESET) -> int:
+    """
+    Render one ``(name, payload)`` row into ``out_dir`` and return the bytes written.
+    Files are written under a temporary name and renamed, so an interrupted
+    run never leaves a truncated code behind.
+    """
+    name, data = row
+    path = os.path.join(out_dir, f"{name}.{fmt}")
+    with atomic_write(path) as tmp_path:
+        if fmt == "svg":
+            generator.save_as_svg(data, tmp_path, logo_img)
+        else:
+            save_image(generator.generate(data, logo_img=logo_img), tmp_path, OUTPUT_FORMATS[fmt], preset=png_preset)
+    return os.path.getsize(path)
+
+
+def store_one(store: "OutputStore", generator: QRCodeGenerator, fmt: str, logo_img: PreparedLogo | None,
+              logo: str | None, row: tuple[str, str], png_preset: str = DEFAULT_PNG_PRESET) -> "StoredArtifact":
+    """
+    Add one ``(name, payload)`` row to a content-addressed ``store``,
+    rendering it only when no identical code is stored yet. ``logo`` is the
+    digest of ``logo_img``.
+    """
+    def write(path: str) -> None:
+        if fmt == "svg":
+            generator.save_as_svg(data, path, logo_img)
+        else:
+            save_image(generator.generate(data, logo_img=logo_img), path, OUTPUT_FORMATS[fmt], preset=png_preset)
+
+    from store import artifact_key
+    name, data = row
+    return store.store(artifact_key(generator, data, fmt, logo, png_preset), fmt, write)
+
+
+def read_checkpoint(out_dir: str) -> int:
+    try:
+        with open(os.path.join(out_dir, CHECKPOINT_FILE), encoding="utf-8") as fp:
+            return int(json.load(fp)["completed"])
+    except (OSError, ValueError, KeyError):
+        return 0
+
+
+def write_checkpoint(out_dir: str, completed: int) -> None:
+    path = os.path.join(out_dir, CHECKPOINT_FILE)
+    with atomic_write(path) as tmp_path, open(tmp_path, "w", encoding="utf-8") as fp:
+        json.dump({"completed": completed}, fp)
+
+
+def run_batch(args: argparse.Namespace) -> int:
+    if args.verify and args.format == "svg":
+        print("--verify needs a raster format (png or jpeg)", file=sys.stderr)
+        return 2
+    if args.store and args.resume:
+        print("--resume is not needed with --store: stored codes are never rendered twice", file=sys.stderr)
+        return 2
+    if args.prune and not args.store:
+        print("--prune needs --store", file=sys.stderr)
+        return 2
+    try:
+        generator = QRCodeGenerator(size=args.size, error_correction=args.ec, fg_color=args.fg, bg_color=args.bg,
+                                    mode=args.mode, style=ModuleStyle(args.shape, args.finder, args.gradient))
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    os.makedirs(args.out, exist_ok=True)
+    recorder = metrics.enable() if args.metrics else None
+    logo_img = None
+    if args.logo:
+        from PIL import Image
+        logo_img = PreparedLogo(Image.open(args.logo))
+        logo_img.image.load()
+
+    store = None
+    if args.store:
+        from store import ManifestEntry, OutputStore, logo_digest
+        store = OutputStore(args.out)
+
+    verifier = None
+    verified = unscannable = at_risk = 0
+    if args.verify:
+        from verify import Verifier
+        verifier = Verifier(workers=args.verify_workers, decoder=args.decoder)
+
+    def report_verified(results: list) -> None:
+        nonlocal verified, unscannable, at_risk
+        for index, check in results:
+            verified += 1
+            if not check.ok:
+                unscannable += 1
+                print(f"row {index}: not scannable: {check.error}", file=sys.stderr)
+            elif check.at_risk:
+                at_risk += 1
+                print(f"row {index}: scan risk {check.risk:.2f} (contrast {check.contrast:.1f}:1, "
+                      f"error correction {check.damage:.0%} used)", file=sys.stderr)
+
+    skip = read_checkpoint(args.out) if args.resume else 0
+    input_format = args.input_format or detect_input_format(args.input)
+    stream = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8", newline="")
+    try:
+        rows = read_rows(stream, input_format, args.column, args.name_column)
+        named = (
+            data if isinstance(data, ValueError) else (safe_name(name) if name else f"{index:08d}", data)
+            for index, (name, data) in enumerate(rows)
+        )
+        work = islice(named, skip, None)
+        if store is None:
+            task = partial(export_one, generator, args.out, args.format, logo_img, png_preset=args.png_preset)
+        else:
+            task = partial(store_one, store, generator, args.format, logo_img, logo_digest(logo_img),
+                           png_preset=args.png_preset)
+
+        started = time.perf_counter()
+        completed = skip
+        generated = failed = written = reused = 0
+        with store.open_manifest() if store is not None else nullcontext() as manifest:
+            for result in process_in_pool(task, work, workers=args.workers, chunksize=args.chunk_size):
+                completed += 1
+                if result.ok:
+                    generated += 1
+                    name, data = result.data
+                    if store is None:
+                        written += result.result
+                        path = os.path.join(args.out, f"{name}.{args.format}")
+                    else:
+                        stored = result.result
+                        if stored.created:
+                            written += stored.size
+                        else:
+                            reused += 1
+                        path = stored.path
+                        manifest.add(ManifestEntry(result.index, name, stored.key,
+                                                   store.relpath(stored.key, args.format)))
+                    if verifier is not None:
+                        report_verified(verifier.submit(skip + result.index, generator, data, path))
+                else:
+                    failed += 1
+                    print(f"row {skip + result.index}: {result.error}", file=sys.stderr)
+                if store is None and completed % args.chunk_size == 0:
+                    write_checkpoint(args.out, completed)
+            if store is None:
+                write_checkpoint(args.out, completed)
+            if verifier is not None:
+                report_verified(verifier.finish())
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+    elapsed = time.perf_counter() - started
+    rate = generated / elapsed if elapsed > 0 else 0.0
+    resumed = f", resumed after {skip} rows" if skip else ""
+    resumed += f", {reused} already stored" if store is not None else ""
+    print(f"Generated {generated} codes ({failed} failed{resumed}) in {elapsed:.2f}s: "
+          f"{rate:.1f} codes/s, {written / 1e6:.2f} MB written to {args.out}", file=sys.stderr)
+    if verifier is not None:
+        print(f"Verified {verified} codes: {unscannable} not scannable, {at_risk} at risk", file=sys.stderr)
+    if args.prune:
+        print(f"Pruned {store.prune()} codes no longer in the manifest", file=sys.stderr)
+    if recorder is not None:
+        recorder.write(args.metrics)
+        metrics.disable()
+    return 1 if failed or unscannable else 0
+
+
+def run_sheet(args: argparse.Namespace) -> int:
+    from sheets import write_sheets
+    generator = QRCodeGenerator(error_correction=args.ec, fg_color=args.fg, bg_color=args.bg, border=args.border)
+    recorder = metrics.enable() if args.metrics else None
+    failed = 0
+
+    def report(index: int, data: str, error: Exception) -> None:
+        nonlocal failed
+        failed += 1
+        print(f"row {index}: {type(error).__name__}: {error}", file=sys.stderr)
+
+    input_format = args.input_format or detect_input_format(args.input)
+    stream = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8", newline="")
+    try:
+        started = time.perf_counter()
+        payloads = (data for _, data in read_rows(stream, input_format, args.column))
+        generated = write_sheets(generator, payloads, args.out, args.template, on_error=report)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+    pages = -(-generated // args.template.per_page) or 1
+    print(f"Laid out {generated} codes ({failed} failed) on {pages} pages in {time.perf_counter() - started:.2f}s: "
+          f"{args.out}", file=sys.stderr)
+    if recorder is not None:
+        recorder.write(args.metrics)
+        metrics.disable()
+    return 1 if failed else 0
+
+
+def run_archive(args: argparse.Namespace) -> int:
+    from archive import write_archive
+    generator = QRCodeGenerator(error_correction=args.ec)
+    recorder = metrics.enable() if args.metrics else None
+    failed = 0
+
+    def report(index: int, data: str, error: str) -> None:
+        nonlocal failed
+        failed += 1
+        print(f"row {index}: {error}", file=sys.stderr)
+
+    input_format = args.input_format or detect_input_format(args.input)
+    stream = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8", newline="")
+    try:
+        started = time.perf_counter()
+        payloads = (data for _, data in read_rows(stream, input_format, args.column))
+        written = write_archive(generator, payloads, args.out, workers=args.workers, chunksize=args.chunk_size,
+                                on_error=report)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"Archived {written} codes ({failed} failed) in {elapsed:.2f}s "
+          f"({written / elapsed if elapsed else 0:.0f} codes/s, {os.path.getsize(args.out)} bytes): {args.out}",
+          file=sys.stderr)
+    if recorder is not None:
+        recorder.write(args.metrics)
+        metrics.disable()
+    return 1 if failed else 0
+
+
+def run_export(args: argparse.Namespace) -> int:
+    from archive import MatrixArchive, export_records
+    try:
+        generator = QRCodeGenerator(size=args.size, fg_color=args.fg, bg_color=args.bg, border=args.border,
+                                    mode=args.mode, style=ModuleStyle(args.shape, args.finder, args.gradient))
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    logo_img = None
+    if args.logo:
+        from PIL import Image
+        logo_img = PreparedLogo(Image.open(args.logo))
+        logo_img.image.load()
+    with MatrixArchive(args.archive) as archive:
+        indices = args.indices if args.indices is not None else range(len(archive))
+        try:
+            paths = export_records(archive, indices, generator, args.out, args.format, logo_img, args.png_preset)
+        except IndexError:
+            print(f"{args.archive} holds {len(archive)} codes; indices must be below that", file=sys.stderr)
+            return 2
+    print(f"Exported {len(paths)} codes to {args.out}", file=sys.stderr)
+    return 0
+
+
+def run_serve(args: argparse.Namespace) -> int:
+    import asyncio
+    from server import serve
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m qr_generator", description="Headless QR code generation.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    batch = commands.add_parser("batch", help="generate one file per input row")
+    batch.add_argument("input", help="CSV, JSONL or text file of payloads, or - for stdin")
+    batch.add_argument("--out", default=".", help="output directory (default: current directory)")
+    batch.add_argument("--format", choices=OUTPUT_FORMATS, default="png", help="output file format")
+    batch.add_argument("--input-format", choices=("csv", "jsonl", "lines"),
+                       help="input format (default: from the file extension, lines for stdin)")
+    batch.add_argument("--column", default="data", help="CSV header / JSON key holding the payload")
+    batch.add_argument("--name-column", help="CSV header / JSON key used as the output file name")
+    batch.add_argument("--size", type=int, default=10, help="box size in pixels (1-20)")
+    batch.add_argument("--ec", type=parse_error_correction, default="High (25%)",
+                       help="error correction: L, M, Q, H or a GUI label such as 'High (25%%)'")
+    batch.add_argument("--fg", default=DEFAULT_FG, help="foreground colour")
+    batch.add_argument("--bg", default=DEFAULT_BG, help="background colour")
+    batch.add_argument("--logo", help="logo image to place in the centre")
+    batch.add_argument("--shape", choices=MODULE_SHAPES, default="square", help="module shape (default: square)")
+    batch.add_argument("--finder", choices=FINDER_STYLES, help="finder pattern style (default: the module shape)")
+    batch.add_argument("--gradient", metavar="COLOUR", help="fade the modules from --fg to this colour")
+    batch.add_argument("--mode", choices=OUTPUT_MODES, default="auto",
+                       help="image mode: 1-bit, grey, palette, RGB or auto (1-bit for black on white, "
+                            "otherwise palette; default)")
+    batch.add_argument("--png-preset", choices=tuple(PNG_PRESETS), default=DEFAULT_PNG_PRESET,
+                       help="PNG compression: fast, balanced (default) or small")
+    batch.add_argument("--workers", type=int, help="worker processes (default: all CPUs)")
+    batch.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNKSIZE, help="rows sent to a worker at once")
+    batch.add_argument("--resume", action="store_true", help="skip rows completed by a previous run")
+    batch.add_argument("--store", action="store_true",
+                       help="treat --out as a content-addressed store: identical codes are rendered once, "
+                            "unchanged rows are skipped on re-runs and manifest.jsonl maps rows to files")
+    batch.add_argument("--prune", action="store_true", help="with --store, delete codes no row refers to any more")
+    batch.add_argument("--verify", action="store_true",
+                       help="decode every written code and report unscannable or risky ones")
+    batch.add_argument("--verify-workers", type=int, default=2, help="verification threads (default: 2)")
+    batch.add_argument("--decoder", choices=("auto", "pyzbar", "opencv", "builtin"), default="auto",
+                       help="decoder for --verify (default: pyzbar or OpenCV if installed, else built-in)")
+    batch.add_argument("--metrics", metavar="FILE", help=METRICS_HELP)
+    batch.set_defaults(func=run_batch)
+
+    sheet = commands.add_parser("sheet", help="lay codes out on printable PDF label sheets")
+    sheet.add_argument("input", help="CSV, JSONL or text file of payloads, or - for stdin")
+    sheet.add_argument("--out", required=True, help="PDF file to write")
+    sheet.add_argument("--template", type=parse_sheet_template, default="a4",
+                       help="a4, letter, avery-l7160, avery-5160 or PAGE:COLSxROWS such as a4:5x8 "
+                            "or 100x150mm:2x3 (default: a4)")
+    sheet.add_argument("--input-format", choices=("csv", "jsonl", "lines"),
+                       help="input format (default: from the file extension, lines for stdin)")
+    sheet.add_argument("--column", default="data", help="CSV header / JSON key holding the payload")
+    sheet.add_argument("--ec", type=parse_error_correction, default="High (25%)",
+                       help="error correction: L, M, Q, H or a GUI label such as 'High (25%%)'")
+    sheet.add_argument("--fg", default=DEFAULT_FG, help="foreground colour")
+    sheet.add_argument("--bg", default=DEFAULT_BG, help="background colour")
+    sheet.add_argument("--border", type=int, default=2, help="quiet zone in modules (default: 2)")
+    sheet.add_argument("--metrics", metavar="FILE", help=METRICS_HELP)
+    sheet.set_defaults(func=run_sheet)
+
+    archive = commands.add_parser("archive", help="encode payloads into one memory-mapped matrix archive")
+    archive.add_argument("input", help="CSV, JSONL or text file of payloads, or - for stdin")
+    archive.add_argument("--out", required=True, help="archive file to write")
+    archive.add_argument("--input-format", choices=("csv", "jsonl", "lines"),
+                         help="input format (default: from the file extension, lines for stdin)")
+    archive.add_argument("--column", default="data", help="CSV header / JSON key holding the payload")
+    archive.add_argument("--ec", type=parse_error_correction, default="High (25%)",
+                         help="error correction: L, M, Q, H or a GUI label such as 'High (25%%)'")
+    archive.add_argument("--workers", type=int, help="worker processes (default: all CPUs)")
+    archive.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNKSIZE, help="rows sent to a worker at once")
+    archive.add_argument("--metrics", metavar="FILE", help=METRICS_HELP)
+    archive.set_defaults(func=run_archive)
+
+    export = commands.add_parser("export", help="render codes from a matrix archive")
+    export.add_argument("archive", help="archive written by the archive command")
+    export.add_argument("--out", default=".", help="output directory (default: current directory)")
+    export.add_argument("--indices", type=parse_indices, help="records to export, e.g. 3,10-12 (default: all)")
+    export.add_argument("--format", choices=OUTPUT_FORMATS, default="png", help="output file format")
+    export.add_argument("--size", type=int, default=10, help="box size in pixels (1-20)")
+    export.add_argument("--border", type=int, default=2, help="quiet zone in modules (default: 2)")
+    export.add_argument("--fg", default=DEFAULT_FG, help="foreground colour")
+    export.add_argument("--bg", default=DEFAULT_BG, help="background colour")
+    export.add_argument("--logo", help="logo image to place in the centre")
+    export.add_argument("--shape", choices=MODULE_SHAPES, default="square", help="module shape (default: square)")
+    export.add_argument("--finder", choices=FINDER_STYLES, help="finder pattern style (default: the module shape)")
+    export.add_argument("--gradient", metavar="COLOUR", help="fade the modules from --fg to this colour")
+    export.add_argument("--mode", choices=OUTPUT_MODES, default="auto",
+                        help="image mode: 1-bit, grey, palette, RGB or auto (default)")
+    export.add_argument("--png-preset", choices=tuple(PNG_PRESETS), default=DEFAULT_PNG_PRESET,
+                        help="PNG compression: fast, balanced (default) or small")
+    export.set_defaults(func=run_export)
+
+    serve = commands.add_parser("serve", help="serve QR codes over HTTP")
+    serve.add_argument("--host", default="127.0.0.1", help="interface to bind (default: 127.0.0.1)")
+    serve.add_argument("--port", type=int, default=8080, help="port to listen on (default: 8080)")
+    serve.add_argument("--workers", type=int, help="render processes (default: all CPUs)")
+    serve.set_defaults(func=run_serve)
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from itertools import count
+from typing import Hashable, NamedTuple
+
+from PIL import Image
+from qr_generator import PreparedLogo, QRCodeGenerator, save_image
+
+DEFAULT_MEMORY_BUDGET = 64 * 1024 * 1024
+DEFAULT_THUMBNAIL_SIZE = 48
+
+
+class HistoryEntry(NamedTuple):
+    content: str
+    generator: QRCodeGenerator
+    logo_img: PreparedLogo | None
+    thumbnail: Image.Image
+    size: tuple[int, int]
+    created: float
+
+
+def image_nbytes(img: Image.Image) -> int:
+    return img.width * img.height * len(img.getbands())
+
+
+class HistoryStore:
+    """
+    Memory-bounded store of generated QR codes.
+
+    Every entry keeps its payload, the generator (render settings), the logo
+    and a small thumbnail. Full-size images live in an LRU that holds at most
+    ``memory_budget`` bytes of pixels; images evicted from it are written as
+    compressed PNGs to a private spill directory when ``spill`` is true, and
+    otherwise re-rendered from the stored settings on demand.
+    """
+
+    def __init__(self, memory_budget: int = DEFAULT_MEMORY_BUDGET, thumbnail_size: int = DEFAULT_THUMBNAIL_SIZE,
+                 spill: bool = True, spill_dir: str | None = None) -> None:
+        self.memory_budget = memory_budget
+        self.thumbnail_size = thumbnail_size
+        self.spill = spill
+        self.memory_bytes = 0
+        self._spill_dir = spill_dir
+        self._owns_spill_dir = spill_dir is None
+        self._entries: dict[Hashable, HistoryEntry] = {}
+        self._images: OrderedDict[Hashable, Image.Image] = OrderedDict()
+        self._spilled: dict[Hashable, str] = {}
+        self._spill_names = count()
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def get(self, key: Hashable) -> HistoryEntry | None:
+        return self._entries.get(key)
+
+    def add(self, key: Hashable, content: str, generator: QRCodeGenerator, image: Image.Image,
+            logo_img: PreparedLogo | None = None) -> HistoryEntry:
+        # 1-bit and palette images would be resized nearest-neighbour.
+        thumbnail = image.convert("RGB") if image.mode in ("1", "P") else image.copy()
+        thumbnail.thumbnail((self.thumbnail_size, self.thumbnail_size), Image.Resampling.BOX)
+        entry = HistoryEntry(content, generator, logo_img, thumbnail, image.size, time.time())
+        with self._lock:
+            self.remove(key)
+            self._entries[key] = entry
+            self._remember(key, image)
+        return entry
+
+    def get_image(self, key: Hashable) -> Image.Image:
+        """
+        Return the full-size image for ``key`` from memory, the spill
+        directory or, failing both, by re-rendering it.
+        """
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+                return image
+            entry = self._entries[key]
+            path = self._spilled.pop(key, None)
+        if path is not None and os.path.exists(path):
+            with Image.open(path) as spilled:
+                image = spilled.copy()
+            os.remove(path)
+        else:
+            image = entry.generator.generate(entry.content, logo_img=entry.logo_img)
+        with self._lock:
+            if key in self._entries:
+                self._remember(key, image)
+        return image
+
+    def remove(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+            image = self._images.pop(key, None)
+            if image is not None:
+                self.memory_bytes -= image_nbytes(image)
+            path = self._spilled.pop(key, None)
+        if path is not None and os.path.exists(path):
+            os.remove(path)
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in list(self._entries):
+                self.remove(key)
+
+    def close(self) -> None:
+        """Drop every entry and delete the spill directory if this store created it."""
+        self.clear()
+        if self._owns_spill_dir and self._spill_dir is not None:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+            self._spill_dir = None
+
+    def _remember(self, key: Hashable, image: Image.Image) -> None:
+        self._images[key] = image
+        self.memory_bytes += image_nbytes(image)
+        while self.memory_bytes > self.memory_budget and len(self._images) > 1:
+            old_key, old_image = self._images.popitem(last=False)
+            self.memory_bytes -= image_nbytes(old_image)
+            if self.spill:
+                self._spill_image(old_key, old_image)
+
+    def _spill_image(self, key: Hashable, image: Image.Image) -> None:
+        if self._spill_dir is None:
+            self._spill_dir = tempfile.mkdtemp(prefix="qr-history-")
+        path = os.path.join(self._spill_dir, f"{next(self._spill_names)}.png")
+        save_image(image, path, "PNG", preset="fast")
+        self._spilled[key] = path
@@ -0,0 +1,180 @@
+"""
+Opt-in timing and counters for code generation.
+
+Instrumented code calls ``stage(name)`` around each step and ``count(name)``
+for events. Until ``enable()`` is called both return immediately, so the
+hooks can stay in hot paths: a disabled ``with stage(...)`` costs one
+global lookup and a shared no-op context manager.
+
+Stages: ``encode`` (a cache miss, including the next two), ``version_fit``,
+``mask``, ``rasterize``, ``logo`` and ``save``. Counters:
+``codes_generated``, ``bytes_written``, ``cache_hits`` and ``cache_misses``.
+
+    import metrics
+    recorder = metrics.enable()
+    recorder.subscribe(lambda stage, seconds: print(stage, seconds))
+    ...
+    print(recorder.to_prometheus())
+"""
+import json
+import threading
+from contextlib import nullcontext
+from time import perf_counter
+from typing import Callable
+
+STAGES = ("encode", "version_fit", "mask", "rasterize", "logo", "save")
+COUNTERS = ("codes_generated", "bytes_written", "cache_hits", "cache_misses")
+
+_NOOP = nullcontext()
+
+_active: "Metrics | None" = None
+
+
+class StageStats:
+    """Running count, total, minimum and maximum of one stage's durations."""
+
+    __slots__ = ("count", "total", "min", "max")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def add(self, count: int, total: float, low: float, high: float) -> None:
+        self.count += count
+        self.total += total
+        self.min = min(self.min, low)
+        self.max = max(self.max, high)
+
+    def as_dict(self) -> dict:
+        return {"count": self.count, "total_seconds": self.total, "min_seconds": self.min,
+                "max_seconds": self.max, "mean_seconds": self.total / self.count}
+
+
+class Metrics:
+    """
+    Thread-safe store of stage timings and counters.
+
+    Callbacks added with ``subscribe`` are called with ``(stage, seconds)``
+    after every timed stage, in the thread that ran it.
+    """
+
+    def __init__(self) -> None:
+        self.stages: dict[str, StageStats] = {}
+        self.counters: dict[str, int] = {}
+        self._hooks: list[Callable[[str, float], None]] = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, hook: Callable[[str, float], None]) -> None:
+        self._hooks.append(hook)
+
+    def unsubscribe(self, hook: Callable[[str, float], None]) -> None:
+        self._hooks.remove(hook)
+
+    def observe(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            stats = self.stages.get(stage)
+            if stats is None:
+                stats = self.stages[stage] = StageStats()
+            stats.add(1, seconds, seconds, seconds)
+        for hook in self._hooks:
+            hook(stage, seconds)
+
+    def increment(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def snapshot(self) -> dict:
+        """Return the stage statistics and counters as plain, JSON-ready data."""
+        with self._lock:
+            return {"stages": {name: stats.as_dict() for name, stats in self.stages.items()},
+                    "counters": dict(self.counters)}
+
+    def merge(self, snapshot: dict) -> None:
+        """Add a ``snapshot()`` taken elsewhere, e.g. in a worker process."""
+        with self._lock:
+            for name, stats in snapshot["stages"].items():
+                self.stages.setdefault(name, StageStats()).add(
+                    stats["count"], stats["total_seconds"], stats["min_seconds"], stats["max_seconds"])
+            for name, value in snapshot["counters"].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def reset(self) -> None:
+        with self._lock:
+            self.stages.clear()
+            self.counters.clear()
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2, sort_keys=True)
+
+    def to_prometheus(self, prefix: str = "qr") -> str:
+        """
+        Render the metrics in the Prometheus text exposition format: a
+        summary of stage durations plus one counter per event.
+        """
+        snapshot = self.snapshot()
+        lines = []
+        if snapshot["stages"]:
+            lines.append(f"# HELP {prefix}_stage_seconds Time spent in each generation stage.")
+            lines.append(f"# TYPE {prefix}_stage_seconds summary")
+            for name, stats in sorted(snapshot["stages"].items()):
+                lines.append(f'{prefix}_stage_seconds_count{{stage="{name}"}} {stats["count"]}')
+                lines.append(f'{prefix}_stage_seconds_sum{{stage="{name}"}} {stats["total_seconds"]:.9f}')
+            lines.append(f"# TYPE {prefix}_stage_seconds_max gauge")
+            for name, stats in sorted(snapshot["stages"].items()):
+                lines.append(f'{prefix}_stage_seconds_max{{stage="{name}"}} {stats["max_seconds"]:.9f}')
+        for name, value in sorted(snapshot["counters"].items()):
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {value}")
+        return "".join(line + "\n" for line in lines)
+
+    def write(self, path: str) -> None:
+        """Write Prometheus text to ``.prom`` files and JSON to anything else."""
+        text = self.to_prometheus() if str(path).endswith(".prom") else self.to_json() + "\n"
+        with open(path, "w", encoding="utf-8") as fp:
+            fp.write(text)
+
+
+class _Timer:
+    __slots__ = ("recorder", "name", "start")
+
+    def __init__(self, recorder: Metrics, name: str) -> None:
+        self.recorder = recorder
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.start = perf_counter()
+
+    def __exit__(self, *exc_info) -> None:
+        self.recorder.observe(self.name, perf_counter() - self.start)
+
+
+def enable(recorder: Metrics | None = None) -> Metrics:
+    """Start recording into ``recorder`` (a new Metrics by default) and return it."""
+    global _active
+    _active = recorder if recorder is not None else Metrics()
+    return _active
+
+
+def disable() -> None:
+    global _active
+    _active = None
+
+
+def active() -> Metrics | None:
+    return _active
+
+
+def stage(name: str):
+    """Return a context manager that times its block as stage ``name``."""
+    recorder = _active
+    if recorder is None:
+        return _NOOP
+    return _Timer(recorder, name)
+
+
+def count(name: str, amount: int = 1) -> None:
+    recorder = _active
+    if recorder is not None:
+        recorder.increment(name, amount)
@@ -0,0 +1,365 @@
+import re
+from bisect import bisect_left
+from itertools import accumulate
+from typing import NamedTuple
+
+import metrics
+import qrcode
+from qrcode import util
+from qrcode.base import rs_blocks
+from qrcode.exceptions import DataOverflowError
+from qr_masking import HAVE_NUMPY, place_and_mask
+
+MODE_NUMBER = util.MODE_NUMBER
+MODE_ALPHA_NUM = util.MODE_ALPHA_NUM
+MODE_8BIT_BYTE = util.MODE_8BIT_BYTE
+MODE_KANJI = util.MODE_KANJI
+MODES = (MODE_NUMBER, MODE_ALPHA_NUM, MODE_8BIT_BYTE, MODE_KANJI)
+MODE_STRUCTURED_APPEND = 0b0011
+
+# Structured Append header: mode indicator, symbol position, symbol count
+# minus one and the parity byte of the whole message.
+STRUCTURED_APPEND_BITS = 20
+MAX_STRUCTURED_SYMBOLS = 16
+
+# Versions sharing the same character-count field widths.
+VERSION_CLASSES = ((1, 9), (10, 26), (27, 40))
+
+# Data bits available per version, indexed by error correction level.
+CAPACITY_BITS = util.BIT_LIMIT_TABLE
+
+# Cost of one character in sixths of a bit, so fractional numeric (10/3) and
+# alphanumeric (11/2) costs stay integral until a segment is closed.
+CHAR_COST = {MODE_NUMBER: 20, MODE_ALPHA_NUM: 33, MODE_8BIT_BYTE: 48, MODE_KANJI: 78}
+
+_RUN_PATTERN = re.compile(r"([0-9]+)|([A-Z $%*+\-./:]+)|([^0-9A-Z $%*+\-./:\x80-\U0010ffff]+)|([^\x00-\x7f]+)")
+_ALPHA_NUM_VALUES = {char: index for index, char in enumerate(util.ALPHA_NUM)}
+
+
+class Segment(NamedTuple):
+    mode: int
+    data: bytes
+    length: int
+
+
+class KanjiData(util.QRData):
+    """
+    Shift JIS double-byte characters in QR kanji mode, which qrcode's own
+    QRData does not support.
+    """
+
+    def __init__(self, data: bytes) -> None:
+        self.mode = MODE_KANJI
+        self.data = data
+
+    def __len__(self) -> int:
+        return len(self.data) // 2
+
+    def write(self, buffer: util.BitBuffer) -> None:
+        for i in range(0, len(self.data), 2):
+            buffer.put(_kanji_value(self.data[i], self.data[i + 1]), 13)
+
+
+def _kanji_value(high: int, low: int) -> int:
+    code = (high << 8) | low
+    code -= 0x8140 if code <= 0x9FFC else 0xC140
+    return (code >> 8) * 0xC0 + (code & 0xFF)
+
+
+def _is_kanji(char: str) -> bool:
+    try:
+        encoded = char.encode("shift_jis")
+    except UnicodeEncodeError:
+        return False
+    if len(encoded) != 2:
+        return False
+    code = (encoded[0] << 8) | encoded[1]
+    return 0x8140 <= code <= 0x9FFC or 0xE040 <= code <= 0xEBBF
+
+
+def _char_runs(data: str) -> list[tuple[str, tuple[int, ...]]]:
+    """
+    Split ``data`` into runs of characters that can be encoded in the same
+    set of modes, most compact first.
+    """
+    runs = []
+    for match in _RUN_PATTERN.finditer(data):
+        numeric, alpha, ascii_text, other = match.groups()
+        if numeric:
+            runs.append((numeric, (MODE_NUMBER, MODE_ALPHA_NUM, MODE_8BIT_BYTE)))
+        elif alpha:
+            runs.append((alpha, (MODE_ALPHA_NUM, MODE_8BIT_BYTE)))
+        elif ascii_text:
+            runs.append((ascii_text, (MODE_8BIT_BYTE,)))
+        else:
+            start = 0
+            for i in range(1, len(other) + 1):
+                if i == len(other) or _is_kanji(other[i]) != _is_kanji(other[start]):
+                    text = other[start:i]
+                    kanji = _is_kanji(text[0])
+                    runs.append((text, (MODE_KANJI, MODE_8BIT_BYTE) if kanji else (MODE_8BIT_BYTE,)))
+                    start = i
+    return runs
+
+
+def _run_cost(text: str, mode: int) -> int:
+    if mode == MODE_8BIT_BYTE:
+        return CHAR_COST[mode] * len(text.encode("utf-8"))
+    return CHAR_COST[mode] * len(text)
+
+
+def optimal_segments(data: str, version: int) -> list[Segment]:
+    """
+    Split ``data`` into the mode segments that need the fewest bits at
+    ``version``'s character-count widths.
+
+    This is the usual shortest-path over modes, run per block of characters
+    sharing the same encodable modes rather than per character; switching
+    part-way through such a block never saves bits.
+    """
+    count_bits = util.mode_sizes_for_version(version)
+    head_cost = {mode: (4 + count_bits[mode]) * 6 for mode in MODES}
+    runs = _char_runs(data)
+    if not runs:
+        return [Segment(MODE_8BIT_BYTE, b"", 0)]
+
+    costs = dict(head_cost)
+    choices = []  # per run: {state mode: mode the run itself was encoded in}
+    for text, allowed in runs:
+        current = {mode: costs[mode] + _run_cost(text, mode) for mode in allowed}
+        chosen = {mode: mode for mode in allowed}
+        for to_mode in MODES:
+            for from_mode in allowed:
+                switched = -(-current[from_mode] // 6) * 6 + head_cost[to_mode]
+                if to_mode not in current or switched < current[to_mode]:
+                    current[to_mode] = switched
+                    chosen[to_mode] = from_mode
+        costs = current
+        choices.append(chosen)
+
+    state = min((mode for mode in choices[-1] if choices[-1][mode] == mode), key=costs.__getitem__)
+    run_modes = []
+    for chosen in reversed(choices):
+        state = chosen[state]
+        run_modes.append(state)
+    run_modes.reverse()
+
+    segments = []
+    for (text, _), mode in zip(runs, run_modes):
+        if segments and segments[-1][0] == mode:
+            segments[-1][1].append(text)
+        else:
+            segments.append((mode, [text]))
+    return [_make_segment(mode, "".join(parts)) for mode, parts in segments]
+
+
+def _make_segment(mode: int, text: str) -> Segment:
+    if mode == MODE_KANJI:
+        return Segment(mode, text.encode("shift_jis"), len(text))
+    if mode == MODE_8BIT_BYTE:
+        encoded = text.encode("utf-8")
+        return Segment(mode, encoded, len(encoded))
+    return Segment(mode, text.encode("ascii"), len(text))
+
+
+def segment_bits(segments: list[Segment], version: int) -> int:
+    """Return the exact number of data bits ``segments`` need at ``version``."""
+    count_bits = util.mode_sizes_for_version(version)
+    total = 0
+    for segment in segments:
+        total += 4 + count_bits[segment.mode]
+        n = segment.length
+        if segment.mode == MODE_NUMBER:
+            total += 10 * (n // 3) + (0, 4, 7)[n % 3]
+        elif segment.mode == MODE_ALPHA_NUM:
+            total += 11 * (n // 2) + 6 * (n % 2)
+        elif segment.mode == MODE_8BIT_BYTE:
+            total += 8 * n
+        else:
+            total += 13 * n
+    return total
+
+
+def plan_segments(data: str, error_correction: int, reserved_bits: int = 0) -> tuple[int, list[Segment]]:
+    """
+    Return the smallest version that holds ``data`` and its segments, plus
+    ``reserved_bits`` of header.
+
+    Bit lengths are computed arithmetically and looked up in the precomputed
+    per-version capacity table, one version class at a time, instead of
+    encoding the payload once per candidate version.
+    """
+    capacities = CAPACITY_BITS[error_correction]
+    for first, last in VERSION_CLASSES:
+        segments = optimal_segments(data, first)
+        version = bisect_left(capacities, segment_bits(segments, first) + reserved_bits, first, last + 1)
+        if version <= last:
+            return version, segments
+    raise DataOverflowError("Data too long for a version 40 QR code at this error correction level")
+
+
+def _char_costs(data: str) -> list[int]:
+    """Return each character's cost, in sixths of a bit, in its cheapest mode."""
+    costs = []
+    for text, allowed in _char_runs(data):
+        for char in text:
+            costs.append(min(_run_cost(char, mode) for mode in allowed))
+    return costs
+
+
+def plan_structured_append(data: str, error_correction: int,
+                           max_symbols: int = MAX_STRUCTURED_SYMBOLS) -> list[tuple[int, list[Segment]]]:
+    """
+    Split ``data`` into at most ``max_symbols`` Structured Append symbols and
+    return the ``(version, segments)`` of each, in sequence order.
+
+    Symbol counts are tried from two upwards and the first whose parts all
+    fit wins, as more symbols only add headers and finder patterns. Each
+    count cuts the payload where the running bit cost crosses an equal
+    share, so the symbols come out about the same size. The running costs
+    also bound each part's size from below (its cheapest character modes
+    plus one segment header), so counts that cannot fit are skipped without
+    planning. A payload that fits one symbol is returned as a single plain
+    part.
+    """
+    capacities = CAPACITY_BITS[error_correction]
+    costs = list(accumulate(_char_costs(data), initial=0))
+
+    def fits(start: int, end: int, reserved_bits: int) -> bool:
+        return -(-(costs[end] - costs[start]) // 6) + 4 + reserved_bits <= capacities[40]
+
+    if fits(0, len(data), 0):
+        try:
+            return [plan_segments(data, error_correction)]
+        except DataOverflowError:
+            pass
+    for count in range(2, min(max_symbols, len(data)) + 1):
+        bounds = [0] + [bisect_left(costs, costs[-1] * k / count) for k in range(1, count)] + [len(data)]
+        spans = list(zip(bounds, bounds[1:]))
+        if any(start >= end or not fits(start, end, STRUCTURED_APPEND_BITS) for start, end in spans):
+            continue
+        try:
+            return [plan_segments(data[start:end], error_correction, STRUCTURED_APPEND_BITS)
+                    for start, end in spans]
+        except DataOverflowError:
+            continue
+    raise DataOverflowError(f"Data too long for {max_symbols} Structured Append symbols "
+                            "at this error correction level")
+
+
+def structured_append_parity(parts: list[tuple[int, list[Segment]]]) -> int:
+    """Return the parity byte shared by a symbol set: the XOR of every data byte."""
+    parity = 0
+    for _, segments in parts:
+        for segment in segments:
+            for byte in segment.data:
+                parity ^= byte
+    return parity
+
+
+def to_qr_data(segment: Segment) -> util.QRData:
+    if segment.mode == MODE_KANJI:
+        return KanjiData(segment.data)
+    return util.QRData(segment.data, mode=segment.mode, check_data=False)
+
+
+def encode_codewords(segments: list[Segment], version: int, error_correction: int,
+                     structured_append: tuple[int, int, int] | None = None) -> list[int]:
+    """
+    Build the final interleaved data and error correction codewords.
+
+    Produces the same output as ``qrcode.util.create_data`` but packs the
+    bit stream with integer arithmetic instead of one bit at a time.
+    ``structured_append`` is the ``(position, count, parity)`` header of a
+    symbol in a Structured Append set.
+    """
+    count_bits = util.mode_sizes_for_version(version)
+    value = 0
+    length = 0
+
+    def put(bits: int, width: int) -> None:
+        nonlocal value, length
+        value = (value << width) | bits
+        length += width
+
+    if structured_append is not None:
+        position, count, parity = structured_append
+        put(MODE_STRUCTURED_APPEND, 4)
+        put(position, 4)
+        put(count - 1, 4)
+        put(parity, 8)
+    for segment in segments:
+        put(segment.mode, 4)
+        put(segment.length, count_bits[segment.mode])
+        data = segment.data
+        if segment.mode == MODE_NUMBER:
+            for i in range(0, len(data), 3):
+                chunk = data[i:i + 3]
+                put(int(chunk), (0, 4, 7, 10)[len(chunk)])
+        elif segment.mode == MODE_ALPHA_NUM:
+            for i in range(0, len(data) - 1, 2):
+                put(_ALPHA_NUM_VALUES[data[i]] * 45 + _ALPHA_NUM_VALUES[data[i + 1]], 11)
+            if len(data) % 2:
+                put(_ALPHA_NUM_VALUES[data[-1]], 6)
+        elif segment.mode == MODE_8BIT_BYTE:
+            if data:
+                put(int.from_bytes(data, "big"), 8 * len(data))
+        else:
+            for i in range(0, len(data), 2):
+                put(_kanji_value(data[i], data[i + 1]), 13)
+
+    blocks = rs_blocks(version, error_correction)
+    bit_limit = sum(block.data_count for block in blocks) * 8
+    if length > bit_limit:
+        raise DataOverflowError(
+            "Code length overflow. Data size (%s) > size available (%s)" % (length, bit_limit)
+        )
+    put(0, min(bit_limit - length, 4))
+    put(0, -length % 8)
+    padding = (bit_limit - length) // 8
+    put(int.from_bytes((b"\xec\x11" * (padding // 2 + 1))[:padding], "big"), 8 * padding)
+
+    buffer = util.BitBuffer()
+    buffer.buffer = list(value.to_bytes(length // 8, "big"))
+    buffer.length = length
+    return util.create_bytes(buffer, blocks)
+
+
+def make_qr(data: str, error_correction: int, version: int | None = None,
+            vectorized: bool | None = None) -> qrcode.QRCode:
+    """
+    Return a compiled, border-less ``qrcode.QRCode`` for ``data``.
+
+    The version is chosen directly from the segment bit lengths unless one
+    is pinned, and the codewords are built up front so only placement and
+    mask selection remain. Those run on the NumPy back end when
+    ``vectorized`` is true, or by default when NumPy is installed, and in
+    qrcode otherwise; both produce the same modules.
+    """
+    with metrics.stage("version_fit"):
+        if version is None:
+            version, segments = plan_segments(data, error_correction)
+        else:
+            segments = optimal_segments(data, version)
+    return make_symbol(segments, version, error_correction, vectorized)
+
+
+def make_symbol(segments: list[Segment], version: int, error_correction: int, vectorized: bool | None = None,
+                structured_append: tuple[int, int, int] | None = None) -> qrcode.QRCode:
+    """
+    Return a compiled, border-less ``qrcode.QRCode`` for planned segments,
+    optionally carrying a Structured Append header (see ``encode_codewords``).
+    """
+    qr = qrcode.QRCode(version=version, error_correction=error_correction, border=0)
+    qr.data_list = [to_qr_data(segment) for segment in segments]
+    qr.data_cache = encode_codewords(segments, version, error_correction, structured_append)
+    if vectorized is None:
+        vectorized = HAVE_NUMPY
+    with metrics.stage("mask"):
+        if vectorized:
+            qr.mask_pattern, symbol = place_and_mask(qr.data_cache, version, error_correction)
+            qr.modules_count = len(symbol)
+            qr.modules = symbol.tolist()
+        else:
+            qr.make(fit=False)
+    return qr
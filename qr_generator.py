@@ -1,56 +1,1120 @@
-import qrcode
-from PIL import Image, ImageDraw
-import svgwrite
+import json
+import math
+import os
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, as_completed, wait
+from contextlib import contextmanager
+from functools import lru_cache, partial
+from html import escape
+from itertools import islice
+from typing import IO, Any, Callable, Hashable, Iterable, Iterator, NamedTuple, Sequence
+
+import metrics
+from PIL import Image, ImageColor, ImageOps
 
 DEFAULT_FG = "#000000"
 DEFAULT_BG = "#FFFFFF"
 
+# The values of qrcode.constants. They are repeated here because importing
+# qrcode loads its image factories too; the package, NumPy and the drawing
+# helpers are only imported once a code is actually encoded or drawn, which
+# keeps short-lived CLI and worker processes quick to start.
+ERROR_CORRECT_L = 1
+ERROR_CORRECT_M = 0
+ERROR_CORRECT_Q = 3
+ERROR_CORRECT_H = 2
+
 ERROR_CORRECTION_LEVELS = {
-    "Low (7%)": qrcode.constants.ERROR_CORRECT_L,
-    "Medium (15%)": qrcode.constants.ERROR_CORRECT_M,
-    "High (25%)": qrcode.constants.ERROR_CORRECT_Q,
-    "Highest (30%)": qrcode.constants.ERROR_CORRECT_H,
+    "Low (7%)": ERROR_CORRECT_L,
+    "Medium (15%)": ERROR_CORRECT_M,
+    "High (25%)": ERROR_CORRECT_Q,
+    "Highest (30%)": ERROR_CORRECT_H,
+}
+
+ERROR_CORRECTION_CODES = {
+    "L": ERROR_CORRECT_L,
+    "M": ERROR_CORRECT_M,
+    "Q": ERROR_CORRECT_Q,
+    "H": ERROR_CORRECT_H,
 }
 
+DEFAULT_CHUNKSIZE = 64
+
+# Structured Append sets with fewer modules than this (about two version-40
+# symbols) are encoded in-process: starting a pool would cost more than it saves.
+STRUCTURED_POOL_MIN_MODULES = 64_000
+
+RENDER_MODES = ("1", "L", "P", "RGB")
+
+# "auto" picks "1" for black-on-white codes and "P" otherwise.
+OUTPUT_MODES = ("auto", *RENDER_MODES)
+
+# Palette entries available to the logo area of "P" mode codes, on top of
+# the two QR colours.
+LOGO_PALETTE_COLORS = 62
+
+PNG_PRESETS = {
+    "fast": {"compress_level": 1},
+    "balanced": {"compress_level": 6},
+    "small": {"compress_level": 9, "optimize": True},
+}
+DEFAULT_PNG_PRESET = "balanced"
+
+MODULE_SHAPES = ("square", "rounded", "circle")
+FINDER_STYLES = MODULE_SHAPES
+
+# Sprites are drawn this many times larger and scaled down, for smooth edges.
+_SPRITE_SUPERSAMPLE = 4
+
+# Palette indices of a quantized logo shifted past the two QR colours.
+_SHIFT_LOGO_INDICES = bytes(min(i + 2, 255) for i in range(256))
+
+# Module values (1 = dark) to 8-bit grey and back.
+_MODULE_TO_L = bytes((255, 0)) + bytes(254)
+_L_TO_MODULE = bytes((1,)) + bytes(255)
+
+
+class BatchResult(NamedTuple):
+    """
+    Outcome of one item of a batch run. Exactly one of ``result`` and
+    ``error`` is set, so a bad payload never aborts the rest of the batch.
+    """
+    index: int
+    data: Any
+    result: Any = None
+    error: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def _chunked(items: Iterable[Any], chunksize: int) -> Iterator[tuple[int, list[Any]]]:
+    iterator = iter(items)
+    start = 0
+    while True:
+        chunk = list(islice(iterator, chunksize))
+        if not chunk:
+            return
+        yield start, chunk
+        start += len(chunk)
+
+
+def _run_chunk(func: Callable[[Any], Any], start: int, chunk: list[Any]) -> list[BatchResult]:
+    results = []
+    for offset, item in enumerate(chunk):
+        if isinstance(item, Exception):
+            results.append(BatchResult(start + offset, item, error=f"{type(item).__name__}: {item}"))
+            continue
+        try:
+            results.append(BatchResult(start + offset, item, func(item)))
+        except Exception as e:
+            results.append(BatchResult(start + offset, item, error=f"{type(e).__name__}: {e}"))
+    return results
+
+
+def _run_chunk_recorded(func: Callable[[Any], Any], start: int, chunk: list[Any]) -> tuple[list[BatchResult], dict]:
+    # Metrics recorded in a worker process are sent back with the chunk.
+    recorder = metrics.enable()
+    try:
+        return _run_chunk(func, start, chunk), recorder.snapshot()
+    finally:
+        metrics.disable()
+
+
+def process_in_pool(func: Callable[[Any], Any], items: Iterable[Any], workers: int | None = None,
+                    chunksize: int = DEFAULT_CHUNKSIZE, ordered: bool = True) -> Iterator[BatchResult]:
+    """
+    Apply ``func`` to every item across a process pool and stream BatchResults.
+
+    Items are sent to the workers in chunks of ``chunksize`` to keep IPC
+    overhead low, and only a couple of chunks per worker are in flight at a
+    time, so arbitrarily long iterables run in bounded memory. With
+    ``ordered=False`` results are yielded as soon as their chunk completes.
+    ``workers=1`` runs everything in the calling process. ``func`` and the
+    items must be picklable. An item that is an exception, such as an input
+    row that could not be read, fails with it without calling ``func``.
+    When metrics are enabled, what the workers record is merged into the
+    active recorder.
+    """
+    if chunksize < 1:
+        raise ValueError("chunksize must be at least 1")
+    workers = workers or os.cpu_count() or 1
+    chunks = _chunked(items, chunksize)
+    if workers == 1:
+        for start, chunk in chunks:
+            yield from _run_chunk(func, start, chunk)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    recorder = metrics.active()
+    run = _run_chunk if recorder is None else _run_chunk_recorded
+
+    def results(future: Future) -> list[BatchResult]:
+        if recorder is None:
+            return future.result()
+        chunk_results, snapshot = future.result()
+        recorder.merge(snapshot)
+        return chunk_results
+
+    max_pending = workers * 2
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        if ordered:
+            queue = deque()
+            for start, chunk in chunks:
+                queue.append(pool.submit(run, func, start, chunk))
+                if len(queue) >= max_pending:
+                    yield from results(queue.popleft())
+            while queue:
+                yield from results(queue.popleft())
+        else:
+            pending = set()
+            for start, chunk in chunks:
+                pending.add(pool.submit(run, func, start, chunk))
+                if len(pending) >= max_pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield from results(future)
+            for future in as_completed(pending):
+                yield from results(future)
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+
+class QRMatrix:
+    """
+    Immutable, bit-packed square module matrix (1 = dark).
+
+    Rows are packed most significant bit first and padded to whole bytes,
+    the layout of PBM P4 and of Pillow's inverted "1" raw mode, so a
+    version-40 code takes about 4 KB instead of 31 KB of one-byte modules
+    or 300 KB+ of RGB pixels. ``data`` supports the buffer protocol and is
+    written or viewed as is by the PBM and packed NumPy exports. A
+    read-only memoryview, such as a record of a memory-mapped archive, is
+    kept without copying. Iterating yields unpacked rows of 0/1 bytes, so a
+    QRMatrix can be used wherever a list of module rows is expected.
+    """
+
+    __slots__ = ("size", "stride", "data")
+
+    def __init__(self, size: int, data: bytes | memoryview) -> None:
+        self.size = size
+        self.stride = (size + 7) // 8
+        if len(data) != self.stride * size:
+            raise ValueError(f"Expected {self.stride * size} bytes for a {size}x{size} matrix, got {len(data)}")
+        self.data = data if isinstance(data, memoryview) and data.readonly else bytes(data)
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Sequence[int]]) -> "QRMatrix":
+        size = len(rows)
+        pixels = b"".join(map(bytes, rows)).translate(_MODULE_TO_L)
+        if len(pixels) != size * size:
+            raise ValueError("Module rows must form a square matrix")
+        img = Image.frombytes("L", (size, size), pixels).convert("1", dither=Image.Dither.NONE)
+        return cls(size, img.tobytes("raw", "1;I"))
+
+    @classmethod
+    def from_image(cls, img: Image.Image) -> "QRMatrix":
+        """Pack a one-pixel-per-module "1" image, black being dark."""
+        return cls(img.width, img.tobytes("raw", "1;I"))
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __iter__(self) -> Iterator[bytes]:
+        pixels = self.unpacked()
+        return (pixels[start:start + self.size] for start in range(0, len(pixels), self.size))
+
+    def __getitem__(self, position: tuple[int, int]) -> int:
+        y, x = position
+        return self.data[y * self.stride + x // 8] >> (7 - x % 8) & 1
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, QRMatrix):
+            return NotImplemented
+        return self.size == other.size and self.data == other.data
+
+    def __hash__(self) -> int:
+        return hash((self.size, self.data))
+
+    def __repr__(self) -> str:
+        return f"QRMatrix(size={self.size}, nbytes={self.nbytes})"
+
+    def __reduce__(self) -> tuple:
+        return QRMatrix, (self.size, bytes(self.data))
+
+    def __buffer__(self, flags: int) -> memoryview:
+        return memoryview(self.data)
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.data)
+
+    def rows(self) -> list[bytes]:
+        return list(self)
+
+    def unpacked(self) -> bytes:
+        """Return all modules as one byte each (1 = dark), row by row."""
+        return self.to_image().convert("L").tobytes().translate(_L_TO_MODULE)
+
+    def with_border(self, border: int) -> "QRMatrix":
+        """Return the matrix surrounded by ``border`` light modules."""
+        if border == 0:
+            return self
+        return QRMatrix.from_image(ImageOps.expand(self.to_image(), border, fill=255))
+
+    def to_image(self) -> Image.Image:
+        """Return a one-pixel-per-module "1" image with dark modules black."""
+        return Image.frombytes("1", (self.size, self.size), self.data, "raw", "1;I")
+
+    def to_numpy(self, packed: bool = False):
+        """
+        Return the modules as a boolean ``(size, size)`` NumPy array, or with
+        ``packed`` a zero-copy, read-only ``(size, stride)`` uint8 view of
+        the packed rows.
+        """
+        import numpy as np
+
+        view = np.frombuffer(self.data, dtype=np.uint8).reshape(self.size, self.stride)
+        if packed:
+            return view
+        return np.unpackbits(view, axis=1, count=self.size).view(bool)
+
+    def write_pbm(self, target: str | os.PathLike | IO[bytes]) -> None:
+        """Write the matrix as a binary PBM (P4), one pixel per module."""
+        if isinstance(target, (str, os.PathLike)):
+            with open(target, "wb") as fp:
+                self.write_pbm(fp)
+            return
+        target.write(b"P4\n%d %d\n" % (self.size, self.size))
+        target.write(memoryview(self.data))
+
+    def save_png(self, target: str | os.PathLike | IO[bytes], **params: Any) -> None:
+        """Save the matrix as a 1-bit PNG, one pixel per module."""
+        self.to_image().save(target, format="PNG", **params)
+
+    def render(self, box_size: int, fg_color: str = DEFAULT_FG, bg_color: str = DEFAULT_BG,
+               mode: str = "RGB") -> Image.Image:
+        """Rasterize the matrix at ``box_size`` pixels per module; see ``render_matrix``."""
+        return render_matrix(self, box_size, fg_color, bg_color, mode)
+
+
+class MatrixCache:
+    """
+    Bounded, thread-safe LRU cache of encoded module matrices.
+
+    Keys are ``(data, error_correction, version)`` tuples and values are the
+    packed QRMatrix produced by ``QRCodeGenerator.encode``, so a cache hit skips
+    Reed-Solomon encoding, version fitting and mask selection entirely.
+    Entries are evicted least-recently-used first once either ``max_entries``
+    or ``max_bytes`` is exceeded. When ``path`` is given the cache is loaded
+    from that file if it exists and ``save()`` writes it back.
+    """
+
+    def __init__(self, max_entries: int | None = 1024, max_bytes: int | None = None,
+                 path: str | os.PathLike | None = None) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._entries: OrderedDict[Hashable, QRMatrix] = OrderedDict()
+        self._lock = threading.Lock()
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def __getstate__(self) -> dict:
+        # Worker processes get an empty cache with the same limits rather
+        # than a pickled copy of every entry.
+        return {"max_entries": self.max_entries, "max_bytes": self.max_bytes}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(state["max_entries"], state["max_bytes"])
+
+    @staticmethod
+    def _sizeof(key: Hashable, modules: QRMatrix) -> int:
+        return modules.nbytes + len(str(key[0]))
+
+    @property
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "bytes": self.nbytes, "hits": self.hits, "misses": self.misses}
+
+    def get(self, key: Hashable) -> QRMatrix | None:
+        with self._lock:
+            modules = self._entries.get(key)
+            if modules is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        metrics.count("cache_misses" if modules is None else "cache_hits")
+        return modules
+
+    def put(self, key: Hashable, modules: QRMatrix) -> None:
+        size = self._sizeof(key, modules)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= self._sizeof(key, old)
+            self._entries[key] = modules
+            self.nbytes += size
+            while self._entries and (
+                (self.max_entries is not None and len(self._entries) > self.max_entries)
+                or (self.max_bytes is not None and self.nbytes > self.max_bytes)
+            ):
+                old_key, old_modules = self._entries.popitem(last=False)
+                self.nbytes -= self._sizeof(old_key, old_modules)
+
+    def get_or_create(self, key: Hashable, factory: Callable[[], QRMatrix]) -> QRMatrix:
+        """
+        Return the cached value for ``key``, computing and storing it on a miss.
+        The factory runs outside the lock so other threads are never blocked
+        behind an encode.
+        """
+        modules = self.get(key)
+        if modules is None:
+            modules = factory()
+            self.put(key, modules)
+        return modules
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+            self.hits = self.misses = 0
+
+    def save(self, path: str | os.PathLike | None = None) -> None:
+        """
+        Write the cache to ``path`` (default: the path it was created with).
+        """
+        path = path if path is not None else self.path
+        if path is None:
+            raise ValueError("No path given to save the cache to")
+        with self._lock:
+            entries = [[list(key), modules.size, modules.data.hex()] for key, modules in self._entries.items()]
+        with atomic_write(path) as tmp_path, open(tmp_path, "w", encoding="utf-8") as fp:
+            json.dump(entries, fp, separators=(",", ":"))
+
+    def load(self, path: str | os.PathLike) -> None:
+        """
+        Add the entries saved at ``path`` to the cache. Files written before
+        matrices were packed, with one hex string per row, are still read.
+        """
+        with open(path, encoding="utf-8") as fp:
+            entries = json.load(fp)
+        for key, *value in entries:
+            if len(value) == 1:
+                modules = QRMatrix.from_rows([bytes.fromhex(row) for row in value[0]])
+            else:
+                modules = QRMatrix(value[0], bytes.fromhex(value[1]))
+            self.put(tuple(key), modules)
+
+
+class PreparedLogo:
+    """
+    A logo ready to be composited onto QR codes of any size.
+
+    The LANCZOS-resized logo and its mask are built once per target size and
+    reused, so stamping the same logo onto thousands of codes costs a single
+    paste each. The mask is the classic centre circle combined with the
+    logo's own alpha channel, if it has one.
+    """
+
+    def __init__(self, image: Image.Image) -> None:
+        self.image = image
+        self._prepared: dict[int, tuple[Image.Image, Image.Image]] = {}
+
+    def prepare(self, size: int) -> tuple[Image.Image, Image.Image]:
+        """
+        Return the ``(logo, mask)`` pair for a ``size`` x ``size`` logo.
+        """
+        prepared = self._prepared.get(size)
+        if prepared is None:
+            from PIL import ImageChops, ImageDraw
+
+            has_alpha = "A" in self.image.getbands() or "transparency" in self.image.info
+            source = self.image.convert("RGBA" if has_alpha else "RGB")
+            logo = source.resize((size, size), Image.Resampling.LANCZOS)
+            mask = Image.new("L", logo.size, 0)
+            ImageDraw.Draw(mask).ellipse((0, 0, size, size), fill=255)
+            if has_alpha:
+                mask = ImageChops.multiply(mask, logo.getchannel("A"))
+                logo = logo.convert("RGB")
+            prepared = self._prepared[size] = (logo, mask)
+        return prepared
+
+
+def dark_runs(row: Sequence[int]) -> Iterator[tuple[int, int]]:
+    """
+    Yield ``(start, length)`` for each run of consecutive dark modules in a row.
+    """
+    start = None
+    for x, dark in enumerate(row):
+        if dark and start is None:
+            start = x
+        elif not dark and start is not None:
+            yield start, x - start
+            start = None
+    if start is not None:
+        yield start, len(row) - start
+
+
+def render_matrix(matrix: QRMatrix | Sequence[Sequence[int]], box_size: int, fg_color: str = DEFAULT_FG,
+                  bg_color: str = DEFAULT_BG, mode: str = "RGB") -> Image.Image:
+    """
+    Rasterize a module matrix in one bulk operation.
+
+    The matrix is loaded into a one-pixel-per-module palette image, converted
+    to ``mode`` while it is still tiny and then scaled up with a single
+    nearest-neighbour resize, so the cost no longer grows with the number of
+    modules drawn. Mode "1" is always black on white; "L" uses the luminance
+    of the two colours.
+    """
+    if mode not in RENDER_MODES:
+        raise ValueError(f"Unsupported mode {mode!r}, expected one of {RENDER_MODES}")
+    count = len(matrix)
+    if isinstance(matrix, QRMatrix):
+        if mode == "1":
+            img = matrix.to_image()
+        else:
+            img = Image.frombytes("P", (count, count), matrix.unpacked())
+    else:
+        img = Image.frombytes("P", (count, count), b"".join(map(bytes, matrix)))
+    if mode == "1":
+        if img.mode != "1":
+            img.putpalette((255, 255, 255, 0, 0, 0))
+            img = img.convert("1", dither=Image.Dither.NONE)
+    else:
+        img.putpalette(ImageColor.getrgb(bg_color)[:3] + ImageColor.getrgb(fg_color)[:3])
+        if mode != "P":
+            img = img.convert(mode)
+    if box_size != 1:
+        img = img.resize((count * box_size, count * box_size), Image.Resampling.NEAREST)
+    return img
+
+
+class ModuleStyle(NamedTuple):
+    """
+    How dark modules are drawn: ``shape`` is one of MODULE_SHAPES, ``finder``
+    the style of the three finder patterns (the module shape when None) and
+    ``gradient`` an optional second colour the dark modules fade to from the
+    foreground colour, top left to bottom right.
+    """
+    shape: str = "square"
+    finder: str | None = None
+    gradient: str | None = None
+
+    @property
+    def is_plain(self) -> bool:
+        return self.shape == "square" and self.finder in (None, "square") and self.gradient is None
+
+    def validate(self) -> None:
+        if self.shape not in MODULE_SHAPES:
+            raise ValueError(f"Unsupported module shape {self.shape!r}, expected one of {MODULE_SHAPES}")
+        if self.finder is not None and self.finder not in FINDER_STYLES:
+            raise ValueError(f"Unsupported finder style {self.finder!r}, expected one of {FINDER_STYLES}")
+        if self.gradient is not None:
+            ImageColor.getrgb(self.gradient)
+
+
+PLAIN_STYLE = ModuleStyle()
+
+
+def _draw_supersampled(side: int, draw: Callable[[Any, int], None]) -> Image.Image:
+    from PIL import ImageDraw
+
+    big = side * _SPRITE_SUPERSAMPLE
+    img = Image.new("L", (big, big), 0)
+    draw(ImageDraw.Draw(img), big)
+    return img.resize((side, side), Image.Resampling.BOX)
+
+
+@lru_cache(maxsize=64)
+def module_sprite(shape: str, box_size: int) -> Image.Image:
+    """
+    Return the coverage mask ("L", 255 = dark) of one ``shape`` module of
+    ``box_size`` pixels. Sprites are cached; do not modify them.
+    """
+    if shape == "square":
+        return Image.new("L", (box_size, box_size), 255)
+    if shape == "circle":
+        return _draw_supersampled(box_size, lambda draw, big: draw.ellipse((0, 0, big - 1, big - 1), fill=255))
+    return _draw_supersampled(box_size, lambda draw, big: draw.rounded_rectangle(
+        (0, 0, big - 1, big - 1), radius=big // 4, fill=255))
+
+
+@lru_cache(maxsize=32)
+def finder_sprite(style: str, box_size: int) -> Image.Image:
+    """Return the coverage mask of one 7 x 7 module finder pattern in ``style``."""
+
+    def draw(draw: Any, big: int) -> None:
+        unit = big / 7
+        # Outer ring, the light ring inside it, then the 3 x 3 centre.
+        for inset, fill in ((0, 255), (1, 0), (2, 255)):
+            box = (inset * unit, inset * unit, big - 1 - inset * unit, big - 1 - inset * unit)
+            if style == "circle":
+                draw.ellipse(box, fill=fill)
+            elif style == "rounded":
+                draw.rounded_rectangle(box, radius=(7 - 2 * inset) * unit / 3, fill=fill)
+            else:
+                draw.rectangle(box, fill=fill)
+
+    return _draw_supersampled(7 * box_size, draw)
+
+
+def _module_sheet(shape: str, box_size: int, count: int) -> Image.Image:
+    # One sprite per module position, built by doubling a strip and then the
+    # sheet, so the cost is a few dozen pastes whatever the version.
+    side = count * box_size
+    sheet = Image.new("L", (side, side))
+    sheet.paste(module_sprite(shape, box_size), (0, 0))
+    filled = box_size
+    while filled < side:
+        sheet.paste(sheet.crop((0, 0, filled, box_size)), (filled, 0))
+        filled *= 2
+    filled = box_size
+    while filled < side:
+        sheet.paste(sheet.crop((0, 0, side, filled)), (0, filled))
+        filled *= 2
+    return sheet
+
+
+@lru_cache(maxsize=4)
+def _gradient_fill(side: int, start: str, end: str) -> Image.Image:
+    ramp = Image.linear_gradient("L").resize((side, side))
+    ramp = Image.blend(ramp, ramp.transpose(Image.Transpose.ROTATE_90), 0.5)
+    return Image.composite(Image.new("RGB", (side, side), end), Image.new("RGB", (side, side), start), ramp)
+
+
+def render_styled(matrix: QRMatrix, box_size: int, fg_color: str = DEFAULT_FG, bg_color: str = DEFAULT_BG,
+                  style: ModuleStyle = PLAIN_STYLE, border: int = 0, mode: str = "RGB") -> Image.Image:
+    """
+    Rasterize a module matrix with shaped modules, styled finder patterns
+    and an optional gradient fill, as an "RGB" or "L" image.
+
+    The dark modules become a coverage mask in bulk: the matrix is scaled up
+    as in ``render_matrix`` and multiplied with a sheet of pre-rendered
+    module sprites, and the three finder sprites are pasted over their
+    corners (``border`` modules in from the edge). The colours are then
+    blended through that mask in one operation.
+    """
+    from PIL import ImageChops
+
+    if mode not in ("RGB", "L"):
+        raise ValueError(f"Styled codes render in RGB or L, not {mode!r}")
+    count = len(matrix)
+    side = count * box_size
+    coverage = render_matrix(matrix, box_size, "#FFFFFF", "#000000", "L")
+    if style.shape != "square":
+        coverage = ImageChops.multiply(coverage, _module_sheet(style.shape, box_size, count))
+    finder = finder_sprite(style.finder or style.shape, box_size)
+    for x, y in ((border, border), (count - border - 7, border), (border, count - border - 7)):
+        coverage.paste(finder, (x * box_size, y * box_size))
+
+    if style.gradient is None:
+        # Blend the two colours by coverage through a 256-entry palette.
+        fg, bg = ImageColor.getrgb(fg_color)[:3], ImageColor.getrgb(bg_color)[:3]
+        img = coverage.convert("P")
+        img.putpalette([round(b + (f - b) * level / 255) for level in range(256) for f, b in zip(fg, bg)])
+        img = img.convert("RGB")
+    else:
+        img = Image.composite(_gradient_fill(side, fg_color, style.gradient),
+                              Image.new("RGB", (side, side), bg_color), coverage)
+    return img.convert("L") if mode == "L" else img
+
+
+def _paste_palette_logo(img: Image.Image, logo: Image.Image, mask: Image.Image, pos: tuple[int, int]) -> None:
+    # Quantize only the logo area and append its colours after the two QR
+    # colours, so the modules keep their exact palette entries.
+    box = (pos[0], pos[1], pos[0] + logo.width, pos[1] + logo.height)
+    region = img.crop(box).convert("RGB")
+    region.paste(logo, (0, 0), mask)
+    quantized = region.quantize(colors=LOGO_PALETTE_COLORS)
+    img.paste(Image.frombytes("P", quantized.size, quantized.tobytes().translate(_SHIFT_LOGO_INDICES)), box)
+    img.putpalette(img.getpalette()[:6] + quantized.getpalette()[:3 * LOGO_PALETTE_COLORS])
+
+
+def _tell(target: str | os.PathLike | IO) -> int | None:
+    if metrics.active() is None or isinstance(target, (str, os.PathLike)):
+        return None
+    try:
+        return target.tell()
+    except (AttributeError, OSError):
+        return None
+
+
+def _count_written(target: str | os.PathLike | IO, start: int | None) -> None:
+    # Only stat or tell when someone is recording.
+    if metrics.active() is None:
+        return
+    if isinstance(target, (str, os.PathLike)):
+        metrics.count("bytes_written", os.path.getsize(target))
+    elif start is not None:
+        metrics.count("bytes_written", target.tell() - start)
+
+
+@contextmanager
+def atomic_write(path: str | os.PathLike) -> Iterator[str]:
+    """
+    Yield a temporary path beside ``path`` to write to, renamed over
+    ``path`` when the block completes, so readers never see a partial file
+    and an interrupted write leaves the previous one in place. On an
+    exception the temporary file is removed. The name includes the process
+    id, so concurrent writers of one path do not clash.
+    """
+    path = os.fspath(path)
+    tmp_path = f"{path}.{os.getpid()}.part"
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def save_image(img: Image.Image, target: str | os.PathLike | IO[bytes], format: str | None = None,
+               preset: str = DEFAULT_PNG_PRESET, **params: Any) -> None:
+    """
+    Save a generated code, applying the PNG ``preset`` ("fast", "balanced"
+    or "small") and converting 1-bit and palette images for formats that
+    cannot store them. ``format`` defaults to the file extension.
+    """
+    if format is None:
+        if not isinstance(target, (str, os.PathLike)):
+            raise ValueError("format is required when saving to a stream")
+        format = Image.registered_extensions().get(os.path.splitext(target)[1].lower())
+        if format is None:
+            raise ValueError(f"Unknown image file extension: {os.fspath(target)!r}")
+    format = format.upper()
+    if format == "PNG":
+        params = {**PNG_PRESETS[preset], **params}
+    elif format == "JPEG" and img.mode in ("1", "P"):
+        img = img.convert("L" if img.mode == "1" else "RGB")
+    start = _tell(target)
+    with metrics.stage("save"):
+        img.save(target, format=format, **params)
+    _count_written(target, start)
+
+
+def tile_symbols(images: Sequence[Image.Image], columns: int | None = None,
+                 bg_color: str = DEFAULT_BG) -> Image.Image:
+    """
+    Lay a Structured Append set out left to right and top to bottom in one
+    image, ``columns`` wide (default: as square a grid as possible). Each
+    symbol is centred in a cell the size of the largest one. Palette images
+    stay in "P" when they share a palette and are tiled in RGB otherwise.
+    """
+    columns = columns or math.ceil(math.sqrt(len(images)))
+    rows = -(-len(images) // columns)
+    cell = max(img.width for img in images)
+    mode = images[0].mode
+    if mode == "P" and len({tuple(img.getpalette()) for img in images}) > 1:
+        mode = "RGB"
+    size = (columns * cell, rows * cell)
+    if mode == "P":
+        tiled = Image.new("P", size, 0)
+        tiled.putpalette(images[0].getpalette())
+    else:
+        tiled = Image.new(mode, size, ImageColor.getcolor(bg_color, mode))
+    for index, img in enumerate(images):
+        row, column = divmod(index, columns)
+        offset = (cell - img.width) // 2
+        tiled.paste(img if img.mode == mode else img.convert(mode),
+                    (column * cell + offset, row * cell + offset))
+    return tiled
+
+
+def _encode_symbol(error_correction: int, part: tuple[int, int, int, int, list]) -> QRMatrix:
+    # Module level so Structured Append symbols can be encoded in worker processes.
+    from qr_encoding import make_symbol
+
+    position, count, parity, version, segments = part
+    with metrics.stage("encode"):
+        qr = make_symbol(segments, version, error_correction, structured_append=(position, count, parity))
+        return QRMatrix.from_rows(qr.modules)
+
+
 class QRCodeGenerator:
-    def __init__(self, size: int = 10, error_correction: int = qrcode.constants.ERROR_CORRECT_H,
-                 fg_color: str = DEFAULT_FG, bg_color: str = DEFAULT_BG) -> None:
+    def __init__(self, size: int = 10, error_correction: int = ERROR_CORRECT_H,
+                 fg_color: str = DEFAULT_FG, bg_color: str = DEFAULT_BG, border: int = 2,
+                 version: int | None = None, cache: MatrixCache | None = None, mode: str = "RGB",
+                 style: ModuleStyle = PLAIN_STYLE) -> None:
+        if mode not in OUTPUT_MODES:
+            raise ValueError(f"Unsupported mode {mode!r}, expected one of {OUTPUT_MODES}")
+        style.validate()
+        if not style.is_plain and mode in ("1", "P"):
+            raise ValueError(f"Styled codes render in RGB or L, not {mode!r}")
         self.size = size
         self.error_correction = error_correction
         self.fg_color = fg_color
         self.bg_color = bg_color
+        self.border = border
+        self.version = version
+        self.cache = cache
+        self.mode = mode
+        self.style = style
 
-    def generate(self, data: str, logo_img: Image.Image | None = None) -> Image.Image:
+    def output_mode(self, with_logo: bool = False) -> str:
         """
-        Generate a QR code image with optional logo overlay.
+        Return the image mode ``generate`` produces. "auto" gives 1-bit
+        images for plain black-on-white codes and 2-colour palette images
+        otherwise, including whenever a logo is added. Styled codes are
+        anti-aliased, so "auto" gives "RGB" for them.
         """
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=self.error_correction,
-            box_size=self.size,
-            border=2
-        )
-        qr.add_data(data)
-        qr.make(fit=True)
-        img = qr.make_image(fill_color=self.fg_color, back_color=self.bg_color).convert("RGB")
+        if self.mode != "auto":
+            return self.mode
+        if not self.style.is_plain:
+            return "RGB"
+        black_on_white = (ImageColor.getrgb(self.fg_color)[:3] == (0, 0, 0)
+                          and ImageColor.getrgb(self.bg_color)[:3] == (255, 255, 255))
+        return "1" if black_on_white and not with_logo else "P"
 
-        if logo_img:
-            logo_size = min(img.size) // 4
-            logo = logo_img.resize((logo_size, logo_size), Image.Resampling.LANCZOS)
-            pos = ((img.size[0] - logo.size[0]) // 2, (img.size[1] - logo.size[1]) // 2)
-            mask = Image.new("L", logo.size, 0)
-            draw = ImageDraw.Draw(mask)
-            draw.ellipse((0, 0, logo.size[0], logo.size[1]), fill=255)
-            img.paste(logo, pos, mask)
+    def _encode(self, data: str) -> QRMatrix:
+        from qr_encoding import make_qr
+
+        with metrics.stage("encode"):
+            qr = make_qr(data, self.error_correction, self.version)
+            return QRMatrix.from_rows(qr.modules)
+
+    def encode(self, data: str) -> QRMatrix:
+        """
+        Return the packed module matrix for ``data``, without the border.
+        The smallest fitting version is used unless ``version`` is pinned.
+        """
+        if self.cache is None:
+            return self._encode(data)
+        return self.cache.get_or_create((data, self.error_correction, self.version), partial(self._encode, data))
+
+    def get_matrix(self, data: str) -> QRMatrix:
+        """
+        Return the packed module matrix for ``data``, including the
+        quiet-zone border. Use it instead of ``generate`` when only the
+        modules are needed; it renders lazily at any scale.
+        """
+        return self.encode(data).with_border(self.border)
 
+    def generate(self, data: str, logo_img: Image.Image | PreparedLogo | None = None) -> Image.Image:
+        """
+        Generate a QR code image with optional logo overlay, drawn in
+        ``style`` and in the mode given by ``output_mode``.
+        Pass a PreparedLogo when the same logo is used for many codes.
+        """
+        return self._render(self.get_matrix(data), logo_img)
+
+    def render(self, matrix: QRMatrix, logo_img: Image.Image | PreparedLogo | None = None) -> Image.Image:
+        """
+        Draw an already encoded matrix, as returned by ``encode`` (without
+        the border), in this generator's size, colours, style and mode.
+        """
+        return self._render(matrix.with_border(self.border), logo_img)
+
+    def _render(self, matrix: QRMatrix, logo_img: Image.Image | PreparedLogo | None) -> Image.Image:
+        img = self._rasterize(matrix, self.output_mode(with_logo=logo_img is not None))
+        if logo_img is not None:
+            self._add_logo(img, logo_img)
+        metrics.count("codes_generated")
         return img
 
-    def save_as_svg(self, img: Image.Image, filepath: str) -> None:
+    def _rasterize(self, matrix: QRMatrix, mode: str) -> Image.Image:
+        with metrics.stage("rasterize"):
+            if self.style.is_plain:
+                return render_matrix(matrix, self.size, self.fg_color, self.bg_color, mode)
+            return render_styled(matrix, self.size, self.fg_color, self.bg_color, self.style, self.border, mode)
+
+    @staticmethod
+    def _add_logo(img: Image.Image, logo_img: Image.Image | PreparedLogo) -> None:
+        with metrics.stage("logo"):
+            if not isinstance(logo_img, PreparedLogo):
+                logo_img = PreparedLogo(logo_img)
+            logo, mask = logo_img.prepare(min(img.size) // 4)
+            pos = ((img.size[0] - logo.size[0]) // 2, (img.size[1] - logo.size[1]) // 2)
+            if img.mode == "P":
+                _paste_palette_logo(img, logo, mask, pos)
+            else:
+                img.paste(logo, pos, mask)
+
+    def generate_many(self, payloads: Iterable[str], logo_img: Image.Image | PreparedLogo | None = None,
+                      workers: int | None = None, chunksize: int = DEFAULT_CHUNKSIZE,
+                      ordered: bool = True) -> Iterator[BatchResult]:
+        """
+        Generate QR codes for many payloads across a process pool.
+
+        Yields one BatchResult per payload, with the image in ``result`` or a
+        description of the failure in ``error``. See ``process_in_pool`` for
+        the meaning of ``workers``, ``chunksize`` and ``ordered``.
+        """
+        if logo_img is not None and not isinstance(logo_img, PreparedLogo):
+            logo_img = PreparedLogo(logo_img)
+        return process_in_pool(partial(self.generate, logo_img=logo_img), payloads,
+                               workers=workers, chunksize=chunksize, ordered=ordered)
+
+    def encode_structured(self, data: str, max_symbols: int = 16, workers: int | None = None) -> list[QRMatrix]:
+        """
+        Encode ``data`` as a Structured Append set of up to ``max_symbols``
+        linked symbols and return their packed matrices in sequence order.
+
+        Payloads that fit one symbol give a plain, one-element set. Larger
+        ones are split by ``plan_structured_append`` into symbols sharing the
+        whole message's parity byte, each at its own smallest version
+        (``version`` is not used). The symbols are encoded across ``workers``
+        processes (see ``process_in_pool``; ``None`` means all CPUs), or
+        in-process when the set is smaller than ``STRUCTURED_POOL_MIN_MODULES``.
+        """
+        from qr_encoding import plan_structured_append, structured_append_parity
+
+        with metrics.stage("version_fit"):
+            parts = plan_structured_append(data, self.error_correction, max_symbols)
+        if len(parts) == 1:
+            return [self.encode(data)]
+        parity = structured_append_parity(parts)
+        jobs = [(position, len(parts), parity, version, segments)
+                for position, (version, segments) in enumerate(parts)]
+        if sum((17 + 4 * version) ** 2 for version, _ in parts) < STRUCTURED_POOL_MIN_MODULES:
+            workers = 1
+        matrices = []
+        for result in process_in_pool(partial(_encode_symbol, self.error_correction), jobs,
+                                      workers=min(workers or os.cpu_count() or 1, len(jobs)), chunksize=1):
+            if not result.ok:
+                raise ValueError(f"Structured Append symbol {result.index + 1} failed: {result.error}")
+            matrices.append(result.result)
+        return matrices
+
+    def generate_structured(self, data: str, logo_img: Image.Image | PreparedLogo | None = None,
+                            max_symbols: int = 16, workers: int | None = None) -> list[Image.Image]:
+        """
+        Generate the images of a Structured Append set for ``data``, in
+        sequence order. See ``encode_structured``.
+        """
+        if logo_img is not None and not isinstance(logo_img, PreparedLogo):
+            logo_img = PreparedLogo(logo_img)
+        return [self.render(matrix, logo_img)
+                for matrix in self.encode_structured(data, max_symbols, workers)]
+
+    def generate_tiled(self, data: str, logo_img: Image.Image | PreparedLogo | None = None, max_symbols: int = 16,
+                       workers: int | None = None, columns: int | None = None) -> Image.Image:
+        """
+        Generate a Structured Append set for ``data`` tiled into one image,
+        ``columns`` symbols wide. See ``encode_structured`` and ``tile_symbols``.
+        """
+        return tile_symbols(self.generate_structured(data, logo_img, max_symbols, workers), columns, self.bg_color)
+
+    def write_svg(self, data: str, target: str | os.PathLike | IO[str],
+                  logo_img: Image.Image | PreparedLogo | None = None) -> None:
+        """
+        Write a vector SVG of the QR code for ``data`` to a path or text stream.
+
+        The document is streamed straight from the module matrix. Each
+        horizontal run of dark modules becomes one subpath of a single
+        ``<path>`` element, so even version-40 codes stay small and cheap to
+        render. Coordinates are in modules; the outer size honours ``size``.
+        With ``logo_img`` the code is rendered with its logo and embedded as
+        a PNG instead (see ``write_raster_svg``), as paths cannot draw it.
         """
-        Save a simplified SVG version of the QR code.
-        Note: This is a simplified export. For a detailed vector export,
-        further logic is required to draw each QR module.
+        self.write_matrix_svg(self.encode(data), target, logo_img)
+
+    def write_matrix_svg(self, matrix: QRMatrix, target: str | os.PathLike | IO[str],
+                         logo_img: Image.Image | PreparedLogo | None = None) -> None:
+        """
+        Write an SVG of an already encoded matrix, as returned by ``encode``
+        (without the border). See ``write_svg``.
+        """
+        if logo_img is not None:
+            write_raster_svg(self.render(matrix, logo_img), target)
+            return
+        matrix = matrix.with_border(self.border)
+        start = _tell(target)
+        with metrics.stage("save"):
+            if isinstance(target, (str, os.PathLike)):
+                with open(target, "w", encoding="utf-8") as fp:
+                    self._write_svg_matrix(matrix, fp)
+            else:
+                self._write_svg_matrix(matrix, target)
+        _count_written(target, start)
+
+    def _write_svg_matrix(self, matrix: QRMatrix, target: IO[str]) -> None:
+        if not self.style.is_plain:
+            self._write_styled_svg(matrix, target)
+            return
+        count = len(matrix)
+        pixels = count * self.size
+        target.write(
+            '<?xml version="1.0" encoding="utf-8"?>\n'
+            f'<svg xmlns="http://www.w3.org/2000/svg" version="1.1" width="{pixels}px" height="{pixels}px" '
+            f'viewBox="0 0 {count} {count}" shape-rendering="crispEdges">\n'
+            f'<rect width="100%" height="100%" fill="{escape(self.bg_color)}"/>\n'
+            f'<path fill="{escape(self.fg_color)}" d="'
+        )
+        for y, row in enumerate(matrix):
+            runs = "".join(f"M{x} {y}h{length}v1h-{length}z" for x, length in dark_runs(row))
+            if runs:
+                target.write(runs)
+        target.write('"/>\n</svg>\n')
+
+    def _write_styled_svg(self, matrix: QRMatrix, target: IO[str]) -> None:
+        # Each dark module references one shared shape, and the finders are
+        # drawn as a ring and a centre in their own style.
+        count = len(matrix)
+        pixels = count * self.size
+        style = self.style
+        paint = escape(self.fg_color)
+        target.write(
+            '<?xml version="1.0" encoding="utf-8"?>\n'
+            f'<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" version="1.1" '
+            f'width="{pixels}px" height="{pixels}px" viewBox="0 0 {count} {count}">\n<defs>\n'
+        )
+        if style.gradient is not None:
+            target.write(f'<linearGradient id="fill" gradientUnits="userSpaceOnUse" x1="0" y1="0" '
+                         f'x2="{count}" y2="{count}"><stop offset="0" stop-color="{paint}"/>'
+                         f'<stop offset="1" stop-color="{escape(style.gradient)}"/></linearGradient>\n')
+            paint = "url(#fill)"
+        if style.shape == "circle":
+            target.write('<circle id="m" cx="0.5" cy="0.5" r="0.5"/>\n')
+        else:
+            target.write(f'<rect id="m" width="1" height="1" rx="{0.25 if style.shape == "rounded" else 0}"/>\n')
+        target.write(f'</defs>\n<rect width="100%" height="100%" fill="{escape(self.bg_color)}"/>\n'
+                     f'<g fill="{paint}">\n')
+
+        finders = ((self.border, self.border), (count - self.border - 7, self.border),
+                   (self.border, count - self.border - 7))
+        for y, row in enumerate(matrix):
+            uses = "".join(
+                f'<use xlink:href="#m" x="{x}" y="{y}"/>' for x, dark in enumerate(row)
+                if dark and not any(fx <= x < fx + 7 and fy <= y < fy + 7 for fx, fy in finders)
+            )
+            if uses:
+                target.write(uses + "\n")
+
+        finder = style.finder or style.shape
+        for x, y in finders:
+            if finder == "circle":
+                target.write(f'<circle cx="{x + 3.5}" cy="{y + 3.5}" r="3" fill="none" stroke="{paint}"/>'
+                             f'<circle cx="{x + 3.5}" cy="{y + 3.5}" r="1.5"/>\n')
+            else:
+                ring, centre = (1.75, 1) if finder == "rounded" else (0, 0)
+                target.write(f'<rect x="{x + 0.5}" y="{y + 0.5}" width="6" height="6" rx="{ring}" fill="none" '
+                             f'stroke="{paint}"/><rect x="{x + 2}" y="{y + 2}" width="3" height="3" rx="{centre}"/>\n')
+        target.write("</g>\n</svg>\n")
+
+    def save_as_svg(self, data: str | Image.Image, filepath: str,
+                    logo_img: Image.Image | PreparedLogo | None = None) -> None:
+        """
+        Save an SVG version of the QR code for ``data``, as vector paths
+        unless there is a logo (see ``write_svg``). An already rendered
+        image, as this method took before the vector export existed, is
+        embedded as a PNG instead (see ``write_raster_svg``).
         """
-        dwg = svgwrite.Drawing(filepath, size=(f"{img.width}px", f"{img.height}px"))
-        dwg.add(dwg.rect(insert=(0, 0), size=("100%", "100%"), fill=self.bg_color))
-        dwg.save()
+        if isinstance(data, Image.Image):
+            write_raster_svg(data, filepath)
+        else:
+            self.write_svg(data, filepath, logo_img)
+
+
+def write_raster_svg(img: Image.Image, target: str | os.PathLike | IO[str]) -> None:
+    """
+    Write an SVG that embeds ``img`` as a PNG at its pixel size. Used for
+    codes the vector export cannot reproduce, such as ones with a logo.
+    """
+    import base64
+    from io import BytesIO
+
+    start = _tell(target)
+    with metrics.stage("save"):
+        png = BytesIO()
+        img.save(png, format="PNG", **PNG_PRESETS[DEFAULT_PNG_PRESET])
+        document = (
+            '<?xml version="1.0" encoding="utf-8"?>\n'
+            f'<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" version="1.1" '
+            f'width="{img.width}px" height="{img.height}px" viewBox="0 0 {img.width} {img.height}">\n'
+            f'<image width="{img.width}" height="{img.height}" '
+            f'xlink:href="data:image/png;base64,{base64.b64encode(png.getvalue()).decode("ascii")}"/>\n</svg>\n'
+        )
+        if isinstance(target, (str, os.PathLike)):
+            with open(target, "w", encoding="utf-8") as fp:
+                fp.write(document)
+        else:
+            target.write(document)
+    _count_written(target, start)
+
+
+def recolor_palette(img: Image.Image, fg_color: str, bg_color: str) -> Image.Image:
+    """
+    Return a copy of a palette-mode code with its two QR colours replaced.
+    The modules are palette indices 0 (light) and 1 (dark), so no pixel is
+    touched.
+    """
+    recolored = img.copy()
+    palette = recolored.getpalette()
+    palette[:6] = ImageColor.getrgb(bg_color)[:3] + ImageColor.getrgb(fg_color)[:3]
+    recolored.putpalette(palette)
+    return recolored
+
+
+class IncrementalRenderer:
+    """
+    Re-renders one code as its design is tweaked, redoing only the stages a
+    change affects.
+
+    The last payload's module matrix, its image before the logo and the
+    finished image are kept. A new payload, error correction level or
+    pinned version re-encodes; a new box size, border, style or image mode
+    re-rasterizes from the kept matrix; a new logo is composited onto the
+    kept base image; and when only the colours of a palette-mode code change
+    the base image's palette is swapped without drawing anything (a logo is
+    composited again, as its edges are blended with the old colours).
+    Images that were handed out are never modified, so callers may keep
+    them. Thread-safe.
+    """
+
+    def __init__(self) -> None:
+        self._encoded: tuple | None = None
+        self._matrix: QRMatrix | None = None
+        self._look: tuple | None = None
+        self._colors: tuple[str, str] | None = None
+        self._base: Image.Image | None = None
+        self._logo: Any = None
+        self._image: Image.Image | None = None
+        self._lock = threading.Lock()
+
+    def render(self, generator: QRCodeGenerator, data: str,
+               logo_img: Image.Image | PreparedLogo | None = None) -> Image.Image:
+        """Return the same image as ``generator.generate(data, logo_img)``."""
+        with self._lock:
+            encoded = (data, generator.error_correction, generator.version)
+            if encoded != self._encoded:
+                self._matrix = generator.encode(data)
+                self._encoded, self._look = encoded, None
+            mode = generator.output_mode(with_logo=logo_img is not None)
+            look = (generator.size, generator.border, generator.style, mode)
+            colors = (generator.fg_color, generator.bg_color)
+            if look == self._look and colors == self._colors and logo_img is self._logo:
+                return self._image
+            if look == self._look and mode == "P" and generator.style.is_plain:
+                if colors != self._colors:
+                    self._base = recolor_palette(self._base, *colors)
+            elif look != self._look or colors != self._colors:
+                self._base = generator._rasterize(self._matrix.with_border(generator.border), mode)
+            self._look, self._colors, self._logo = look, colors, logo_img
+            if logo_img is None:
+                self._image = self._base
+            else:
+                self._image = self._base.copy()
+                generator._add_logo(self._image, logo_img)
+            metrics.count("codes_generated")
+            return self._image
+
+
+if __name__ == "__main__":
+    import sys
+    from cli import main
+    sys.exit(main())
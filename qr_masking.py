@@ -0,0 +1,186 @@
+"""
+NumPy back end for QR mask selection.
+
+qrcode places the codewords eight times, once per mask, and scores every
+attempt with the pure-Python penalty rules in ``qrcode.util.lost_point``.
+Here the data modules are placed once per version layout, all eight masks
+are applied as one array operation and the four penalty rules are computed
+over the whole stack, so the chosen mask and the final modules are the same
+as qrcode's. NumPy is optional; ``HAVE_NUMPY`` is false when it is missing
+and callers fall back to qrcode's own ``make()``. It is imported on first
+use rather than with this module, as it takes longer to load than the rest
+of the generator.
+"""
+from functools import lru_cache
+from importlib.util import find_spec
+
+import qrcode
+
+np = None
+HAVE_NUMPY = find_spec("numpy") is not None
+
+# Rule 3 finder-like runs, dark:light:dark:light:dark 1:1:3:1:1 with four
+# light modules on one side, as 11-bit integers (first module is the MSB).
+_FINDER_LIKE = (0b10111010000, 0b00001011101)
+
+
+def _load_numpy() -> None:
+    global np
+    if np is None:
+        import numpy
+        np = numpy
+
+
+def mask_patterns(size: int) -> "np.ndarray":
+    """
+    Return the eight QR mask patterns for a ``size`` x ``size`` symbol as a
+    boolean (8, size, size) array, True where a module is inverted.
+    """
+    _load_numpy()
+    i, j = np.indices((size, size))
+    return np.stack([
+        (i + j) % 2 == 0,
+        i % 2 == 0,
+        j % 3 == 0,
+        (i + j) % 3 == 0,
+        (i // 2 + j // 3) % 2 == 0,
+        (i * j) % 2 + (i * j) % 3 == 0,
+        ((i * j) % 2 + (i * j) % 3) % 2 == 0,
+        ((i * j) % 3 + (i + j) % 2) % 2 == 0,
+    ])
+
+
+def function_modules(version: int, error_correction: int, mask_pattern: int, test: bool) -> list[list]:
+    """
+    Return qrcode's function patterns for ``version`` with data modules left
+    as None. With ``test`` the format and version information is left light,
+    as qrcode does while it scores masks.
+    """
+    qr = qrcode.QRCode(version=version, error_correction=error_correction)
+    qr.modules_count = size = version * 4 + 17
+    qr.modules = [[None] * size for _ in range(size)]
+    qr.setup_position_probe_pattern(0, 0)
+    qr.setup_position_probe_pattern(size - 7, 0)
+    qr.setup_position_probe_pattern(0, size - 7)
+    qr.setup_position_adjust_pattern()
+    qr.setup_timing_pattern()
+    qr.setup_type_info(test, mask_pattern)
+    if version >= 7:
+        qr.setup_type_number(test)
+    return qr.modules
+
+
+@lru_cache(maxsize=None)
+def data_positions(version: int) -> tuple[tuple[int, int], ...]:
+    """
+    Return the ``(row, col)`` of every data module of ``version`` in the
+    order qrcode.QRCode.map_data fills them.
+    """
+    modules = function_modules(version, 0, 0, test=True)
+    size = len(modules)
+    positions = []
+    row, inc = size - 1, -1
+    for col in range(size - 1, 0, -2):
+        if col <= 6:
+            col -= 1
+        while True:
+            for c in (col, col - 1):
+                if modules[row][c] is None:
+                    positions.append((row, c))
+            row += inc
+            if row < 0 or row >= size:
+                row -= inc
+                inc = -inc
+                break
+    return tuple(positions)
+
+
+@lru_cache(maxsize=None)
+def _layout(version: int) -> tuple["np.ndarray", "np.ndarray", "np.ndarray", "np.ndarray"]:
+    """
+    Return the function modules as scored by qrcode (format and version
+    information left light), a boolean map of data modules, the data module
+    coordinates in placement order and the mask patterns for ``version``.
+    """
+    modules = function_modules(version, 0, 0, test=True)
+    size = len(modules)
+    is_data = np.array([[cell is None for cell in row] for row in modules])
+    base = np.array([[bool(cell) for cell in row] for row in modules])
+    order = tuple(np.array(axis) for axis in zip(*data_positions(version)))
+    for array in (base, is_data):
+        array.setflags(write=False)
+    return base, is_data, order, mask_patterns(size)
+
+
+def _run_penalty(lines: "np.ndarray") -> "np.ndarray":
+    masks, count, size = lines.shape
+    edges = np.ones((masks, count, size + 1), dtype=bool)
+    edges[:, :, 1:-1] = lines[:, :, 1:] != lines[:, :, :-1]
+    owner, position = np.nonzero(edges.reshape(masks, -1))
+    lengths = np.diff(position)
+    owner = owner[1:]
+    long_runs = lengths >= 5
+    return np.bincount(owner[long_runs], weights=lengths[long_runs] - 2, minlength=masks).astype(np.int64)
+
+
+def _finder_penalty(lines: "np.ndarray") -> "np.ndarray":
+    span = lines.shape[-1] - 10
+    windows = np.zeros(lines.shape[:-1] + (span,), dtype=np.int16)
+    for offset in range(11):
+        windows <<= 1
+        windows |= lines[..., offset:offset + span]
+    matches = (windows == _FINDER_LIKE[0]) | (windows == _FINDER_LIKE[1])
+    return matches.sum(axis=(1, 2)) * 40
+
+
+def penalty_scores(symbols: "np.ndarray") -> list[int]:
+    """
+    Score a stack of boolean symbols with the same four rules, and the same
+    arithmetic, as ``qrcode.util.lost_point``.
+    """
+    _load_numpy()
+    size = symbols.shape[-1]
+    columns = symbols.transpose(0, 2, 1)
+    scores = _run_penalty(symbols) + _run_penalty(columns)
+
+    same = symbols[:, :-1, :-1]
+    blocks = (same == symbols[:, 1:, :-1]) & (same == symbols[:, :-1, 1:]) & (same == symbols[:, 1:, 1:])
+    scores += blocks.sum(axis=(1, 2)) * 3
+
+    scores += _finder_penalty(symbols) + _finder_penalty(columns)
+
+    result = []
+    for score, dark in zip(scores.tolist(), symbols.sum(axis=(1, 2)).tolist()):
+        percent = float(dark) / (size ** 2)
+        result.append(score + int(abs(percent * 100 - 50) / 5) * 10)
+    return result
+
+
+def place_and_mask(codewords: list[int], version: int, error_correction: int) -> tuple[int, "np.ndarray"]:
+    """
+    Return the best mask pattern and the finished boolean module matrix for
+    ``codewords``, matching ``qrcode.QRCode.make(fit=False)``.
+    """
+    _load_numpy()
+    base, is_data, order, patterns = _layout(version)
+    bits = np.zeros(len(order[0]), dtype=bool)
+    data_bits = np.unpackbits(np.asarray(codewords, dtype=np.uint8)).astype(bool)
+    bits[:len(data_bits)] = data_bits
+    data = np.zeros_like(base)
+    data[order] = bits
+
+    candidates = np.where(is_data, data ^ patterns, base)
+    scores = penalty_scores(candidates)
+    mask_pattern = scores.index(min(scores))
+
+    symbol = _final_base(version, error_correction, mask_pattern).copy()
+    symbol[is_data] = candidates[mask_pattern][is_data]
+    return mask_pattern, symbol
+
+
+@lru_cache(maxsize=256)
+def _final_base(version: int, error_correction: int, mask_pattern: int) -> "np.ndarray":
+    function = function_modules(version, error_correction, mask_pattern, test=False)
+    base = np.array([[bool(cell) for cell in row] for row in function])
+    base.setflags(write=False)
+    return base
@@ -0,0 +1,209 @@
+import asyncio
+import hashlib
+import json
+import sys
+from concurrent.futures import Executor, ProcessPoolExecutor
+from io import BytesIO, StringIO
+from typing import Callable
+from urllib.parse import parse_qs, urlsplit
+
+from PIL import ImageColor
+from qr_generator import DEFAULT_BG, DEFAULT_FG, ERROR_CORRECTION_CODES, MatrixCache, QRCodeGenerator, save_image
+
+FORMATS = {
+    "png": "image/png",
+    "svg": "image/svg+xml",
+    "matrix": "text/plain; charset=utf-8",
+}
+REASONS = {
+    200: "OK",
+    304: "Not Modified",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    422: "Unprocessable Entity",
+    500: "Internal Server Error",
+}
+MAX_SIZE = 20
+MAX_HEADER_BYTES = 16 * 1024
+
+# Each worker process keeps its own encode cache between requests.
+_worker_cache = MatrixCache(max_entries=4096)
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+def parse_request_params(query: str) -> tuple:
+    """
+    Validate the query string of a /qr request and return the canonical
+    ``(data, fmt, size, ec, fg, bg)`` tuple that identifies the response.
+    """
+    params = {key: values[-1] for key, values in parse_qs(query, keep_blank_values=True).items()}
+    data = params.get("data")
+    if not data:
+        raise HTTPError(400, "missing 'data' parameter")
+    fmt = params.get("format", "png").lower()
+    if fmt not in FORMATS:
+        raise HTTPError(400, f"unsupported format {fmt!r}")
+    try:
+        size = int(params.get("size", 10))
+    except ValueError:
+        raise HTTPError(400, "'size' must be an integer")
+    if not 1 <= size <= MAX_SIZE:
+        raise HTTPError(400, f"'size' must be between 1 and {MAX_SIZE}")
+    ec = params.get("ec", "H").upper()
+    if ec not in ERROR_CORRECTION_CODES:
+        raise HTTPError(400, f"'ec' must be one of {', '.join(ERROR_CORRECTION_CODES)}")
+    fg = params.get("fg", DEFAULT_FG)
+    bg = params.get("bg", DEFAULT_BG)
+    for color in (fg, bg):
+        try:
+            ImageColor.getrgb(color)
+        except ValueError:
+            raise HTTPError(400, f"invalid colour {color!r}")
+    return data, fmt, size, ec, fg, bg
+
+
+def etag_for(key: tuple) -> str:
+    digest = hashlib.sha256(json.dumps(key).encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def render_payload(key: tuple) -> bytes:
+    """
+    Render the response body for a canonical request key. Runs in the
+    executor, so it must stay a picklable module-level function.
+    """
+    data, fmt, size, ec, fg, bg = key
+    generator = QRCodeGenerator(size=size, error_correction=ERROR_CORRECTION_CODES[ec], fg_color=fg, bg_color=bg,
+                                cache=_worker_cache, mode="auto")
+    if fmt == "matrix":
+        return "".join("".join(map(str, row)) + "\n" for row in generator.get_matrix(data)).encode("ascii")
+    if fmt == "svg":
+        out = StringIO()
+        generator.write_svg(data, out)
+        return out.getvalue().encode("utf-8")
+    out = BytesIO()
+    save_image(generator.generate(data), out, "PNG")
+    return out.getvalue()
+
+
+class QRServer:
+    """
+    Minimal asyncio HTTP/1.1 server for ``GET /qr``.
+
+    Query parameters: ``data`` (required), ``format`` (png, svg or matrix),
+    ``size``, ``ec`` (L/M/Q/H), ``fg`` and ``bg``. Rendering runs in
+    ``executor``; concurrent requests for the same key share one render, and
+    the deterministic ETag lets clients revalidate with ``If-None-Match``
+    without anything being rendered.
+    """
+
+    def __init__(self, executor: Executor | None = None,
+                 render: Callable[[tuple], bytes] = render_payload) -> None:
+        self.executor = executor
+        self.render = render
+        self.requests = 0
+        self.renders = 0
+        self.coalesced = 0
+        self.not_modified = 0
+        self._inflight: dict[tuple, asyncio.Future] = {}
+
+    async def render_coalesced(self, key: tuple) -> bytes:
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+        loop = asyncio.get_running_loop()
+        self.renders += 1
+        future = loop.run_in_executor(self.executor, self.render, key)
+        self._inflight[key] = future
+        future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def respond(self, method: str, target: str, headers: dict[str, str]) -> tuple[int, dict, bytes]:
+        url = urlsplit(target)
+        if url.path != "/qr":
+            raise HTTPError(404, "not found")
+        if method not in ("GET", "HEAD"):
+            raise HTTPError(405, "method not allowed")
+        key = parse_request_params(url.query)
+        etag = etag_for(key)
+        response_headers = {"ETag": etag, "Cache-Control": "public, max-age=86400"}
+        if_none_match = headers.get("if-none-match", "")
+        if if_none_match == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]:
+            self.not_modified += 1
+            return 304, response_headers, b""
+        try:
+            body = await self.render_coalesced(key)
+        except Exception as e:
+            # Imported here so starting the server does not load qrcode.
+            from qrcode.exceptions import DataOverflowError
+            if not isinstance(e, (ValueError, DataOverflowError)):
+                raise
+            raise HTTPError(422, str(e))
+        response_headers["Content-Type"] = FORMATS[key[1]]
+        return 200, response_headers, body
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ", 2)
+                except ValueError:
+                    await self.write_response(writer, 400, {}, b"bad request\n", close=True)
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+                close = headers.get("connection", "").lower() == "close" or version == "HTTP/1.0"
+                self.requests += 1
+                try:
+                    status, response_headers, body = await self.respond(method, target, headers)
+                except HTTPError as e:
+                    status, response_headers, body = e.status, {"Content-Type": "text/plain"}, f"{e}\n".encode()
+                except Exception as e:
+                    print(f"Error handling {target}: {e!r}", file=sys.stderr)
+                    status, response_headers, body = 500, {"Content-Type": "text/plain"}, b"internal error\n"
+                if method == "HEAD":
+                    response_headers["Content-Length"] = str(len(body))
+                    body = b""
+                await self.write_response(writer, status, response_headers, body, close)
+                if close:
+                    break
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def write_response(writer: asyncio.StreamWriter, status: int, headers: dict, body: bytes,
+                             close: bool) -> None:
+        headers.setdefault("Content-Length", str(len(body)))
+        if close:
+            headers["Connection"] = "close"
+        head = f"HTTP/1.1 {status} {REASONS.get(status, 'Error')}\r\n"
+        head += "".join(f"{name}: {value}\r\n" for name, value in headers.items())
+        writer.write(head.encode("latin-1") + b"\r\n" + body)
+        await writer.drain()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8080) -> asyncio.Server:
+        return await asyncio.start_server(self.handle_connection, host, port, limit=MAX_HEADER_BYTES)
+
+
+async def serve(host: str = "127.0.0.1", port: int = 8080, workers: int | None = None) -> None:
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        server = await QRServer(executor).start(host, port)
+        addresses = ", ".join(f"http://{sock.getsockname()[0]}:{sock.getsockname()[1]}" for sock in server.sockets)
+        print(f"Serving QR codes on {addresses}/qr", file=sys.stderr)
+        async with server:
+            await server.serve_forever()
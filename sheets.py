@@ -0,0 +1,219 @@
+import os
+import re
+import zlib
+from itertools import count
+from typing import IO, Callable, Iterable, Iterator, NamedTuple
+
+import metrics
+from PIL import ImageColor
+from qr_generator import QRCodeGenerator, atomic_write, dark_runs
+
+MM = 72 / 25.4
+INCH = 72.0
+
+PAGE_SIZES = {
+    "a4": (210 * MM, 297 * MM),
+    "letter": (8.5 * INCH, 11 * INCH),
+}
+
+
+class SheetTemplate(NamedTuple):
+    """
+    Label sheet layout in PDF points (1/72 inch). ``origin`` is the offset of
+    the first label from the top-left corner of the page and ``pitch`` the
+    distance between the top-left corners of neighbouring labels. Each code
+    is the largest square that fits its label inside ``padding``.
+    """
+    page_size: tuple[float, float]
+    columns: int
+    rows: int
+    label_size: tuple[float, float]
+    origin: tuple[float, float]
+    pitch: tuple[float, float]
+    padding: float = 0.0
+
+    @property
+    def per_page(self) -> int:
+        return self.columns * self.rows
+
+    def cells(self) -> Iterator[tuple[float, float, float]]:
+        """
+        Yield ``(x, y, side)`` for every code square on a page in reading
+        order, with ``(x, y)`` its bottom-left corner in PDF coordinates.
+        """
+        label_width, label_height = self.label_size
+        side = min(label_width, label_height) - 2 * self.padding
+        if side <= 0:
+            raise ValueError("labels are too small for their padding")
+        for row in range(self.rows):
+            for column in range(self.columns):
+                left = self.origin[0] + column * self.pitch[0]
+                top = self.origin[1] + row * self.pitch[1]
+                x = left + (label_width - side) / 2
+                y = self.page_size[1] - top - (label_height + side) / 2
+                yield x, y, side
+
+
+def grid_template(page_size: tuple[float, float], columns: int, rows: int, margin: float = 36.0,
+                  gap: float = 0.0, padding: float = 0.0) -> SheetTemplate:
+    """Spread ``columns`` x ``rows`` equal labels over a page inside ``margin``."""
+    if columns < 1 or rows < 1:
+        raise ValueError("a sheet needs at least one column and one row")
+    width = (page_size[0] - 2 * margin - (columns - 1) * gap) / columns
+    height = (page_size[1] - 2 * margin - (rows - 1) * gap) / rows
+    if width <= 0 or height <= 0:
+        raise ValueError("the grid does not fit on the page")
+    return SheetTemplate(page_size, columns, rows, (width, height), (margin, margin),
+                         (width + gap, height + gap), padding)
+
+
+TEMPLATES = {
+    "a4": grid_template(PAGE_SIZES["a4"], 4, 6, margin=10 * MM, gap=5 * MM, padding=2 * MM),
+    "letter": grid_template(PAGE_SIZES["letter"], 4, 5, margin=0.5 * INCH, gap=0.25 * INCH, padding=0.1 * INCH),
+    # Avery L7160: 21 labels of 63.5 x 38.1 mm on A4.
+    "avery-l7160": SheetTemplate(PAGE_SIZES["a4"], 3, 7, (63.5 * MM, 38.1 * MM), (7.2 * MM, 15.1 * MM),
+                                 (66.0 * MM, 38.1 * MM), 2 * MM),
+    # Avery 5160: 30 labels of 2.625 x 1 inch on US Letter.
+    "avery-5160": SheetTemplate(PAGE_SIZES["letter"], 3, 10, (2.625 * INCH, INCH), (0.1875 * INCH, 0.5 * INCH),
+                                (2.75 * INCH, INCH), 0.05 * INCH),
+}
+
+_CUSTOM_TEMPLATE = re.compile(r"^(?:(a4|letter)|(\d+(?:\.\d+)?)x(\d+(?:\.\d+)?)mm):(\d+)x(\d+)$")
+
+
+def parse_template(spec: str) -> SheetTemplate:
+    """
+    Return a named template, or build a grid from ``PAGE:COLUMNSxROWS`` where
+    PAGE is a4, letter or ``WIDTHxHEIGHTmm`` (e.g. ``a4:5x8`` or ``100x150mm:2x3``).
+    """
+    name = spec.lower()
+    if name in TEMPLATES:
+        return TEMPLATES[name]
+    match = _CUSTOM_TEMPLATE.match(name)
+    if match is None:
+        raise ValueError(f"unknown sheet template {spec!r} (choose from {', '.join(TEMPLATES)} or PAGE:COLSxROWS)")
+    page, width, height, columns, rows = match.groups()
+    page_size = PAGE_SIZES[page] if page else (float(width) * MM, float(height) * MM)
+    return grid_template(page_size, int(columns), int(rows), margin=10 * MM, gap=5 * MM, padding=2 * MM)
+
+
+def _pdf_colour(color: str) -> str:
+    return " ".join(f"{channel / 255:.4g}" for channel in ImageColor.getrgb(color)[:3])
+
+
+def _code_operators(matrix: list[bytes], x: float, y: float, side: float, fg: str, bg: str) -> str:
+    # Modules are drawn in their own coordinate system: one unit per module,
+    # origin at the top-left of the code and y pointing down.
+    count = len(matrix)
+    scale = side / count
+    parts = [f"q {scale:.6g} 0 0 {-scale:.6g} {x:.3f} {y + side:.3f} cm",
+             f"{bg} rg 0 0 {count} {count} re f", f"{fg} rg"]
+    for row_y, row in enumerate(matrix):
+        for start, length in dark_runs(row):
+            parts.append(f"{start} {row_y} {length} 1 re")
+    parts.append("f Q")
+    return "\n".join(parts)
+
+
+class _PDFWriter:
+    """
+    Minimal PDF writer that streams each object to ``fp`` as soon as it is
+    complete and keeps only object offsets and page references in memory.
+    """
+
+    CATALOG = 1
+    PAGES = 2
+
+    def __init__(self, fp: IO[bytes]) -> None:
+        self.fp = fp
+        self.offsets: dict[int, int] = {}
+        self.pages: list[int] = []
+        self._numbers = count(3)
+        self._written = 0
+        self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def _write(self, data: bytes) -> None:
+        self.fp.write(data)
+        self._written += len(data)
+
+    def _object(self, number: int, body: bytes) -> None:
+        self.offsets[number] = self._written
+        self._write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+
+    def add_page(self, page_size: tuple[float, float], content: str) -> None:
+        stream = zlib.compress(content.encode("ascii"))
+        content_number, page_number = next(self._numbers), next(self._numbers)
+        self._object(content_number, b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(stream)
+                     + stream + b"\nendstream")
+        self._object(page_number, (
+            f"<< /Type /Page /Parent {self.PAGES} 0 R /MediaBox [0 0 {page_size[0]:.2f} {page_size[1]:.2f}] "
+            f"/Resources << >> /Contents {content_number} 0 R >>"
+        ).encode("ascii"))
+        self.pages.append(page_number)
+
+    def close(self) -> None:
+        kids = " ".join(f"{number} 0 R" for number in self.pages)
+        self._object(self.PAGES, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.pages)} >>".encode("ascii"))
+        self._object(self.CATALOG, f"<< /Type /Catalog /Pages {self.PAGES} 0 R >>".encode("ascii"))
+        xref = self._written
+        size = max(self.offsets) + 1
+        entries = [b"0000000000 65535 f \n"]
+        entries += [b"%010d 00000 n \n" % self.offsets[number] for number in range(1, size)]
+        self._write(b"xref\n0 %d\n" % size + b"".join(entries))
+        self._write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (size, self.CATALOG, xref))
+
+
+def write_sheets(generator: QRCodeGenerator, payloads: Iterable[str], target: str | os.PathLike | IO[bytes],
+                 template: SheetTemplate = TEMPLATES["a4"],
+                 on_error: Callable[[int, str, Exception], None] | None = None) -> int:
+    """
+    Lay out a QR code per payload on label sheets and write them as a PDF.
+
+    Codes are vector paths built from ``generator``'s module matrices in its
+    colours and error correction level, filling ``template`` left to right
+    and top to bottom. Each page is written out as soon as it is full, so
+    memory stays flat however many payloads the iterable yields. Payloads
+    that cannot be encoded, or that are exceptions standing in for unreadable
+    input rows, raise, or are skipped and passed to ``on_error`` with their
+    index when it is given. Returns the number of codes written.
+    """
+    if isinstance(target, (str, os.PathLike)):
+        with atomic_write(target) as tmp_path, open(tmp_path, "wb") as fp:
+            return write_sheets(generator, payloads, fp, template, on_error)
+
+    fg, bg = _pdf_colour(generator.fg_color), _pdf_colour(generator.bg_color)
+    cells = list(template.cells())
+    writer = _PDFWriter(target)
+    page: list[str] = []
+    written = 0
+    for index, data in enumerate(payloads):
+        try:
+            if isinstance(data, Exception):
+                raise data
+            matrix = generator.get_matrix(data)
+        except Exception as e:
+            if on_error is None:
+                raise
+            on_error(index, data, e)
+            continue
+        page.append(_code_operators(matrix, *cells[len(page)], fg, bg))
+        written += 1
+        if len(page) == len(cells):
+            writer.add_page(template.page_size, "\n".join(page))
+            page = []
+    if page or not writer.pages:
+        writer.add_page(template.page_size, "\n".join(page))
+    writer.close()
+    metrics.count("bytes_written", writer._written)
+    return written
+
+
+def save_as_pdf(generator: QRCodeGenerator, data: str, filepath: str) -> None:
+    """
+    Save a single vector QR code on a page the size of the raster image,
+    taking one pixel as one point.
+    """
+    side = len(generator.get_matrix(data)) * generator.size
+    template = SheetTemplate((side, side), 1, 1, (side, side), (0, 0), (side, side))
+    with metrics.stage("save"):
+        write_sheets(generator, [data], filepath, template)
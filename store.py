@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+from typing import Callable, Iterator, NamedTuple
+
+from PIL import Image
+from qr_generator import DEFAULT_PNG_PRESET, PreparedLogo, QRCodeGenerator, atomic_write
+
+MANIFEST_FILE = "manifest.jsonl"
+OBJECTS_DIR = "objects"
+
+
+class ManifestEntry(NamedTuple):
+    row: int
+    name: str
+    key: str
+    path: str
+
+
+class StoredArtifact(NamedTuple):
+    """Where a code was stored, and whether this call wrote it or found it already there."""
+    key: str
+    path: str
+    created: bool
+    size: int
+
+
+def logo_digest(logo: Image.Image | PreparedLogo | None) -> str | None:
+    """Return a SHA-256 of the logo's pixels, so re-saved copies of one logo hash alike."""
+    if logo is None:
+        return None
+    if isinstance(logo, PreparedLogo):
+        logo = logo.image
+    digest = hashlib.sha256(f"{logo.mode}:{logo.width}x{logo.height}:".encode("ascii"))
+    digest.update(logo.tobytes())
+    return digest.hexdigest()
+
+
+def artifact_key(generator: QRCodeGenerator, data: str, fmt: str, logo: str | None = None,
+                 png_preset: str = DEFAULT_PNG_PRESET) -> str:
+    """
+    Return the content address of the file ``generator`` renders for
+    ``data``: a SHA-256 over the payload, every render setting, the logo
+    digest and the output format. Equal keys mean byte-identical output.
+    """
+    settings = [data, generator.error_correction, generator.size, generator.fg_color, generator.bg_color,
+                generator.border, generator.version, generator.mode, list(generator.style), logo, fmt,
+                png_preset if fmt == "png" else None]
+    return hashlib.sha256(json.dumps(settings, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class OutputStore:
+    """
+    Content-addressed directory of rendered codes.
+
+    Files live under ``objects/`` named by their ``artifact_key``, so an
+    identical code is rendered and written once however many rows ask for
+    it, and re-running a job only renders the rows whose payload or settings
+    changed. Files are written under a temporary name and renamed into
+    place, so concurrent writers and interrupted runs never leave a partial
+    object. ``manifest.jsonl`` maps the rows of the last run to their files.
+    The store only holds the root path, so it can be sent to worker processes.
+    """
+
+    def __init__(self, root: str | os.PathLike) -> None:
+        self.root = os.fspath(root)
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.root, MANIFEST_FILE)
+
+    @staticmethod
+    def relpath(key: str, fmt: str) -> str:
+        return f"{OBJECTS_DIR}/{key[:2]}/{key}.{fmt}"
+
+    def path_for(self, key: str, fmt: str) -> str:
+        return os.path.join(self.root, *self.relpath(key, fmt).split("/"))
+
+    def store(self, key: str, fmt: str, write: Callable[[str], None]) -> StoredArtifact:
+        """
+        Return the object for ``key``, calling ``write(path)`` to create it
+        only when it is not in the store yet.
+        """
+        path = self.path_for(key, fmt)
+        try:
+            return StoredArtifact(key, path, False, os.path.getsize(path))
+        except FileNotFoundError:
+            pass
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with atomic_write(path) as tmp_path:
+            write(tmp_path)
+        return StoredArtifact(key, path, True, os.path.getsize(path))
+
+    def manifest(self) -> Iterator[ManifestEntry]:
+        """Yield the entries of the last completed run's manifest."""
+        try:
+            fp = open(self.manifest_path, encoding="utf-8")
+        except FileNotFoundError:
+            return
+        with fp:
+            for line in fp:
+                yield ManifestEntry(*json.loads(line))
+
+    def open_manifest(self) -> "ManifestWriter":
+        """Start a new manifest, replacing the current one when the writer closes cleanly."""
+        os.makedirs(self.root, exist_ok=True)
+        return ManifestWriter(self.manifest_path)
+
+    def prune(self) -> int:
+        """Delete the objects the current manifest does not reference and return how many went."""
+        keep = {entry.path for entry in self.manifest()}
+        removed = 0
+        objects = os.path.join(self.root, OBJECTS_DIR)
+        for directory, _, files in os.walk(objects):
+            for name in files:
+                path = os.path.join(directory, name)
+                if os.path.relpath(path, self.root).replace(os.sep, "/") not in keep:
+                    os.remove(path)
+                    removed += 1
+        return removed
+
+
+class ManifestWriter:
+    """
+    Streams manifest entries to a temporary file that is renamed over the
+    manifest on a clean exit, so an interrupted run keeps the previous one.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.count = 0
+        self._atomic = atomic_write(path)
+        self._fp = open(self._atomic.__enter__(), "w", encoding="utf-8")
+
+    def add(self, entry: ManifestEntry) -> None:
+        self._fp.write(json.dumps(list(entry), ensure_ascii=False) + "\n")
+        self.count += 1
+
+    def __enter__(self) -> "ManifestWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._fp.close()
+        self._atomic.__exit__(*exc_info)
@@ -1,6 +1,70 @@
 import unittest
 from unittest.mock import MagicMock
-from app import QRGeneratorApp  # Importing the app class directly
+from app import LIVE_PREVIEW_DELAY_MS, QRGeneratorApp, render_preview  # Importing the app class directly
+from PIL import Image
+from qr_generator import QRCodeGenerator
+
+
+class TestRenderPreview(unittest.TestCase):
+    # These run without a Tk root: render_preview works on the generator alone.
+
+    def test_render_preview_uses_integer_scale(self):
+        # Test the preview is drawn at a whole number of pixels per module with single-colour modules
+        qr_gen = QRCodeGenerator(size=10, fg_color="#FF0000", bg_color="#FFFFFF")
+        count = len(qr_gen.get_matrix("https://example.com"))
+        img = render_preview(qr_gen, "https://example.com", None, count * 3 + 2)
+        self.assertEqual(img.size, (count * 3, count * 3))
+        self.assertEqual({color for _, color in img.convert("RGB").getcolors()}, {(255, 0, 0), (255, 255, 255)})
+        scaled = qr_gen.generate("https://example.com").convert("RGB").resize(img.size, Image.NEAREST)
+        self.assertEqual(img.convert("RGB").tobytes(), scaled.tobytes())
+        self.assertEqual(qr_gen.size, 10)
+
+    def test_render_preview_falls_back_below_one_pixel_per_module(self):
+        # Test a canvas smaller than the module count gets a downscaled full-size image
+        qr_gen = QRCodeGenerator(size=4)
+        count = len(qr_gen.get_matrix("https://example.com"))
+        img = render_preview(qr_gen, "https://example.com", None, count - 5)
+        self.assertEqual(img.size, (count - 5, count - 5))
+
+
+class TestInputsChanged(unittest.TestCase):
+    # Built without __init__ so no Tk widgets are needed.
+
+    def make_app(self, live):
+        app = QRGeneratorApp.__new__(QRGeneratorApp)
+        app.root = MagicMock()
+        app.root.after.return_value = "after-id"
+        app.status_var = MagicMock()
+        app.progress = {"value": 30}
+        app.live_preview = MagicMock(get=MagicMock(return_value=live))
+        app._live_preview_after = None
+        app._job_id = 1
+        app._pending_job = MagicMock()
+        return app
+
+    def test_inputs_changed_keeps_manual_generation(self):
+        # Test touching an input with live preview off leaves a started generation running
+        app = self.make_app(live=False)
+        job = app._pending_job
+        app.on_inputs_changed()
+        job.cancel.assert_not_called()
+        self.assertIs(app._pending_job, job)
+        self.assertEqual(app._job_id, 1)
+        app.root.after.assert_not_called()
+        app.status_var.set.assert_not_called()
+
+    def test_inputs_changed_replaces_job_in_live_mode(self):
+        # Test live mode drops the in-flight job, resets the progress and schedules a debounced one
+        app = self.make_app(live=True)
+        job = app._pending_job
+        app.on_inputs_changed()
+        job.cancel.assert_called_once()
+        self.assertIsNone(app._pending_job)
+        self.assertEqual(app.progress["value"], 0)
+        app.status_var.set.assert_called_with("Status: Inputs changed, generation cancelled")
+        app.root.after.assert_called_once_with(LIVE_PREVIEW_DELAY_MS, app.live_generate)
+        app.on_inputs_changed()
+        app.root.after_cancel.assert_called_once_with("after-id")
 
 
 class TestQRGeneratorApp(unittest.TestCase):
@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+
+from archive import ArchiveError, ArchiveWriter, MatrixArchive, export_records, write_archive
+from PIL import Image
+from qr_generator import QRCodeGenerator
+
+
+class TestMatrixArchive(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "codes.qra")
+        self.generator = QRCodeGenerator(size=2, border=1)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip_with_random_access(self):
+        # Test every record reads back by index with its payload, EC level and identical modules
+        payloads = [f"https://example.com/item/{i}" for i in range(40)] + ["é" * 300]
+        self.assertEqual(write_archive(self.generator, payloads, self.path, workers=1), len(payloads))
+        self.assertFalse(os.path.exists(self.path + ".part"))
+        with MatrixArchive(self.path) as archive:
+            self.assertEqual(len(archive), len(payloads))
+            for index in (40, 0, 17, -1):
+                record = archive[index]
+                self.assertEqual(record.data, payloads[index])
+                self.assertEqual(record.error_correction, self.generator.error_correction)
+                self.assertEqual(record.matrix, self.generator.encode(payloads[index]))
+                self.assertIsInstance(record.matrix.data, memoryview)
+                self.assertTrue(record.matrix.data.readonly)
+            self.assertEqual([record.data for record in archive], payloads)
+            with self.assertRaises(IndexError):
+                archive[len(payloads)]
+            del record
+
+    def test_failed_or_unfinished_writes_are_not_archives(self):
+        # Test bad payloads are reported, aborted writers leave nothing and stray files are rejected
+        errors = []
+        count = write_archive(self.generator, ["a", "x" * 5000, "b"], self.path, workers=1,
+                              on_error=lambda index, data, error: errors.append(index))
+        self.assertEqual((count, errors), (2, [1]))
+        with self.assertRaises(RuntimeError):
+            with ArchiveWriter(self.path + "2") as writer:
+                writer.add("c", 2, self.generator.encode("c"))
+                raise RuntimeError
+        self.assertEqual(sorted(os.listdir(self.tmp.name)), ["codes.qra"])
+        with open(self.path + "2", "wb") as fp:
+            fp.write(b"not an archive" * 4)
+        with self.assertRaises(ArchiveError):
+            MatrixArchive(self.path + "2")
+
+    def test_export_matches_generate(self):
+        # Test exported records render exactly as generating their payload does
+        payloads = ["alpha", "beta", "gamma"]
+        write_archive(self.generator, payloads, self.path, workers=1)
+        out_dir = os.path.join(self.tmp.name, "out")
+        with MatrixArchive(self.path) as archive:
+            paths = export_records(archive, [2, 0], self.generator, out_dir)
+            svg = export_records(archive, [1], self.generator, out_dir, fmt="svg")
+            logo_svg = export_records(archive, [1], self.generator, os.path.join(out_dir, "logo"), fmt="svg",
+                                      logo_img=Image.new("RGB", (8, 8), "red"))
+        self.assertEqual([os.path.basename(path) for path in paths], ["00000002.png", "00000000.png"])
+        with Image.open(paths[0]) as img:
+            self.assertEqual(img.convert("RGB").tobytes(), self.generator.generate("gamma").convert("RGB").tobytes())
+        expected = os.path.join(self.tmp.name, "beta.svg")
+        self.generator.write_svg("beta", expected)
+        with open(svg[0], "rb") as fp, open(expected, "rb") as want:
+            self.assertEqual(fp.read(), want.read())
+        with open(logo_svg[0], encoding="utf-8") as fp:
+            self.assertIn("<image ", fp.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
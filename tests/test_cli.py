@@ -0,0 +1,177 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stderr
+
+from cli import main, read_checkpoint, read_rows
+from PIL import Image
+
+
+class TestBatchCLI(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.out = os.path.join(self.tmp.name, "out")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write_input(self, name, text):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, "w", encoding="utf-8") as fp:
+            fp.write(text)
+        return path
+
+    def run_cli(self, *args):
+        with redirect_stderr(io.StringIO()) as err:
+            code = main(list(args))
+        return code, err.getvalue()
+
+    def test_read_rows_formats(self):
+        # Test CSV with and without a header, JSONL and plain lines
+        csv_rows = list(read_rows(io.StringIO("name,data\na,one\nb,two\n"), "csv", name_column="name"))
+        self.assertEqual(csv_rows, [("a", "one"), ("b", "two")])
+        self.assertEqual(list(read_rows(io.StringIO("one\ntwo\n"), "csv")), [(None, "one"), (None, "two")])
+        jsonl = '{"data": "one", "id": "x"}\n"two"\n'
+        self.assertEqual(list(read_rows(io.StringIO(jsonl), "jsonl", name_column="id")), [("x", "one"), (None, "two")])
+        self.assertEqual(list(read_rows(io.StringIO("one\n\ntwo\n"), "lines")), [(None, "one"), (None, "two")])
+
+    def test_bad_rows_fail_alone(self):
+        # Test a malformed JSONL line and a short CSV row are reported and the rest of the batch still runs
+        path = self.write_input("in.jsonl", '"one"\n{"data": "two"\n{"other": 1}\n{"data": "three"}\n')
+        code, err = self.run_cli("batch", path, "--out", self.out, "--workers", "1")
+        self.assertEqual(code, 1)
+        self.assertIn("row 1: ValueError: malformed JSON", err)
+        self.assertIn("row 2: ValueError: JSON object has no 'data' key", err)
+        self.assertIn("Generated 2 codes (2 failed", err)
+        self.assertTrue(os.path.exists(os.path.join(self.out, "00000003.png")))
+        self.assertEqual(read_checkpoint(self.out), 4)
+
+        path = self.write_input("in.jsonl", '{"data": "one", "id": 5}\n{"data": null}\n{"data": [1]}\n7\n')
+        code, err = self.run_cli("batch", path, "--out", self.out, "--workers", "1", "--name-column", "id")
+        self.assertEqual(code, 1)
+        self.assertIn("row 1: ValueError: JSON payload must be a string or number, not null", err)
+        self.assertIn("row 2: ValueError: JSON payload must be a string or number, not [1]", err)
+        self.assertIn("Generated 2 codes (2 failed", err)
+        self.assertTrue(os.path.exists(os.path.join(self.out, "5.png")))
+
+        path = self.write_input("in.csv", "name,data\nfirst,one\nshort\nthird,three\n")
+        code, err = self.run_cli("sheet", path, "--out", os.path.join(self.tmp.name, "labels.pdf"))
+        self.assertEqual(code, 1)
+        self.assertIn("row 1: ValueError: CSV row has no 'data' column", err)
+        self.assertIn("Laid out 2 codes (1 failed)", err)
+
+    def test_batch_writes_one_file_per_row(self):
+        # Test a CSV batch with named outputs and GUI-style options
+        path = self.write_input("in.csv", "name,data\nfirst,https://example.com\nsecond,hello\n")
+        code, err = self.run_cli("batch", path, "--out", self.out, "--name-column", "name",
+                                 "--workers", "1", "--size", "4", "--ec", "Low (7%)", "--fg", "#FF0000")
+        self.assertEqual(code, 0)
+        self.assertIn("Generated 2 codes", err)
+        img = Image.open(os.path.join(self.out, "first.png"))
+        self.assertEqual(img.mode, "P")
+        self.assertEqual(img.convert("RGB").getpixel((2 * 4, 2 * 4)), (255, 0, 0))
+        self.assertTrue(os.path.exists(os.path.join(self.out, "second.png")))
+
+    def test_batch_reports_failures_and_resumes(self):
+        # Test that a bad row is reported and a resumed run skips finished rows
+        path = self.write_input("in.jsonl", "\n".join(json.dumps(d) for d in ["a", "x" * 5000, "c"]))
+        code, err = self.run_cli("batch", path, "--out", self.out, "--format", "svg", "--workers", "1")
+        self.assertEqual(code, 1)
+        self.assertIn("row 1:", err)
+        self.assertEqual(sorted(os.listdir(self.out)), [".qr_batch_checkpoint", "00000000.svg", "00000002.svg"])
+        self.assertEqual(read_checkpoint(self.out), 3)
+        code, err = self.run_cli("batch", path, "--out", self.out, "--workers", "1", "--resume")
+        self.assertEqual(code, 0)
+        self.assertIn("Generated 0 codes", err)
+
+    def test_batch_verify_reports_unscannable_codes(self):
+        # Test --verify decodes every written code and flags the unreadable ones
+        path = self.write_input("in.txt", "one\ntwo\n")
+        code, err = self.run_cli("batch", path, "--out", self.out, "--workers", "1", "--size", "2", "--verify")
+        self.assertEqual(code, 0)
+        self.assertIn("Verified 2 codes: 0 not scannable, 0 at risk", err)
+        code, err = self.run_cli("batch", path, "--out", self.out, "--workers", "1", "--size", "2", "--verify",
+                                 "--fg", "#FAFAFA")
+        self.assertEqual(code, 1)
+        self.assertIn("row 0: not scannable:", err)
+        code, err = self.run_cli("batch", path, "--out", self.out, "--format", "svg", "--verify")
+        self.assertEqual(code, 2)
+
+    def test_batch_store_renders_only_new_codes(self):
+        # Test duplicate rows share a file and a re-run only renders the changed row
+        path = self.write_input("in.txt", "one\ntwo\none\n")
+        code, err = self.run_cli("batch", path, "--out", self.out, "--workers", "1", "--store")
+        self.assertEqual(code, 0)
+        self.assertIn("1 already stored", err)
+        entries = [json.loads(line) for line in open(os.path.join(self.out, "manifest.jsonl"), encoding="utf-8")]
+        self.assertEqual([entry[0] for entry in entries], [0, 1, 2])
+        self.assertEqual(entries[0][3], entries[2][3])
+        path = self.write_input("in.txt", "one\nchanged\none\n")
+        code, err = self.run_cli("batch", path, "--out", self.out, "--workers", "1", "--store", "--prune")
+        self.assertEqual(code, 0)
+        self.assertIn("2 already stored", err)
+        self.assertIn("Pruned 1 codes", err)
+        self.assertEqual(self.run_cli("batch", path, "--out", self.out, "--store", "--resume")[0], 2)
+
+    def test_batch_svg_keeps_logo(self):
+        # Test SVG output, plain and stored, embeds the logo instead of dropping it
+        path = self.write_input("in.txt", "one\ntwo\n")
+        logo = os.path.join(self.tmp.name, "logo.png")
+        Image.new("RGB", (20, 20), "red").save(logo)
+        for extra in ((), ("--store",)):
+            out = os.path.join(self.tmp.name, "svg" + "".join(extra))
+            code, _ = self.run_cli("batch", path, "--out", out, "--format", "svg", "--logo", logo, "--workers", "1",
+                                   *extra)
+            self.assertEqual(code, 0)
+            svgs = [os.path.join(directory, name) for directory, _, files in os.walk(out)
+                    for name in files if name.endswith(".svg")]
+            self.assertEqual(len(svgs), 2)
+            for svg in svgs:
+                with open(svg, encoding="utf-8") as fp:
+                    self.assertIn("<image ", fp.read())
+
+    def test_batch_writes_metrics(self):
+        # Test --metrics merges stage timings from worker processes into one report
+        path = self.write_input("in.txt", "one\ntwo\nthree\n")
+        metrics_path = os.path.join(self.tmp.name, "metrics.json")
+        code, _ = self.run_cli("batch", path, "--out", self.out, "--workers", "2", "--chunk-size", "1",
+                               "--metrics", metrics_path)
+        self.assertEqual(code, 0)
+        with open(metrics_path, encoding="utf-8") as fp:
+            report = json.load(fp)
+        self.assertEqual(report["counters"]["codes_generated"], 3)
+        self.assertEqual(report["stages"]["save"]["count"], 3)
+        written = sum(os.path.getsize(os.path.join(self.out, f"0000000{i}.png")) for i in range(3))
+        self.assertEqual(report["counters"]["bytes_written"], written)
+
+    def test_sheet_writes_pdf(self):
+        # Test the sheet command lays out every good row and reports bad ones
+        path = self.write_input("in.txt", "one\n" + "x" * 5000 + "\nthree\n")
+        pdf_path = os.path.join(self.tmp.name, "labels.pdf")
+        code, err = self.run_cli("sheet", path, "--out", pdf_path, "--template", "a4:1x1")
+        self.assertEqual(code, 1)
+        self.assertIn("row 1:", err)
+        self.assertIn("Laid out 2 codes (1 failed) on 2 pages", err)
+        with open(pdf_path, "rb") as fp:
+            self.assertEqual(fp.read().count(b"/Type /Page "), 2)
+
+    def test_archive_then_export_selected_codes(self):
+        # Test the archive command stores every good row and export renders chosen records from it
+        path = self.write_input("in.txt", "one\n" + "x" * 5000 + "\nthree\n")
+        archive_path = os.path.join(self.tmp.name, "codes.qra")
+        code, err = self.run_cli("archive", path, "--out", archive_path, "--workers", "1", "--ec", "L")
+        self.assertEqual(code, 1)
+        self.assertIn("Archived 2 codes (1 failed)", err)
+        code, err = self.run_cli("export", archive_path, "--out", self.out, "--indices", "1", "--size", "3")
+        self.assertEqual(code, 0)
+        self.assertEqual(os.listdir(self.out), ["00000001.png"])
+        code, err = self.run_cli("export", archive_path, "--out", self.out, "--indices", "0-2")
+        self.assertEqual(code, 2)
+        self.assertIn("holds 2 codes", err)
+
+
+if __name__ == '__main__':
+    unittest.main()
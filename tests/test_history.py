@@ -0,0 +1,53 @@
+import os
+import unittest
+
+from history import HistoryStore, image_nbytes
+from qr_generator import QRCodeGenerator
+
+
+class TestHistoryStore(unittest.TestCase):
+
+    def setUp(self):
+        self.qr_gen = QRCodeGenerator(size=4)
+        self.images = {f"item{i}": self.qr_gen.generate(f"https://example.com/{i}") for i in range(3)}
+        self.one_image = image_nbytes(self.images["item0"])
+
+    def add_all(self, store):
+        for key, img in self.images.items():
+            store.add(key, f"https://example.com/{key[4:]}", self.qr_gen, img)
+
+    def test_thumbnails_and_settings_are_kept(self):
+        # Test each entry keeps its payload, generator and a small thumbnail
+        store = HistoryStore(thumbnail_size=32)
+        self.add_all(store)
+        entry = store.get("item1")
+        self.assertEqual(entry.content, "https://example.com/1")
+        self.assertIs(entry.generator, self.qr_gen)
+        self.assertLessEqual(max(entry.thumbnail.size), 32)
+        self.assertEqual(entry.size, self.images["item1"].size)
+        store.close()
+
+    def test_budget_spills_to_disk(self):
+        # Test that images over budget are spilled and recalled unchanged
+        store = HistoryStore(memory_budget=self.one_image)
+        self.add_all(store)
+        self.assertLessEqual(store.memory_bytes, self.one_image)
+        spill_dir = store._spill_dir
+        self.assertEqual(len(os.listdir(spill_dir)), 2)
+        self.assertEqual(store.get_image("item0").tobytes(), self.images["item0"].tobytes())
+        store.close()
+        self.assertFalse(os.path.exists(spill_dir))
+
+    def test_rerender_without_spill(self):
+        # Test that evicted images are re-rendered from their settings
+        store = HistoryStore(memory_budget=self.one_image, spill=False)
+        self.add_all(store)
+        self.assertIsNone(store._spill_dir)
+        self.assertEqual(store.get_image("item0").tobytes(), self.images["item0"].tobytes())
+        store.remove("item0")
+        self.assertNotIn("item0", store)
+        self.assertEqual(len(store), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
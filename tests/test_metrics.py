@@ -0,0 +1,59 @@
+import io
+import unittest
+
+import metrics
+from PIL import Image
+from qr_generator import MatrixCache, QRCodeGenerator, save_image
+
+
+class TestMetrics(unittest.TestCase):
+
+    def tearDown(self):
+        metrics.disable()
+
+    def test_disabled_records_nothing(self):
+        # Test the hooks are no-ops until metrics are enabled
+        self.assertIsNone(metrics.active())
+        self.assertIs(metrics.stage("encode"), metrics.stage("rasterize"))
+        metrics.count("codes_generated")
+        QRCodeGenerator(size=2).generate("hello")
+        recorder = metrics.enable()
+        self.assertEqual(recorder.snapshot(), {"stages": {}, "counters": {}})
+
+    def test_generate_and_save_record_every_stage(self):
+        # Test a code with a logo times each stage and counts cache hits and bytes
+        recorder = metrics.enable()
+        seen = []
+        recorder.subscribe(lambda stage, seconds: seen.append(stage))
+        qr_gen = QRCodeGenerator(size=4, cache=MatrixCache())
+        logo = Image.new("RGB", (20, 20), (255, 0, 0))
+        out = io.BytesIO()
+        for _ in range(2):
+            save_image(qr_gen.generate("https://example.com", logo_img=logo), out, "PNG")
+        self.assertEqual(seen[:6], ["version_fit", "mask", "encode", "rasterize", "logo", "save"])
+        snapshot = recorder.snapshot()
+        self.assertEqual(set(snapshot["stages"]), set(metrics.STAGES))
+        self.assertEqual(snapshot["stages"]["encode"]["count"], 1)
+        self.assertEqual(snapshot["stages"]["save"]["count"], 2)
+        self.assertEqual(snapshot["counters"], {"cache_misses": 1, "cache_hits": 1, "codes_generated": 2,
+                                                "bytes_written": len(out.getvalue())})
+
+    def test_exporters(self):
+        # Test the Prometheus text and JSON output, and merging a worker snapshot
+        recorder = metrics.Metrics()
+        recorder.observe("rasterize", 0.25)
+        recorder.increment("codes_generated")
+        other = metrics.Metrics()
+        other.observe("rasterize", 0.5)
+        other.increment("codes_generated", 2)
+        recorder.merge(other.snapshot())
+        text = recorder.to_prometheus()
+        self.assertIn('qr_stage_seconds_count{stage="rasterize"} 2\n', text)
+        self.assertIn('qr_stage_seconds_sum{stage="rasterize"} 0.750000000\n', text)
+        self.assertIn('qr_stage_seconds_max{stage="rasterize"} 0.500000000\n', text)
+        self.assertIn("# TYPE qr_codes_generated_total counter\nqr_codes_generated_total 3\n", text)
+        self.assertIn('"mean_seconds": 0.375', recorder.to_json())
+
+
+if __name__ == '__main__':
+    unittest.main()
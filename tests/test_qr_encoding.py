@@ -0,0 +1,103 @@
+import unittest
+
+import qrcode
+from qrcode import util
+from qrcode.exceptions import DataOverflowError
+from qr_encoding import (CAPACITY_BITS, MODE_8BIT_BYTE, MODE_ALPHA_NUM, MODE_KANJI, MODE_NUMBER,
+                         STRUCTURED_APPEND_BITS, encode_codewords, make_qr, optimal_segments, plan_segments,
+                         plan_structured_append, segment_bits, structured_append_parity, to_qr_data)
+
+H = qrcode.constants.ERROR_CORRECT_H
+L = qrcode.constants.ERROR_CORRECT_L
+
+
+class TestQREncoding(unittest.TestCase):
+
+    def test_segments_use_the_most_compact_modes(self):
+        # Test long digit and uppercase runs get their own segments
+        segments = optimal_segments("https://example.com/?id=01234567890123456789", 1)
+        self.assertEqual([segment.mode for segment in segments], [MODE_8BIT_BYTE, MODE_NUMBER])
+        self.assertEqual(segments[1].data, b"01234567890123456789")
+        segments = optimal_segments("HELLO WORLD 123", 1)
+        self.assertEqual([segment.mode for segment in segments], [MODE_ALPHA_NUM])
+
+    def test_short_runs_are_not_split_off(self):
+        # Test a switch is only made when the saved bits outweigh the header
+        segments = optimal_segments("abc12def", 1)
+        self.assertEqual([segment.mode for segment in segments], [MODE_8BIT_BYTE])
+        self.assertEqual(segments[0].length, 8)
+
+    def test_kanji(self):
+        # Test Shift JIS kanji use kanji mode and other non-ASCII text UTF-8 bytes
+        segments = optimal_segments("漢字日本語", 1)
+        self.assertEqual([(segment.mode, segment.length) for segment in segments], [(MODE_KANJI, 5)])
+        segments = optimal_segments("é", 1)
+        self.assertEqual([(segment.mode, segment.length) for segment in segments], [(MODE_8BIT_BYTE, 2)])
+
+    def test_codewords_match_qrcode(self):
+        # Test the packed codewords are identical to qrcode's bit-by-bit encoder
+        for data in ("", "1", "hello", "HELLO 42", "漢字 and 0123456789" * 3, "https://example.com/" * 40):
+            for ec in (L, H):
+                version, segments = plan_segments(data, ec)
+                expected = util.create_data(version, ec, [to_qr_data(segment) for segment in segments])
+                self.assertEqual(encode_codewords(segments, version, ec), expected)
+
+    def test_smallest_version_is_chosen(self):
+        # Test the chosen version fits and the one below it does not
+        for length in (1, 17, 100, 400, 1200):
+            data = "https://example.com/" * (length // 20) + "x" * (length % 20)
+            version, segments = plan_segments(data, H)
+            self.assertLessEqual(segment_bits(segments, version), util.BIT_LIMIT_TABLE[H][version])
+            if version > 1:
+                below = optimal_segments(data, version - 1)
+                self.assertGreater(segment_bits(below, version - 1), util.BIT_LIMIT_TABLE[H][version - 1])
+            qr = qrcode.QRCode(error_correction=H)
+            qr.add_data(data)
+            self.assertLessEqual(version, qr.best_fit())
+
+    def test_make_qr_matches_qrcode(self):
+        # Test the compiled symbol equals qrcode's own for a byte-mode payload
+        qr = make_qr("https://example.com", H)
+        reference = qrcode.QRCode(error_correction=H, border=0)
+        reference.add_data("https://example.com")
+        reference.make(fit=True)
+        self.assertEqual(qr.version, reference.version)
+        self.assertEqual(qr.modules, reference.modules)
+
+    def test_pinned_version_and_overflow(self):
+        # Test a pinned version is kept and oversized payloads raise DataOverflowError
+        self.assertEqual(make_qr("hi", L, version=5).version, 5)
+        with self.assertRaises(DataOverflowError):
+            make_qr("x" * 100, H, version=1)
+        with self.assertRaises(DataOverflowError):
+            plan_segments("x" * 5000, H)
+
+    def test_structured_append_plan(self):
+        # Test oversized payloads are split evenly into the fewest fitting symbols, in order
+        self.assertEqual(len(plan_structured_append("hello", H)), 1)
+        data = "".join(f"{i:05d},key{i}=VALUE;" for i in range(300))
+        parts = plan_structured_append(data, H)
+        self.assertEqual(len(parts), 5)
+        self.assertLessEqual(max(version for version, _ in parts) - min(version for version, _ in parts), 1)
+        for version, segments in parts:
+            self.assertLessEqual(segment_bits(segments, version) + STRUCTURED_APPEND_BITS, CAPACITY_BITS[H][version])
+        text = b"".join(segment.data for _, segments in parts for segment in segments).decode("ascii")
+        self.assertEqual(text, data)
+        with self.assertRaises(DataOverflowError):
+            plan_structured_append("x" * 5000, H, max_symbols=2)
+
+    def test_structured_append_header(self):
+        # Test the header is mode 0011, position, count - 1 and the parity byte
+        parts = plan_structured_append("AB" * 3000, L)
+        parity = structured_append_parity(parts)
+        self.assertEqual(parity, 0)
+        version, segments = parts[1]
+        codewords = encode_codewords(segments, version, L, structured_append=(1, len(parts), 0x5A))
+        header = (0b0011 << 16) | (1 << 12) | ((len(parts) - 1) << 8) | 0x5A
+        blocks = qrcode.base.rs_blocks(version, L)
+        first_block = codewords[0], codewords[len(blocks)], codewords[2 * len(blocks)]
+        self.assertEqual(int.from_bytes(bytes(first_block), "big") >> 4, header)
+
+
+if __name__ == '__main__':
+    unittest.main()
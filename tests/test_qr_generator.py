@@ -1,5 +1,13 @@
+import base64
+import subprocess
+import sys
+import tempfile
 import unittest
-from qr_generator import QRCodeGenerator
+import xml.etree.ElementTree as ET
+from io import BytesIO, StringIO
+import qrcode
+from qr_generator import (PNG_PRESETS, IncrementalRenderer, MatrixCache, ModuleStyle, PreparedLogo, QRCodeGenerator,
+                          QRMatrix, atomic_write, module_sprite, render_matrix, save_image)
 from PIL import Image
 import os
 
@@ -25,13 +33,336 @@ class TestQRCodeGenerator(unittest.TestCase):
         self.assertGreater(img.size[0], 0)
         self.assertGreater(img.size[1], 0)
         
+    def test_prepared_logo_is_cached_per_size(self):
+        # Test the resized logo and mask are built once per target size
+        logo = PreparedLogo(Image.new("RGB", (50, 50), (255, 0, 0)))
+        first = self.qr_gen.generate("https://example.com", logo_img=logo)
+        self.assertIs(logo.prepare(first.size[0] // 4), logo.prepare(first.size[0] // 4))
+        centre = (first.size[0] // 2, first.size[1] // 2)
+        self.assertEqual(first.getpixel(centre), (255, 0, 0))
+        plain = self.qr_gen.generate("https://example.com", logo_img=logo.image)
+        self.assertEqual(plain.tobytes(), first.tobytes())
+
+    def test_prepared_logo_respects_alpha(self):
+        # Test that fully transparent logo pixels leave the code untouched
+        logo = Image.new("RGBA", (50, 50), (255, 0, 0, 0))
+        bare = self.qr_gen.generate("https://example.com")
+        with_logo = self.qr_gen.generate("https://example.com", logo_img=PreparedLogo(logo))
+        self.assertEqual(bare.tobytes(), with_logo.tobytes())
+
+    def test_atomic_write_keeps_previous_file_on_error(self):
+        # Test a completed write replaces the file and a failed one leaves it and no temporary file behind
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "out.txt")
+            with atomic_write(path) as tmp_path, open(tmp_path, "w") as fp:
+                fp.write("first")
+            with self.assertRaises(RuntimeError):
+                with atomic_write(path) as tmp_path, open(tmp_path, "w") as fp:
+                    fp.write("second")
+                    raise RuntimeError
+            self.assertEqual(os.listdir(tmp), ["out.txt"])
+            with open(path) as fp:
+                self.assertEqual(fp.read(), "first")
+
     def test_save_as_svg(self):
         # Test saving the QR code as SVG
-        img = self.qr_gen.generate("https://example.com")
         svg_path = "test_qr.svg"
-        self.qr_gen.save_as_svg(img, svg_path)
+        self.qr_gen.save_as_svg("https://example.com", svg_path)
         self.assertTrue(os.path.exists(svg_path))
         os.remove(svg_path)
 
+    def test_save_as_svg_embeds_rendered_images(self):
+        # Test an image passed to save_as_svg, as older callers do, is embedded as a PNG
+        img = self.qr_gen.generate("https://example.com")
+        svg_path = "test_qr_raster.svg"
+        self.qr_gen.save_as_svg(img, svg_path)
+        with open(svg_path, encoding="utf-8") as fp:
+            document = fp.read()
+        os.remove(svg_path)
+        self.assertIn('xmlns:xlink="http://www.w3.org/1999/xlink"', document)
+        encoded = document.split("base64,")[1].split('"')[0]
+        with Image.open(BytesIO(base64.b64decode(encoded))) as embedded:
+            self.assertEqual(embedded.convert("RGB").tobytes(), img.convert("RGB").tobytes())
+
+    def test_write_svg_embeds_logo(self):
+        # Test an SVG with a logo embeds the code as rendered with it
+        logo = Image.new("RGB", (40, 40), "red")
+        out = StringIO()
+        self.qr_gen.write_svg("https://example.com", out, logo_img=logo)
+        root = ET.fromstring(out.getvalue())
+        image = root.find("{http://www.w3.org/2000/svg}image")
+        encoded = image.get("{http://www.w3.org/1999/xlink}href").split("base64,")[1]
+        with Image.open(BytesIO(base64.b64decode(encoded))) as embedded:
+            expected = self.qr_gen.generate("https://example.com", logo_img=logo)
+            self.assertEqual(embedded.convert("RGB").tobytes(), expected.convert("RGB").tobytes())
+
+    def test_write_svg_draws_every_dark_module(self):
+        # Test the vector export covers exactly the dark modules of the matrix
+        out = StringIO()
+        self.qr_gen.write_svg("https://example.com", out)
+        root = ET.fromstring(out.getvalue())
+        paths = root.findall("{http://www.w3.org/2000/svg}path")
+        self.assertEqual(len(paths), 1)
+        self.assertEqual(paths[0].get("fill"), "#000000")
+        area = sum(int(seg.split("h")[1].split("v")[0]) for seg in paths[0].get("d").split("M")[1:])
+        matrix = self.qr_gen.get_matrix("https://example.com")
+        self.assertEqual(area, sum(map(sum, matrix)))
+        self.assertEqual(root.get("width"), f"{len(matrix) * 10}px")
+
+    def test_generate_matches_qrcode_image_factory(self):
+        # Test the bulk renderer is pixel-identical to qrcode's PIL factory
+        qr_gen = QRCodeGenerator(size=3, fg_color="#FF6B6B", bg_color="#4ECDC4")
+        qr = qrcode.QRCode(version=1, error_correction=qr_gen.error_correction, box_size=3, border=2)
+        qr.add_data("https://example.com")
+        expected = qr.make_image(fill_color="#FF6B6B", back_color="#4ECDC4").convert("RGB")
+        self.assertEqual(qr_gen.generate("https://example.com").tobytes(), expected.tobytes())
+
+    def test_render_matrix_modes(self):
+        # Test rendering straight into each supported mode
+        matrix = [[True, False], [False, True]]
+        for mode in ("1", "L", "P", "RGB"):
+            img = render_matrix(matrix, 4, "#FF0000", "#0000FF", mode=mode)
+            self.assertEqual(img.mode, mode)
+            self.assertEqual(img.size, (8, 8))
+        rgb = render_matrix(matrix, 4, "#FF0000", "#0000FF")
+        self.assertEqual(rgb.getpixel((0, 0)), (255, 0, 0))
+        self.assertEqual(rgb.getpixel((4, 0)), (0, 0, 255))
+        self.assertEqual(render_matrix(matrix, 4, mode="1").getpixel((0, 0)), 0)
+        with self.assertRaises(ValueError):
+            render_matrix(matrix, 4, mode="CMYK")
+
+    def test_packed_matrix_round_trip(self):
+        # Test packing, the border and indexing agree with plain module rows
+        rows = [bytes([1, 0, 1]), bytes([0, 1, 0]), bytes([1, 1, 0])]
+        matrix = QRMatrix.from_rows(rows)
+        self.assertEqual(matrix.data, bytes([0b10100000, 0b01000000, 0b11000000]))
+        self.assertEqual(matrix.rows(), rows)
+        self.assertEqual((matrix[0, 2], matrix[2, 2]), (1, 0))
+        bordered = matrix.with_border(1)
+        self.assertEqual(bordered.rows()[1], bytes([0, 1, 0, 1, 0]))
+        self.assertEqual(bordered.rows()[0], bytes(5))
+        qr_matrix = self.qr_gen.get_matrix("https://example.com")
+        self.assertEqual(memoryview(qr_matrix.data).nbytes, len(qr_matrix) * ((len(qr_matrix) + 7) // 8))
+        with self.assertRaises(ValueError):
+            QRMatrix.from_rows([bytes(3)] * 2)
+
+    def test_packed_matrix_exports(self):
+        # Test the PBM, 1-bit PNG, NumPy and lazy render exports
+        matrix = self.qr_gen.get_matrix("https://example.com")
+        out = BytesIO()
+        matrix.write_pbm(out)
+        self.assertEqual(out.getvalue(), b"P4\n%d %d\n" % (len(matrix), len(matrix)) + matrix.data)
+        out = BytesIO()
+        matrix.save_png(out)
+        png = Image.open(out)
+        self.assertEqual((png.mode, png.size), ("1", (len(matrix), len(matrix))))
+        self.assertEqual(QRMatrix.from_image(png), matrix)
+        rows = matrix.rows()
+        for mode in ("1", "RGB"):
+            self.assertEqual(matrix.render(3, "#FF0000", mode=mode).tobytes(),
+                             render_matrix(rows, 3, "#FF0000", mode=mode).tobytes())
+        try:
+            import numpy as np
+        except ImportError:
+            return
+        self.assertEqual(matrix.to_numpy().tolist(), [[bool(v) for v in row] for row in rows])
+        packed = matrix.to_numpy(packed=True)
+        self.assertFalse(packed.flags.writeable)
+        self.assertTrue(np.shares_memory(packed, np.frombuffer(matrix.data, dtype=np.uint8)))
+
+    def test_output_modes(self):
+        # Test auto picks 1-bit for black on white and a palette otherwise
+        self.assertEqual(QRCodeGenerator(mode="auto").generate("modes").mode, "1")
+        coloured = QRCodeGenerator(fg_color="#2C3E50", bg_color="#ECF0F1", mode="auto").generate("modes")
+        self.assertEqual(coloured.mode, "P")
+        self.assertEqual(coloured.getpalette()[:6], [0xEC, 0xF0, 0xF1, 0x2C, 0x3E, 0x50])
+        rgb = QRCodeGenerator(fg_color="#2C3E50", bg_color="#ECF0F1").generate("modes")
+        self.assertEqual(coloured.convert("RGB").tobytes(), rgb.tobytes())
+        with self.assertRaises(ValueError):
+            QRCodeGenerator(mode="CMYK")
+
+    def test_palette_logo_keeps_module_colours(self):
+        # Test a logo on a palette image adds entries without touching the QR colours
+        logo = Image.new("RGB", (50, 50), (255, 0, 0))
+        qr_gen = QRCodeGenerator(fg_color="#2C3E50", bg_color="#ECF0F1", mode="P")
+        img = qr_gen.generate("https://example.com", logo_img=logo)
+        rgb = QRCodeGenerator(fg_color="#2C3E50", bg_color="#ECF0F1").generate("https://example.com", logo_img=logo)
+        self.assertEqual(img.mode, "P")
+        self.assertEqual(img.convert("RGB").getpixel((img.width // 2, img.height // 2)), (255, 0, 0))
+        self.assertEqual(img.convert("RGB").crop((0, 0, 80, 80)).tobytes(), rgb.crop((0, 0, 80, 80)).tobytes())
+
+    def test_styled_render_uses_shared_sprites(self):
+        # Test shaped modules, finder styles and gradients, with sprites drawn once per shape and size
+        self.assertIs(module_sprite("circle", 8), module_sprite("circle", 8))
+        sprite = module_sprite("circle", 8)
+        self.assertEqual((sprite.getpixel((0, 0)), sprite.getpixel((4, 4))), (0, 255))
+        style = ModuleStyle("circle", finder="rounded", gradient="#0000FF")
+        qr_gen = QRCodeGenerator(size=8, fg_color="#FF0000", style=style, mode="auto")
+        img = qr_gen.generate("styled")
+        self.assertEqual(img.mode, "RGB")
+        plain = QRCodeGenerator(size=8).generate("styled")
+        self.assertEqual(img.size, plain.size)
+        # Finder corners are rounded off; the top-left finder is red, the far corner blue.
+        edge = 2 * 8
+        self.assertEqual(img.getpixel((edge, edge)), (255, 255, 255))
+        red, _, blue = img.getpixel((edge + 28, edge + 2))
+        self.assertGreater(red, 200)
+        self.assertLess(blue, 60)
+        # Circles leave module corners light; the last dark module is blue.
+        matrix = qr_gen.get_matrix("styled")
+        x, y = max((x, y) for y in range(len(matrix)) for x in range(len(matrix)) if matrix[y, x])
+        self.assertEqual(img.getpixel((x * 8, y * 8)), (255, 255, 255))
+        red, _, blue = img.getpixel((x * 8 + 4, y * 8 + 4))
+        self.assertGreater(blue, 200)
+        self.assertLess(red, 60)
+        with self.assertRaises(ValueError):
+            QRCodeGenerator(style=style, mode="P")
+        with self.assertRaises(ValueError):
+            QRCodeGenerator(style=ModuleStyle("star"))
+
+    def test_styled_svg(self):
+        # Test styled SVGs reference one module shape per dark module outside the finders
+        qr_gen = QRCodeGenerator(style=ModuleStyle("rounded", gradient="#0000FF"))
+        out = StringIO()
+        qr_gen.write_svg("styled", out)
+        root = ET.fromstring(out.getvalue())
+        ns = {"svg": "http://www.w3.org/2000/svg"}
+        uses = root.findall(".//svg:use", ns)
+        self.assertEqual(len(uses), sum(qr_gen.get_matrix("styled").unpacked()) - 3 * 33)
+        self.assertEqual({use.get("{http://www.w3.org/1999/xlink}href") for use in uses}, {"#m"})
+        self.assertIsNotNone(root.find(".//svg:linearGradient", ns))
+
+    def test_save_image_presets(self):
+        # Test PNG presets trade speed for size and JPEG gets a convertible mode
+        img = QRCodeGenerator(mode="auto").generate("https://example.com/presets")
+        sizes = {}
+        for preset in PNG_PRESETS:
+            out = BytesIO()
+            save_image(img, out, "PNG", preset=preset)
+            sizes[preset] = len(out.getvalue())
+        self.assertLessEqual(sizes["small"], sizes["fast"])
+        out = BytesIO()
+        save_image(img, out, "JPEG")
+        self.assertEqual(Image.open(out).mode, "L")
+        with tempfile.TemporaryDirectory() as tmp:
+            save_image(img, os.path.join(tmp, "code.png"))
+            self.assertEqual(Image.open(os.path.join(tmp, "code.png")).mode, "1")
+
+    def test_cache_reuses_encoding_across_styles(self):
+        # Test that restyling a cached payload skips the encode stage
+        cache = MatrixCache(max_entries=10)
+        first = QRCodeGenerator(size=4, cache=cache).generate("cached")
+        second = QRCodeGenerator(size=4, fg_color="#FF0000", cache=cache).generate("cached")
+        self.assertEqual(first.size, second.size)
+        self.assertEqual(cache.stats["misses"], 1)
+        self.assertEqual(cache.stats["hits"], 1)
+        QRCodeGenerator(error_correction=1, cache=cache).generate("cached")
+        self.assertEqual(len(cache), 2)
+
+    def test_cache_evicts_least_recently_used(self):
+        # Test the entry and byte limits
+        cache = MatrixCache(max_entries=2)
+        one = QRMatrix.from_rows([b"\x01"])
+        cache.put(("a", 0, None), one)
+        cache.put(("b", 0, None), one)
+        cache.get(("a", 0, None))
+        cache.put(("c", 0, None), one)
+        self.assertIn(("a", 0, None), cache)
+        self.assertNotIn(("b", 0, None), cache)
+        small = MatrixCache(max_entries=None, max_bytes=600)
+        small.put(("a", 0, None), QRMatrix.from_rows([bytes(60)] * 60))
+        small.put(("b", 0, None), QRMatrix.from_rows([bytes(60)] * 60))
+        self.assertEqual(len(small), 1)
+        self.assertLessEqual(small.nbytes, 600)
+
+    def test_cache_persists_to_disk(self):
+        # Test saving and reloading the cache between runs
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "matrices.json")
+            cache = MatrixCache(path=path)
+            modules = QRCodeGenerator(cache=cache).encode("persist me")
+            cache.save()
+            reloaded = MatrixCache(path=path)
+            self.assertEqual(reloaded.get(("persist me", qrcode.constants.ERROR_CORRECT_H, None)), modules)
+
+    def test_generate_many_in_order(self):
+        # Test batch generation returns one result per payload, in order
+        payloads = [f"https://example.com/{i}" for i in range(10)]
+        results = list(self.qr_gen.generate_many(payloads, workers=2, chunksize=3))
+        self.assertEqual([r.index for r in results], list(range(10)))
+        self.assertEqual([r.data for r in results], payloads)
+        for r in results:
+            self.assertTrue(r.ok)
+            self.assertEqual(r.result.tobytes(), self.qr_gen.generate(r.data).tobytes())
+
+    def test_generate_many_reports_errors_per_item(self):
+        # Test that an oversized payload fails alone without aborting the batch
+        payloads = ["first", "x" * 5000, "third"]
+        results = list(self.qr_gen.generate_many(payloads, workers=1))
+        self.assertEqual([r.ok for r in results], [True, False, True])
+        self.assertTrue(results[1].error)
+        self.assertIsNone(results[1].result)
+
+    def test_generate_many_unordered(self):
+        # Test that unordered streaming still covers every payload exactly once
+        payloads = [str(i) for i in range(20)]
+        results = self.qr_gen.generate_many(payloads, workers=2, chunksize=4, ordered=False)
+        self.assertEqual(sorted(r.index for r in results), list(range(20)))
+
+    def test_structured_append_round_trip(self):
+        # Test an oversized payload is split across linked symbols that decode back in order
+        from verify import decode_builtin
+        data = "config=" + "".join(f"{i:04x}" for i in range(1500))
+        qr_gen = QRCodeGenerator(size=2, error_correction=qrcode.constants.ERROR_CORRECT_Q, mode="auto")
+        with self.assertRaises(qrcode.exceptions.DataOverflowError):
+            qr_gen.generate(data)
+        images = qr_gen.generate_structured(data, workers=2)
+        self.assertGreater(len(images), 1)
+        self.assertEqual("".join(decode_builtin(img) for img in images), data)
+        self.assertEqual(len(qr_gen.generate_structured("short")), 1)
+        tiled = qr_gen.generate_tiled(data, columns=1)
+        self.assertEqual(tiled.size, (images[0].width, sum(img.height for img in images)))
+        self.assertEqual(tiled.crop((0, 0) + images[0].size).tobytes(), images[0].tobytes())
+
+    def test_incremental_renderer_redoes_only_changed_stages(self):
+        # Test each kind of change re-runs just its stages and matches a full generate
+        import metrics
+        renderer = IncrementalRenderer()
+        logo = PreparedLogo(Image.new("RGB", (40, 40), "red"))
+        steps = [
+            ({"fg_color": "#AA0000"}, None, {"encode", "rasterize"}),
+            ({"fg_color": "#0000AA"}, None, set()),
+            ({"fg_color": "#0000AA", "bg_color": "#EEEEAA"}, logo, {"logo"}),
+            ({"fg_color": "#0000AA", "size": 3}, logo, {"rasterize", "logo"}),
+            ({"fg_color": "#0000AA", "style": ModuleStyle("circle")}, None, {"rasterize"}),
+        ]
+        try:
+            for settings, logo_img, stages in steps:
+                qr_gen = QRCodeGenerator(mode="auto", **settings)
+                recorder = metrics.enable()
+                img = renderer.render(qr_gen, "https://example.com", logo_img)
+                metrics.disable()
+                with self.subTest(settings=settings, logo=logo_img is not None):
+                    self.assertEqual(set(recorder.stages) - {"version_fit", "mask"}, stages)
+                    expected = qr_gen.generate("https://example.com", logo_img)
+                    self.assertEqual(img.convert("RGB").tobytes(), expected.convert("RGB").tobytes())
+        finally:
+            metrics.disable()
+        first = renderer.render(QRCodeGenerator(fg_color="#AA0000", mode="auto"), "https://example.com")
+        before = first.getpalette()
+        renderer.render(QRCodeGenerator(fg_color="#00AA00", mode="auto"), "https://example.com")
+        self.assertEqual(first.getpalette(), before)
+
+    def test_import_is_lazy(self):
+        # Test importing the generator leaves qrcode and NumPy unloaded and the EC values match qrcode's
+        import qr_generator
+        for name in ("L", "M", "Q", "H"):
+            self.assertEqual(getattr(qr_generator, f"ERROR_CORRECT_{name}"),
+                             getattr(qrcode.constants, f"ERROR_CORRECT_{name}"))
+        code = "import sys, qr_generator; print(sorted({'qrcode', 'numpy', 'PIL.ImageDraw'} & set(sys.modules)))"
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        output = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True, check=True)
+        self.assertEqual(output.stdout.strip(), "[]")
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,45 @@
+import random
+import unittest
+
+from qrcode import util
+from qr_encoding import make_qr
+from qr_masking import HAVE_NUMPY
+
+if HAVE_NUMPY:
+    import numpy as np
+    from qr_masking import mask_patterns, penalty_scores
+
+
+@unittest.skipUnless(HAVE_NUMPY, "NumPy is not installed")
+class TestQRMasking(unittest.TestCase):
+
+    def test_mask_patterns_match_qrcode(self):
+        # Test the eight array masks agree with qrcode's mask functions
+        patterns = mask_patterns(25)
+        for pattern in range(8):
+            mask_func = util.mask_func(pattern)
+            expected = [[bool(mask_func(i, j)) for j in range(25)] for i in range(25)]
+            self.assertEqual(patterns[pattern].tolist(), expected)
+
+    def test_penalty_scores_match_lost_point(self):
+        # Test the vectorised penalty rules score exactly like qrcode's
+        rng = np.random.default_rng(0)
+        for size in (21, 45, 101):
+            for density in (0.2, 0.5, 0.8):
+                symbols = rng.random((8, size, size)) < density
+                expected = [util.lost_point(symbol.tolist()) for symbol in symbols]
+                self.assertEqual(penalty_scores(symbols), expected)
+
+    def test_modules_are_identical_to_qrcode(self):
+        # Test both back ends choose the same mask and produce the same modules
+        rng = random.Random(3)
+        for length in (1, 20, 150, 600, 1200):
+            for ec in range(4):
+                data = "".join(rng.choice("abcXYZ0123456789 :/.-?=&") for _ in range(length))
+                fast = make_qr(data, ec, vectorized=True)
+                legacy = make_qr(data, ec, vectorized=False)
+                self.assertEqual(fast.modules, legacy.modules)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import asyncio
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+from server import QRServer, render_payload
+
+
+async def fetch(port, path, headers=None):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    extra = "".join(f"{name}: {value}\r\n" for name, value in (headers or {}).items())
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n{extra}\r\n".encode())
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split()[1])
+    response_headers = dict(line.split(": ", 1) for line in lines[1:])
+    return status, response_headers, body
+
+
+class TestQRServer(unittest.IsolatedAsyncioTestCase):
+
+    async def start(self, **kwargs):
+        self.executor = ThreadPoolExecutor(max_workers=2)
+        self.qr_server = QRServer(self.executor, **kwargs)
+        self.server = await self.qr_server.start(port=0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        self.server.close()
+        await self.server.wait_closed()
+        self.executor.shutdown()
+
+    async def test_formats(self):
+        # Test PNG, SVG and raw matrix responses
+        await self.start()
+        status, headers, body = await fetch(self.port, "/qr?data=hello&size=2")
+        self.assertEqual(status, 200)
+        self.assertEqual(headers["Content-Type"], "image/png")
+        self.assertTrue(body.startswith(b"\x89PNG"))
+        status, headers, body = await fetch(self.port, "/qr?data=hello&format=svg")
+        self.assertEqual(headers["Content-Type"], "image/svg+xml")
+        self.assertIn(b"<path", body)
+        status, headers, body = await fetch(self.port, "/qr?data=hello&format=matrix&ec=L")
+        rows = body.decode().split()
+        self.assertEqual(len(rows), 21 + 4)
+        self.assertTrue(all(set(row) <= {"0", "1"} for row in rows))
+
+    async def test_etag_revalidation_skips_render(self):
+        # Test If-None-Match returns 304 without rendering again
+        await self.start()
+        _, headers, _ = await fetch(self.port, "/qr?data=etag")
+        status, _, body = await fetch(self.port, "/qr?data=etag", {"If-None-Match": headers["ETag"]})
+        self.assertEqual(status, 304)
+        self.assertEqual(body, b"")
+        self.assertEqual(self.qr_server.renders, 1)
+
+    async def test_concurrent_identical_requests_coalesce(self):
+        # Test that simultaneous identical requests share one render
+        def slow_render(key):
+            time.sleep(0.2)
+            return render_payload(key)
+
+        await self.start(render=slow_render)
+        path = f"/qr?data={quote('https://example.com/same')}"
+        results = await asyncio.gather(*(fetch(self.port, path) for _ in range(5)))
+        self.assertEqual({status for status, _, _ in results}, {200})
+        self.assertEqual(len({body for _, _, body in results}), 1)
+        self.assertEqual(self.qr_server.renders, 1)
+        self.assertEqual(self.qr_server.coalesced, 4)
+
+    async def test_errors(self):
+        # Test bad parameters, unknown paths and oversized payloads
+        await self.start()
+        self.assertEqual((await fetch(self.port, "/qr"))[0], 400)
+        self.assertEqual((await fetch(self.port, "/qr?data=x&format=gif"))[0], 400)
+        self.assertEqual((await fetch(self.port, "/qr?data=x&fg=notacolour"))[0], 400)
+        self.assertEqual((await fetch(self.port, "/nope"))[0], 404)
+        self.assertEqual((await fetch(self.port, "/qr?data=" + "x" * 5000))[0], 422)
+
+
+if __name__ == '__main__':
+    unittest.main()
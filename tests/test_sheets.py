@@ -0,0 +1,81 @@
+import os
+import re
+import tempfile
+import tracemalloc
+import unittest
+import zlib
+from io import BytesIO
+
+from qr_generator import QRCodeGenerator
+from sheets import TEMPLATES, grid_template, parse_template, save_as_pdf, write_sheets
+
+
+def read_pdf(data):
+    # Check every xref offset points at its object and return the page contents
+    xref = int(re.search(rb"startxref\n(\d+)", data).group(1))
+    entries = re.findall(rb"(\d{10}) 00000 n", data[xref:])
+    for number, offset in enumerate(entries, start=1):
+        assert data[int(offset):].startswith(b"%d 0 obj" % number), number
+    streams = re.findall(rb"stream\n(.*?)\nendstream", data, re.S)
+    return [zlib.decompress(stream).decode("ascii") for stream in streams]
+
+
+class TestSheets(unittest.TestCase):
+
+    def setUp(self):
+        self.qr_gen = QRCodeGenerator(fg_color="#FF0000", bg_color="#FFFFFF")
+
+    def test_codes_are_vector_paths_from_the_matrix(self):
+        # Test one page holds the code as rectangles that rebuild its matrix
+        output = BytesIO()
+        self.assertEqual(write_sheets(self.qr_gen, ["hello"], output, TEMPLATES["a4"]), 1)
+        [content] = read_pdf(output.getvalue())
+        self.assertIn("1 0 0 rg", content)
+        matrix = self.qr_gen.get_matrix("hello")
+        rebuilt = [bytearray(len(matrix)) for _ in matrix]
+        for x, y, width in re.findall(r"^(\d+) (\d+) (\d+) 1 re$", content, re.M):
+            rebuilt[int(y)][int(x):int(x) + int(width)] = b"\x01" * int(width)
+        self.assertEqual([bytes(row) for row in rebuilt], matrix.rows())
+
+    def test_pages_fill_the_grid(self):
+        # Test payloads flow across pages in grid-sized groups
+        template = grid_template(TEMPLATES["letter"].page_size, 2, 3)
+        output = BytesIO()
+        written = write_sheets(self.qr_gen, (f"code {i}" for i in range(13)), output, template)
+        self.assertEqual(written, 13)
+        pages = read_pdf(output.getvalue())
+        self.assertEqual([page.count(" cm") for page in pages], [6, 6, 1])
+        self.assertIn(b"/Count 3", output.getvalue())
+
+    def test_memory_does_not_grow_with_pages(self):
+        # Test peak memory stays flat as the page count grows
+        def peak(count):
+            tracemalloc.start()
+            write_sheets(QRCodeGenerator(), (f"https://example.com/{i}" for i in range(count)), BytesIO(),
+                         parse_template("a4:2x2"))
+            result = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            return result
+
+        small, large = peak(40), peak(400)
+        self.assertLess(large, small * 2 + 100_000)
+
+    def test_templates_and_errors(self):
+        # Test template parsing, skipped payloads and single-code PDFs
+        self.assertEqual(parse_template("100x150mm:2x3").per_page, 6)
+        with self.assertRaises(ValueError):
+            parse_template("a5")
+        failures = []
+        write_sheets(self.qr_gen, ["ok", "x" * 5000], BytesIO(), on_error=lambda i, data, e: failures.append(i))
+        self.assertEqual(failures, [1])
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "one.pdf")
+            save_as_pdf(self.qr_gen, "hello", path)
+            with open(path, "rb") as fp:
+                data = fp.read()
+            self.assertIn(b"/MediaBox [0 0 250.00 250.00]", data)
+            self.assertEqual(os.listdir(tmp), ["one.pdf"])
+
+
+if __name__ == '__main__':
+    unittest.main()
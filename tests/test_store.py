@@ -0,0 +1,76 @@
+import os
+import tempfile
+import unittest
+
+from PIL import Image
+from qr_generator import ModuleStyle, PreparedLogo, QRCodeGenerator
+from store import ManifestEntry, OutputStore, artifact_key, logo_digest
+
+
+class TestOutputStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = OutputStore(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_artifact_key_covers_every_setting(self):
+        # Test each payload, render setting, logo and format change gives a new key
+        base = QRCodeGenerator()
+        logo = Image.new("RGB", (8, 8), "red")
+        keys = {
+            artifact_key(base, "hello", "png"),
+            artifact_key(base, "hello!", "png"),
+            artifact_key(base, "hello", "svg"),
+            artifact_key(base, "hello", "png", png_preset="small"),
+            artifact_key(base, "hello", "png", logo=logo_digest(logo)),
+            artifact_key(QRCodeGenerator(size=4), "hello", "png"),
+            artifact_key(QRCodeGenerator(fg_color="#FF0000"), "hello", "png"),
+            artifact_key(QRCodeGenerator(error_correction=1), "hello", "png"),
+            artifact_key(QRCodeGenerator(style=ModuleStyle("circle")), "hello", "png"),
+        }
+        self.assertEqual(len(keys), 9)
+        self.assertEqual(artifact_key(QRCodeGenerator(), "hello", "png"), artifact_key(base, "hello", "png"))
+        self.assertEqual(logo_digest(PreparedLogo(logo.copy())), logo_digest(logo))
+
+    def test_store_writes_each_object_once(self):
+        # Test a stored key is not rendered again and failed writes leave nothing behind
+        calls = []
+
+        def write(path):
+            calls.append(path)
+            with open(path, "w") as fp:
+                fp.write("code")
+
+        first = self.store.store("ab" * 32, "svg", write)
+        second = self.store.store("ab" * 32, "svg", write)
+        self.assertEqual((first.created, second.created, len(calls)), (True, False, 1))
+        self.assertEqual(second.path, os.path.join(self.tmp.name, "objects", "ab", "ab" * 32 + ".svg"))
+
+        def fail(path):
+            open(path, "w").close()
+            raise ValueError("bad payload")
+
+        with self.assertRaises(ValueError):
+            self.store.store("cd" * 32, "svg", fail)
+        self.assertEqual(os.listdir(os.path.join(self.tmp.name, "objects", "cd")), [])
+
+    def test_manifest_is_replaced_only_on_success_and_prunes(self):
+        # Test an interrupted manifest keeps the old one and prune drops unreferenced objects
+        for key in ("ab" * 32, "cd" * 32):
+            self.store.store(key, "png", lambda path: open(path, "w").close())
+        with self.store.open_manifest() as manifest:
+            manifest.add(ManifestEntry(0, "first", "ab" * 32, self.store.relpath("ab" * 32, "png")))
+        with self.assertRaises(KeyboardInterrupt):
+            with self.store.open_manifest() as manifest:
+                manifest.add(ManifestEntry(0, "other", "cd" * 32, self.store.relpath("cd" * 32, "png")))
+                raise KeyboardInterrupt
+        self.assertEqual([entry.name for entry in self.store.manifest()], ["first"])
+        self.assertEqual(self.store.prune(), 1)
+        self.assertFalse(os.path.exists(self.store.path_for("cd" * 32, "png")))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import random
+import unittest
+
+import qrcode
+from PIL import Image, ImageDraw
+from qr_generator import FINDER_STYLES, MODULE_SHAPES, ModuleStyle, QRCodeGenerator
+from qrcode import util
+from qrcode.base import RSBlock
+from verify import DecodeError, Verifier, contrast_ratio, decode_builtin, rs_correct, verify_code
+
+
+class TestVerify(unittest.TestCase):
+
+    def test_reed_solomon_corrects_up_to_half_the_ec_codewords(self):
+        # Test corrupted blocks are repaired up to the limit and rejected past it
+        rng = random.Random(0)
+        data = [rng.randrange(256) for _ in range(19)]
+        buffer = util.BitBuffer()
+        for codeword in data:
+            buffer.put(codeword, 8)
+        codewords = util.create_bytes(buffer, [RSBlock(26, 19)])
+        for errors in range(4):
+            corrupted = list(codewords)
+            for position in rng.sample(range(26), errors):
+                corrupted[position] ^= rng.randrange(1, 256)
+            self.assertEqual(rs_correct(corrupted, 7), (data, errors))
+        corrupted = [codeword ^ 0x55 for codeword in codewords[:8]] + codewords[8:]
+        with self.assertRaises(DecodeError):
+            rs_correct(corrupted, 7)
+
+    def test_builtin_decoder_round_trips(self):
+        # Test every EC level, small and large versions, and mixed segment modes
+        payloads = ["https://example.com/?q=1", "0123456789" * 30, "HELLO WORLD 42", "日本語 kanji ok", "x" * 900]
+        for ec in (qrcode.constants.ERROR_CORRECT_L, qrcode.constants.ERROR_CORRECT_M,
+                   qrcode.constants.ERROR_CORRECT_Q, qrcode.constants.ERROR_CORRECT_H):
+            qr_gen = QRCodeGenerator(size=3, error_correction=ec, mode="auto")
+            for data in payloads:
+                with self.subTest(ec=ec, data=data[:12]):
+                    self.assertEqual(decode_builtin(qr_gen.generate(data)), data)
+
+    def test_builtin_decoder_reads_styled_codes(self):
+        # Test round modules, every finder style and gradients read back
+        for shape in MODULE_SHAPES:
+            for finder in FINDER_STYLES:
+                style = ModuleStyle(shape, finder, gradient="#2575FC")
+                qr_gen = QRCodeGenerator(size=5, fg_color="#6A11CB", style=style)
+                with self.subTest(shape=shape, finder=finder):
+                    self.assertEqual(decode_builtin(qr_gen.generate("https://example.com/styled")),
+                                     "https://example.com/styled")
+
+    def test_verify_reports_clean_and_inverted_codes(self):
+        # Test a clean code scores no risk and light-on-dark codes still decode
+        for fg, bg in (("#000000", "#FFFFFF"), ("#FFFFFF", "#121212")):
+            qr_gen = QRCodeGenerator(size=4, fg_color=fg, bg_color=bg)
+            result = verify_code(qr_gen, "https://example.com", qr_gen.generate("https://example.com"), "builtin")
+            self.assertTrue(result.ok, result.error)
+            self.assertEqual(result.damage, 0)
+            self.assertFalse(result.at_risk)
+
+    def test_logo_damage_is_corrected_and_scored(self):
+        # Test a logo is read through at high EC and fails with a risk score at low EC
+        logo = Image.new("RGB", (60, 60), (255, 0, 0))
+        high = QRCodeGenerator(error_correction=qrcode.constants.ERROR_CORRECT_H)
+        result = verify_code(high, "https://example.com", high.generate("https://example.com", logo_img=logo))
+        self.assertTrue(result.ok, result.error)
+        self.assertGreater(result.damage, 0)
+        low = QRCodeGenerator(error_correction=qrcode.constants.ERROR_CORRECT_L)
+        result = verify_code(low, "https://example.com", low.generate("https://example.com", logo_img=logo))
+        self.assertFalse(result.ok)
+        self.assertTrue(result.at_risk)
+
+    def test_low_contrast_is_at_risk(self):
+        # Test the Colorful template scores as risky on contrast alone
+        self.assertAlmostEqual(contrast_ratio("#000000", "#FFFFFF"), 21.0)
+        qr_gen = QRCodeGenerator(size=4, fg_color="#FF6B6B", bg_color="#4ECDC4")
+        result = verify_code(qr_gen, "hello", qr_gen.generate("hello"))
+        self.assertLess(result.contrast, 1.5)
+        self.assertEqual(result.risk, 1.0)
+
+    def test_damaged_image_fails(self):
+        # Test a code with a finder painted over is reported as unscannable
+        qr_gen = QRCodeGenerator(size=4)
+        img = qr_gen.generate("hello")
+        ImageDraw.Draw(img).rectangle((0, 0, img.width // 2, img.height // 2), fill="white")
+        result = verify_code(qr_gen, "hello", img)
+        self.assertFalse(result.ok)
+        self.assertIn("DecodeError", result.error)
+
+    def test_verifier_returns_results_in_order(self):
+        # Test queued checks come back in submission order, including at finish
+        qr_gen = QRCodeGenerator(size=2, mode="auto")
+        payloads = [f"item {i}" for i in range(10)]
+        results = []
+        with Verifier(workers=3, max_pending=4) as verifier:
+            for index, data in enumerate(payloads):
+                results += verifier.submit(index, qr_gen, data, qr_gen.generate(data))
+            results += verifier.finish()
+        self.assertEqual([index for index, _ in results], list(range(10)))
+        self.assertEqual([result.decoded for _, result in results], payloads)
+
+
+if __name__ == '__main__':
+    unittest.main()
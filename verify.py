@@ -0,0 +1,512 @@
+"""
+Scan verification for rendered QR codes.
+
+``verify_code`` decodes a rendered image and compares the text with the
+payload it was generated from, and scores how close the code is to being
+unreadable from the colour contrast and the share of modules a logo or
+styling has changed. Decoding uses pyzbar or OpenCV when either is
+installed and otherwise a built-in decoder for axis-aligned renders, which
+samples the module grid and runs full Reed-Solomon error correction.
+``Verifier`` runs checks on a thread pool next to batch generation.
+"""
+import os
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from itertools import groupby
+from typing import Any, Callable, Hashable, NamedTuple
+
+from PIL import Image, ImageColor
+from qrcode import util
+from qrcode.base import rs_blocks
+from qr_generator import QRCodeGenerator
+from qr_masking import data_positions
+
+# Contrast ratios (WCAG) at and below which a code is scored fully risky,
+# and at and above which contrast adds no risk.
+MIN_CONTRAST = 1.5
+SAFE_CONTRAST = 4.5
+
+RISK_THRESHOLD = 0.5
+MIN_LUMINANCE_SPREAD = 10
+
+
+class DecodeError(ValueError):
+    pass
+
+
+class VerifyResult(NamedTuple):
+    """
+    Outcome of verifying one code. ``risk`` runs from 0 (safe) to 1 (very
+    likely unreadable) and is the larger of the contrast risk and
+    ``damage``, how much of the error correction budget the image's changed
+    modules use up (see ``module_damage``).
+    """
+    ok: bool
+    decoded: str | None
+    error: str | None
+    risk: float
+    contrast: float
+    damage: float
+    decoder: str
+
+    @property
+    def at_risk(self) -> bool:
+        return self.risk >= RISK_THRESHOLD
+
+
+# -- Reed-Solomon over GF(256) with QR's polynomial x^8 + x^4 + x^3 + x^2 + 1.
+
+_EXP = [0] * 512
+_LOG = [0] * 256
+_value = 1
+for _i in range(255):
+    _EXP[_i] = _value
+    _LOG[_value] = _i
+    _value <<= 1
+    if _value & 0x100:
+        _value ^= 0x11D
+for _i in range(255, 512):
+    _EXP[_i] = _EXP[_i - 255]
+
+
+def _mul(a: int, b: int) -> int:
+    if a == 0 or b == 0:
+        return 0
+    return _EXP[_LOG[a] + _LOG[b]]
+
+
+def _div(a: int, b: int) -> int:
+    if a == 0:
+        return 0
+    return _EXP[(_LOG[a] - _LOG[b]) % 255]
+
+
+def _eval_high_first(poly: list[int], x: int) -> int:
+    if x == 0:
+        return poly[-1]
+    log_x = _LOG[x]
+    result = 0
+    for coefficient in poly:
+        result = (_EXP[_LOG[result] + log_x] if result else 0) ^ coefficient
+    return result
+
+
+def _eval_low_first(poly: list[int], x: int) -> int:
+    return _eval_high_first(poly[::-1], x)
+
+
+def rs_correct(codewords: list[int], ec_count: int) -> tuple[list[int], int]:
+    """
+    Correct up to ``ec_count // 2`` wrong codewords in one block (data then
+    error correction codewords) and return the data codewords and the number
+    of errors fixed. Raises DecodeError when the block is beyond repair.
+    """
+    syndromes = [_eval_high_first(codewords, _EXP[j]) for j in range(ec_count)]
+    if not any(syndromes):
+        return codewords[:len(codewords) - ec_count], 0
+
+    # Berlekamp-Massey; polynomials are lowest degree first.
+    locator, previous = [1], [1]
+    errors, shift, last_discrepancy = 0, 1, 1
+    for n in range(ec_count):
+        discrepancy = syndromes[n]
+        for i in range(1, errors + 1):
+            discrepancy ^= _mul(locator[i], syndromes[n - i])
+        if discrepancy == 0:
+            shift += 1
+            continue
+        scale = _div(discrepancy, last_discrepancy)
+        updated = locator + [0] * max(0, len(previous) + shift - len(locator))
+        for i, coefficient in enumerate(previous):
+            updated[i + shift] ^= _mul(scale, coefficient)
+        if 2 * errors <= n:
+            previous, errors, last_discrepancy, shift = locator, n + 1 - errors, discrepancy, 1
+        else:
+            shift += 1
+        locator = updated
+    locator = locator[:errors + 1]
+    if 2 * errors > ec_count:
+        raise DecodeError("too many errors to correct")
+
+    # Chien search: codeword index k holds the coefficient of x^(n-1-k).
+    length = len(codewords)
+    positions = [power for power in range(length) if _eval_low_first(locator, _EXP[(255 - power) % 255]) == 0]
+    if len(positions) != errors:
+        raise DecodeError("could not locate the errors")
+
+    # Forney, with the first consecutive root of the generator being α^0.
+    evaluator = [0] * ec_count
+    for i, syndrome in enumerate(syndromes):
+        for j, coefficient in enumerate(locator):
+            if i + j < ec_count:
+                evaluator[i + j] ^= _mul(syndrome, coefficient)
+    derivative = [locator[i] if i % 2 else 0 for i in range(1, len(locator))]
+    corrected = list(codewords)
+    for power in positions:
+        x_inverse = _EXP[(255 - power) % 255]
+        denominator = _eval_low_first(derivative, x_inverse)
+        if denominator == 0:
+            raise DecodeError("could not correct the errors")
+        magnitude = _mul(_EXP[power], _div(_eval_low_first(evaluator, x_inverse), denominator))
+        corrected[length - 1 - power] ^= magnitude
+    if any(_eval_high_first(corrected, _EXP[j]) for j in range(ec_count)):
+        raise DecodeError("error correction failed")
+    return corrected[:length - ec_count], errors
+
+
+# -- Built-in decoder.
+
+@lru_cache(maxsize=None)
+def _format_codes() -> dict[int, tuple[int, int]]:
+    return {util.BCH_type_info((ec << 3) | mask): (ec, mask) for ec in range(4) for mask in range(8)}
+
+
+def _format_bits(grid: list[bytes], size: int) -> tuple[int, int]:
+    vertical = horizontal = 0
+    for i in range(15):
+        row = i if i < 6 else i + 1 if i < 8 else size - 15 + i
+        col = size - i - 1 if i < 8 else 15 - i if i < 9 else 15 - i - 1
+        vertical |= grid[row][8] << i
+        horizontal |= grid[8][col] << i
+    return vertical, horizontal
+
+
+def _read_format(grid: list[bytes], size: int) -> tuple[int, int]:
+    best, distance = None, 16
+    for bits in _format_bits(grid, size):
+        for code, info in _format_codes().items():
+            d = bin(code ^ bits).count("1")
+            if d < distance:
+                best, distance = info, d
+    if distance > 3:
+        raise DecodeError("unreadable format information")
+    return best
+
+
+def _finder_width(modules: Image.Image, bbox: tuple[int, int, int, int]) -> int:
+    # Look for the dark:light:dark:light:dark 1:1:3:1:1 cross-section of the
+    # top-left finder. Square finders show it on several rows and round ones
+    # only near their centre, so keep the widest match.
+    left, top, right, bottom = bbox
+    best = 0
+    for y in range(top, top + (bottom - top) // 3):
+        row = modules.crop((left, y, right, y + 1)).tobytes()
+        start = row.find(255)
+        runs = [len(list(run)) for _, run in groupby(row[start:])][:5] if start >= 0 else []
+        unit = sum(runs) / 7
+        if (len(runs) == 5 and start <= unit
+                and all(abs(run - expected * unit) <= unit / 2 + 1 for run, expected in zip(runs, (1, 1, 3, 1, 1)))):
+            best = max(best, sum(runs))
+        elif best:
+            break
+    if not best:
+        raise DecodeError("no finder pattern found")
+    return best
+
+
+def _sample_grid(img: Image.Image) -> list[bytes]:
+    grey = img.convert("L")
+    width, height = grey.size
+    # The quiet zone gives the light colour and the most different pixel on
+    # the way from the corner into the top-left finder the dark one.
+    light = grey.getpixel((0, 0))
+    dark = max((grey.getpixel((offset, offset)) for offset in range(min(width, height) // 3)),
+               key=lambda value: abs(value - light), default=light)
+    if abs(dark - light) < MIN_LUMINANCE_SPREAD:
+        raise DecodeError("not enough contrast to find the code")
+    threshold = (light + dark) / 2
+    if dark < light:
+        modules = grey.point(lambda v: 255 if v < threshold else 0)
+    else:
+        modules = grey.point(lambda v: 255 if v > threshold else 0)
+    bbox = modules.getbbox()
+    module = _finder_width(modules, bbox) / 7
+    if module < 1:
+        raise DecodeError("modules are smaller than a pixel")
+    version = round(((bbox[2] - bbox[0]) / module - 17) / 4)
+    if not 1 <= version <= 40:
+        raise DecodeError("no code found")
+    size = version * 4 + 17
+    cells = modules.crop(bbox).resize((size, size), Image.Resampling.BOX).tobytes()
+    return [bytes(cell >= 128 for cell in cells[y * size:(y + 1) * size]) for y in range(size)]
+
+
+def _parse_segments(data: bytes, version: int) -> str:
+    bits = int.from_bytes(data, "big")
+    remaining = len(data) * 8
+    text, pending = [], bytearray()
+
+    def read(width: int) -> int:
+        nonlocal remaining
+        if width > remaining:
+            raise DecodeError("truncated data")
+        remaining -= width
+        return (bits >> remaining) & ((1 << width) - 1)
+
+    count_bits = util.mode_sizes_for_version(version)
+    while remaining >= 4:
+        mode = read(4)
+        if mode == 0:
+            break
+        if mode == 0b0011:
+            # Structured Append header: position, count and parity.
+            read(16)
+            continue
+        if mode not in count_bits:
+            raise DecodeError(f"unsupported segment mode {mode}")
+        count = read(count_bits[mode])
+        if mode == util.MODE_NUMBER:
+            for start in range(0, count, 3):
+                digits = min(3, count - start)
+                pending += str(read((0, 4, 7, 10)[digits])).zfill(digits).encode("ascii")
+        elif mode == util.MODE_ALPHA_NUM:
+            for _ in range(count // 2):
+                pair = read(11)
+                pending += util.ALPHA_NUM[pair // 45:pair // 45 + 1] + util.ALPHA_NUM[pair % 45:pair % 45 + 1]
+            if count % 2:
+                value = read(6)
+                pending += util.ALPHA_NUM[value:value + 1]
+        elif mode == util.MODE_8BIT_BYTE:
+            for _ in range(count):
+                pending.append(read(8))
+        else:
+            text.append(pending.decode("utf-8", errors="replace"))
+            pending.clear()
+            kanji = bytearray()
+            for _ in range(count):
+                value = read(13)
+                code = (value // 0xC0) << 8 | value % 0xC0
+                code += 0x8140 if code < 0x1F00 else 0xC140
+                kanji += code.to_bytes(2, "big")
+            text.append(kanji.decode("shift_jis", errors="replace"))
+    text.append(pending.decode("utf-8", errors="replace"))
+    return "".join(text)
+
+
+def read_symbol(img: Image.Image) -> tuple[str, float]:
+    """
+    Decode an upright, unrotated QR code such as the ones this package
+    renders. Returns the text and how much of the error correction budget
+    the worst Reed-Solomon block needed, from 0 to 1.
+    """
+    grid = _sample_grid(img)
+    size = len(grid)
+    version = (size - 17) // 4
+    ec, mask = _read_format(grid, size)
+    mask_func = util.mask_func(mask)
+
+    blocks = rs_blocks(version, ec)
+    total = sum(block.total_count for block in blocks)
+    bits = "".join("1" if grid[row][col] != bool(mask_func(row, col)) else "0"
+                   for row, col in data_positions(version)[:total * 8])
+    codewords = int(bits, 2).to_bytes(total, "big")
+
+    data_blocks = [[] for _ in blocks]
+    ec_blocks = [[] for _ in blocks]
+    position = 0
+    for i in range(max(block.data_count for block in blocks)):
+        for block, target in zip(blocks, data_blocks):
+            if i < block.data_count:
+                target.append(codewords[position])
+                position += 1
+    for i in range(max(block.total_count - block.data_count for block in blocks)):
+        for block, target in zip(blocks, ec_blocks):
+            if i < block.total_count - block.data_count:
+                target.append(codewords[position])
+                position += 1
+
+    data = bytearray()
+    budget_used = 0.0
+    for block, block_data, block_ec in zip(blocks, data_blocks, ec_blocks):
+        ec_count = block.total_count - block.data_count
+        corrected, errors = rs_correct(block_data + block_ec, ec_count)
+        data += bytes(corrected)
+        budget_used = max(budget_used, errors / (ec_count // 2))
+    return _parse_segments(bytes(data), version), budget_used
+
+
+def decode_builtin(img: Image.Image) -> str:
+    """Decode an upright, unrotated QR code with the built-in decoder."""
+    return read_symbol(img)[0]
+
+
+def _decode_pyzbar(img: Image.Image) -> str:
+    from pyzbar.pyzbar import ZBarSymbol, decode
+
+    results = decode(img.convert("L"), symbols=[ZBarSymbol.QRCODE])
+    if not results:
+        raise DecodeError("no code found")
+    return results[0].data.decode("utf-8")
+
+
+def _decode_opencv(img: Image.Image) -> str:
+    import cv2
+    import numpy as np
+
+    text, points, _ = cv2.QRCodeDetector().detectAndDecode(np.asarray(img.convert("L")))
+    if points is None or not text:
+        raise DecodeError("no code found")
+    return text
+
+
+DECODERS: dict[str, Callable[[Image.Image], str]] = {
+    "pyzbar": _decode_pyzbar,
+    "opencv": _decode_opencv,
+    "builtin": decode_builtin,
+}
+_OPTIONAL_MODULES = {"pyzbar": "pyzbar.pyzbar", "opencv": "cv2"}
+
+
+@lru_cache(maxsize=None)
+def available_decoders() -> tuple[str, ...]:
+    """Return the usable decoder names, preferred first."""
+    names = []
+    for name, module in _OPTIONAL_MODULES.items():
+        try:
+            __import__(module)
+        except ImportError:
+            continue
+        names.append(name)
+    return (*names, "builtin")
+
+
+def decode(img: Image.Image, decoder: str = "auto") -> tuple[str, str]:
+    """
+    Decode ``img`` and return ``(text, decoder name)``. "auto" uses the first
+    available decoder.
+    """
+    name = _decoder_name(decoder)
+    return DECODERS[name](img), name
+
+
+def _decoder_name(decoder: str) -> str:
+    name = available_decoders()[0] if decoder == "auto" else decoder
+    if name not in DECODERS:
+        raise ValueError(f"Unknown decoder {decoder!r}, expected one of auto, {', '.join(DECODERS)}")
+    return name
+
+
+# -- Risk scoring.
+
+def _relative_luminance(color: str) -> float:
+    def channel(value: int) -> float:
+        value /= 255
+        return value / 12.92 if value <= 0.03928 else ((value + 0.055) / 1.055) ** 2.4
+
+    r, g, b = ImageColor.getrgb(color)[:3]
+    return 0.2126 * channel(r) + 0.7152 * channel(g) + 0.0722 * channel(b)
+
+
+def contrast_ratio(fg_color: str, bg_color: str) -> float:
+    """Return the WCAG contrast ratio between two colours, from 1 to 21."""
+    light, dark = sorted((_relative_luminance(fg_color), _relative_luminance(bg_color)), reverse=True)
+    return (light + 0.05) / (dark + 0.05)
+
+
+@lru_cache(maxsize=None)
+def _codeword_blocks(version: int, error_correction: int) -> tuple[int, ...]:
+    """Return the RS block of each codeword in placement (interleaved) order."""
+    blocks = rs_blocks(version, error_correction)
+    owners = []
+    for counts in ([block.data_count for block in blocks],
+                   [block.total_count - block.data_count for block in blocks]):
+        for i in range(max(counts)):
+            owners.extend(index for index, block_count in enumerate(counts) if i < block_count)
+    return tuple(owners)
+
+
+def module_damage(generator: QRCodeGenerator, data: str, img: Image.Image) -> float:
+    """
+    Compare ``img`` with the clean symbol for ``data`` and return how close
+    the changed modules, e.g. under a logo, bring the worst Reed-Solomon
+    block to its correction limit: 0 for an untouched code, 1.0 at the
+    limit and above 1 past it.
+    """
+    matrix = generator.get_matrix(data)
+    count = len(matrix)
+    fg, bg = ImageColor.getcolor(generator.fg_color, "L"), ImageColor.getcolor(generator.bg_color, "L")
+    cells = img.convert("L").resize((count, count), Image.Resampling.BOX).tobytes()
+    expected = matrix.unpacked()
+    version = (count - 2 * generator.border - 17) // 4
+    owners = _codeword_blocks(version, generator.error_correction)
+    wrong = set()
+    for index, (row, col) in enumerate(data_positions(version)):
+        if index // 8 >= len(owners):
+            break
+        offset = (row + generator.border) * count + col + generator.border
+        if (abs(cells[offset] - fg) < abs(cells[offset] - bg)) != expected[offset]:
+            wrong.add(index // 8)
+    errors = Counter(owners[codeword] for codeword in wrong)
+    blocks = rs_blocks(version, generator.error_correction)
+    return max((errors[index] / ((block.total_count - block.data_count) // 2)
+                for index, block in enumerate(blocks)), default=0.0)
+
+
+def verify_code(generator: QRCodeGenerator, data: str, img: Image.Image | str | os.PathLike,
+                decoder: str = "auto") -> VerifyResult:
+    """
+    Decode a code rendered by ``generator`` for ``data`` (an image or a
+    path to one) and score its scan risk.
+    """
+    if not isinstance(img, Image.Image):
+        with Image.open(img) as opened:
+            img = opened.copy()
+    name = _decoder_name(decoder)
+    decoded = error = damage = None
+    try:
+        if name == "builtin":
+            # The built-in decoder reports the error correction it needed,
+            # which saves re-encoding the payload to compare modules.
+            decoded, damage = read_symbol(img)
+        else:
+            decoded = DECODERS[name](img)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    else:
+        if decoded != data:
+            error = f"decoded {decoded[:40]!r} instead of the payload"
+    if damage is None or error is not None:
+        damage = module_damage(generator, data, img)
+    contrast = contrast_ratio(generator.fg_color, generator.bg_color)
+    contrast_risk = (SAFE_CONTRAST - contrast) / (SAFE_CONTRAST - MIN_CONTRAST)
+    risk = round(min(1.0, max(0.0, contrast_risk, damage)), 3)
+    return VerifyResult(error is None, decoded, error, risk, round(contrast, 2), round(damage, 3), name)
+
+
+class Verifier:
+    """
+    Verify codes on a thread pool while the caller keeps generating.
+
+    ``submit`` queues a check and returns the checks that have already
+    finished, in submission order; once ``max_pending`` checks are queued it
+    waits for the oldest, which keeps memory bounded. ``finish`` returns the
+    rest and shuts the pool down.
+    """
+
+    def __init__(self, workers: int = 2, decoder: str = "auto", max_pending: int | None = None) -> None:
+        self.decoder = decoder
+        self.max_pending = max_pending or workers * 4
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="qr-verify")
+        self._pending: deque[tuple[Hashable, Future]] = deque()
+
+    def __enter__(self) -> "Verifier":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self._pool.shutdown(cancel_futures=True)
+
+    def submit(self, key: Hashable, generator: QRCodeGenerator, data: str,
+               img: Image.Image | str | os.PathLike) -> list[tuple[Hashable, VerifyResult]]:
+        self._pending.append((key, self._pool.submit(verify_code, generator, data, img, self.decoder)))
+        finished = []
+        while self._pending and (self._pending[0][1].done() or len(self._pending) > self.max_pending):
+            key, future = self._pending.popleft()
+            finished.append((key, future.result()))
+        return finished
+
+    def finish(self) -> list[tuple[Hashable, VerifyResult]]:
+        finished = [(key, future.result()) for key, future in self._pending]
+        self._pending.clear()
+        self._pool.shutdown()
+        return finished